@@ -0,0 +1,79 @@
+"""
+Utilities shared by the benchmark scripts: storing and comparing baselines
+"""
+
+import json
+import platform
+import sys
+from pathlib import Path
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+
+def environment():
+    """Information about the machine that ran the benchmark"""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def load_baseline(name):
+    """Load a baseline, returns None if it doesn't exist"""
+    path = BASELINES_DIR / f"{name}.json"
+
+    if not path.exists():
+        return None
+
+    return json.loads(path.read_text())
+
+
+def save_baseline(name, results):
+    BASELINES_DIR.mkdir(exist_ok=True)
+    path = BASELINES_DIR / f"{name}.json"
+    content = {"environment": environment(), "results": results}
+    path.write_text(json.dumps(content, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def is_regression(value, baseline, tolerance, slack):
+    """
+    Check if value (lower is better) regressed. tolerance is the allowed
+    relative increase and slack an absolute increase that is always allowed
+    (to absorb noise in very small values)
+    """
+    return value > baseline * (1 + tolerance) + slack
+
+
+def report(rows, headers):
+    """Print a table"""
+    rows = [[str(value) for value in row] for row in rows]
+    widths = [
+        max(len(header), *(len(row[i]) for row in rows)) if rows else len(header)
+        for i, header in enumerate(headers)
+    ]
+
+    def format_row(row):
+        return "  ".join(value.ljust(width) for value, width in zip(row, widths))
+
+    print(format_row(headers))
+    print(format_row(["-" * width for width in widths]))
+
+    for row in rows:
+        print(format_row(row))
+
+
+def fail(regressions):
+    """Print the regressions and exit with a non-zero code"""
+    print("\nREGRESSIONS FOUND:\n", file=sys.stderr)
+
+    for regression in regressions:
+        print(f"  * {regression}", file=sys.stderr)
+
+    print(
+        "\nIf this is expected, update the baseline with --update",
+        file=sys.stderr,
+    )
+    sys.exit(1)
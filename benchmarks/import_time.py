@@ -0,0 +1,223 @@
+"""
+Import-time benchmarks for ploomber_core. Every ploomber-family CLI imports
+ploomber_core, so its import time is added to every command.
+
+Each measurement runs in a fresh interpreter. The script reports the median
+wall time of the import and the modules that contribute the most (according
+to python -X importtime), and compares them against the stored baseline:
+
+* a scenario fails if its median wall time exceeds the baseline by more
+  than --tolerance (relative) plus --slack (milliseconds)
+* a scenario fails if importing it loads third-party packages that it
+  didn't load in the baseline (e.g., importing ploomber_core.telemetry
+  should not import posthog). This check doesn't depend on the machine
+
+Usage::
+
+    python benchmarks/import_time.py             # compare with the baseline
+    python benchmarks/import_time.py --update    # store a new baseline
+
+Wall times depend on the machine, so update the baseline when running the
+benchmark on a different one
+"""
+
+from argparse import ArgumentParser
+import json
+import statistics
+import subprocess
+import sys
+
+from common import fail, is_regression, load_baseline, report, save_baseline
+
+BASELINE = "import_time"
+
+# name: (module to import, modules to block)
+SCENARIOS = {
+    "ploomber_core": ("ploomber_core", ()),
+    "ploomber_core.telemetry": ("ploomber_core.telemetry", ()),
+    "ploomber_core.config": ("ploomber_core.config", ()),
+    "ploomber_core.exceptions": ("ploomber_core.exceptions", ()),
+    "ploomber_core.exceptions (without click)": (
+        "ploomber_core.exceptions",
+        ("click",),
+    ),
+    "ploomber_core.validate": ("ploomber_core.validate", ()),
+}
+
+_MARKER = "-- benchmark start --"
+
+# runs in the fresh interpreter, prints the import time and the third-party
+# packages that were imported
+_CHILD = """
+import json
+import sys
+import time
+
+# setting a module to None makes importing it raise ImportError
+for name in {block!r}:
+    sys.modules[name] = None
+
+# python -X importtime writes to stderr, the marker lets us ignore the modules
+# imported before this point
+sys.stderr.write("{marker}\\n")
+sys.stderr.flush()
+
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+
+stdlib = getattr(sys, "stdlib_module_names", ())
+imported = {{
+    name.split(".")[0]
+    for name in set(sys.modules) - before
+    if sys.modules[name] is not None
+}}
+ignore = {{"ploomber_core", "cython_runtime"}}
+third_party = sorted(
+    name
+    for name in imported
+    if name not in stdlib and not name.startswith("_") and name not in ignore
+)
+print(json.dumps({{"elapsed": elapsed, "third_party": third_party}}))
+"""
+
+
+def _run_child(module, block, importtime=False):
+    code = _CHILD.format(module=module, block=tuple(block), marker=_MARKER)
+    cmd = [sys.executable]
+
+    if importtime:
+        cmd.extend(["-X", "importtime"])
+
+    result = subprocess.run(
+        cmd + ["-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr, top=10):
+    """
+    Parse the output of python -X importtime, returns the modules with the
+    largest self time (in milliseconds)
+    """
+    modules = []
+    _, _, stderr = stderr.partition(_MARKER)
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append(
+            {
+                "module": name.strip(),
+                "self_ms": round(int(self_us) / 1000, 3),
+                "cumulative_ms": round(int(cumulative_us) / 1000, 3),
+            }
+        )
+
+    return sorted(modules, key=lambda m: m["self_ms"], reverse=True)[:top]
+
+
+def measure(module, block, repeat):
+    """Measure the import time of module in repeat fresh interpreters"""
+    times = []
+
+    for _ in range(repeat):
+        output, _ = _run_child(module, block)
+        times.append(output["elapsed"] * 1000)
+
+    _, stderr = _run_child(module, block, importtime=True)
+
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "third_party": output["third_party"],
+        "breakdown": parse_importtime(stderr),
+    }
+
+
+def compare(results, baseline, tolerance, slack, imports_only=False):
+    regressions = []
+
+    for name, result in results.items():
+        expected = baseline.get(name)
+
+        if expected is None:
+            continue
+
+        if not imports_only and is_regression(
+            result["median_ms"], expected["median_ms"], tolerance, slack
+        ):
+            top = ", ".join(
+                f"{m['module']} ({m['self_ms']}ms)" for m in result["breakdown"][:3]
+            )
+            regressions.append(
+                f"{name}: {result['median_ms']}ms "
+                f"(baseline: {expected['median_ms']}ms). Slowest modules: {top}"
+            )
+
+        new = sorted(set(result["third_party"]) - set(expected["third_party"]))
+
+        if new:
+            regressions.append(f"{name}: imports new packages: {', '.join(new)}")
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--slack", type=float, default=5.0)
+    parser.add_argument("--update", action="store_true")
+    parser.add_argument(
+        "--imports-only",
+        action="store_true",
+        help="Only check the imported packages (doesn't depend on the machine)",
+    )
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results = {name: measure(*SCENARIOS[name], repeat=args.repeat) for name in names}
+
+    baseline = load_baseline(BASELINE)
+    baseline_results = {} if baseline is None else baseline["results"]
+
+    report(
+        [
+            [
+                name,
+                result["median_ms"],
+                result["min_ms"],
+                baseline_results.get(name, {}).get("median_ms", "-"),
+                ", ".join(result["third_party"]) or "-",
+            ]
+            for name, result in results.items()
+        ],
+        headers=["scenario", "median (ms)", "min (ms)", "baseline (ms)", "imports"],
+    )
+
+    if args.update:
+        path = save_baseline(BASELINE, {**baseline_results, **results})
+        print(f"\nBaseline stored in {path}")
+        return
+
+    if baseline is None:
+        print("\nNo baseline found, run with --update to store one")
+        return
+
+    regressions = compare(
+        results, baseline_results, args.tolerance, args.slack, args.imports_only
+    )
+
+    if regressions:
+        fail(regressions)
+
+    print("\nNo regressions found")
+
+
+if __name__ == "__main__":
+    main()
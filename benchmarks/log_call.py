@@ -0,0 +1,253 @@
+"""
+Micro-benchmarks for the overhead that Telemetry.log_call adds to each call,
+compared to the undecorated function. For each case, the script reports:
+
+* the overhead in nanoseconds per call (best of several runs)
+* the peak memory allocated (tracemalloc) during a single call, in bytes,
+  minus the peak of the undecorated function
+* the memory retained per call after many calls (should be close to zero,
+  otherwise the wrapper is leaking memory)
+
+and compares them against the stored baseline, a case fails if the
+overhead or the peak memory exceeds the baseline by more than --tolerance
+(relative) plus --slack (nanoseconds or bytes).
+
+Events are not sent anywhere (transport="null") and the version check is
+disabled, so the numbers don't depend on the network.
+
+Usage::
+
+    python benchmarks/log_call.py             # compare with the baseline
+    python benchmarks/log_call.py --update    # store a new baseline
+"""
+
+from argparse import ArgumentParser
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from common import fail, is_regression, load_baseline, report, save_baseline
+
+BASELINE = "log_call"
+
+
+def _configure_environment(home):
+    # must happen before importing the telemetry module
+    os.environ["PLOOMBER_HOME_DIR"] = home
+    os.environ["PLOOMBER_VERSION_CHECK_DISABLED"] = "true"
+
+    # these disable telemetry regardless of the other settings
+    for name in ("CI", "READTHEDOCS"):
+        os.environ.pop(name, None)
+
+
+def _make_cases():
+    from ploomber_core.telemetry.telemetry import Telemetry
+
+    telemetry = Telemetry(
+        "KEY", "benchmark", "0.1", print_cloud_message=False, transport="null"
+    )
+    group = telemetry.create_group("group")
+
+    def add(x, y):
+        return x + y
+
+    def add_with_payload(payload, x, y):
+        payload["sum"] = x + y
+        return x + y
+
+    def raise_error(x, y):
+        raise ValueError("some error")
+
+    class Calculator:
+        def add(self, x, y):
+            return x + y
+
+    class DecoratedCalculator:
+        @group.log_call()
+        def add(self, x, y):
+            return x + y
+
+    calculator = Calculator()
+    decorated_calculator = DecoratedCalculator()
+
+    def call_and_ignore_error(function):
+        def call(x, y):
+            try:
+                function(x, y)
+            except ValueError:
+                pass
+
+        return call
+
+    # name: (stats_enabled, undecorated, decorated)
+    return {
+        "disabled": (False, add, telemetry.log_call()(add)),
+        "enabled": (True, add, telemetry.log_call()(add)),
+        "log_args": (True, add, telemetry.log_call(log_args=True)(add)),
+        "payload": (
+            True,
+            lambda x, y: add_with_payload({}, x, y),
+            telemetry.log_call(payload=True)(add_with_payload),
+        ),
+        "group_method": (True, calculator.add, decorated_calculator.add),
+        "exception": (
+            True,
+            call_and_ignore_error(raise_error),
+            call_and_ignore_error(telemetry.log_call()(raise_error)),
+        ),
+    }
+
+
+def _time_per_call(function, number, repeat):
+    """Best time per call (in nanoseconds) out of repeat runs"""
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+
+        for _ in range(number):
+            function(1, 2)
+
+        elapsed = (time.perf_counter_ns() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def _memory_per_call(function, number):
+    """
+    Returns the peak memory allocated during a single call and the memory
+    retained per call after number calls (both in bytes)
+    """
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        function(1, 2)
+        _, peak = tracemalloc.get_traced_memory()
+
+        gc.collect()
+        start, _ = tracemalloc.get_traced_memory()
+
+        for _ in range(number):
+            function(1, 2)
+
+        gc.collect()
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak - before, (end - start) / number
+
+
+def measure(stats_enabled, undecorated, decorated, number, repeat):
+    os.environ["PLOOMBER_STATS_ENABLED"] = str(stats_enabled).lower()
+
+    # warm up: the first call creates the settings files
+    for function in (undecorated, decorated):
+        for _ in range(10):
+            function(1, 2)
+
+    undecorated_ns = _time_per_call(undecorated, number, repeat)
+    decorated_ns = _time_per_call(decorated, number, repeat)
+    undecorated_peak, _ = _memory_per_call(undecorated, number)
+    decorated_peak, retained = _memory_per_call(decorated, number)
+
+    return {
+        "undecorated_ns": round(undecorated_ns, 1),
+        "decorated_ns": round(decorated_ns, 1),
+        "overhead_ns": round(decorated_ns - undecorated_ns, 1),
+        "peak_bytes": decorated_peak - undecorated_peak,
+        "retained_bytes": round(retained, 1),
+    }
+
+
+def compare(results, baseline, tolerance, slack_ns, slack_bytes):
+    regressions = []
+
+    for name, result in results.items():
+        expected = baseline.get(name)
+
+        if expected is None:
+            continue
+
+        for key, slack in (("overhead_ns", slack_ns), ("peak_bytes", slack_bytes)):
+            if is_regression(result[key], expected[key], tolerance, slack):
+                regressions.append(
+                    f"{name}: {key} is {result[key]} (baseline: {expected[key]})"
+                )
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--slack-ns", type=float, default=1000)
+    parser.add_argument("--slack-bytes", type=float, default=1024)
+    parser.add_argument("--update", action="store_true")
+    parser.add_argument("--case", action="append", help="Only run these cases")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        _configure_environment(home)
+        cases = _make_cases()
+        names = args.case or list(cases)
+        results = {
+            name: measure(*cases[name], number=args.number, repeat=args.repeat)
+            for name in names
+        }
+
+    baseline = load_baseline(BASELINE)
+    baseline_results = {} if baseline is None else baseline["results"]
+
+    report(
+        [
+            [
+                name,
+                result["overhead_ns"],
+                baseline_results.get(name, {}).get("overhead_ns", "-"),
+                result["peak_bytes"],
+                baseline_results.get(name, {}).get("peak_bytes", "-"),
+                result["retained_bytes"],
+            ]
+            for name, result in results.items()
+        ],
+        headers=[
+            "case",
+            "overhead (ns)",
+            "baseline (ns)",
+            "peak (bytes)",
+            "baseline (bytes)",
+            "retained (bytes)",
+        ],
+    )
+
+    if args.update:
+        path = save_baseline(BASELINE, {**baseline_results, **results})
+        print(f"\nBaseline stored in {path}")
+        return
+
+    if baseline is None:
+        print("\nNo baseline found, run with --update to store one")
+        return
+
+    regressions = compare(
+        results, baseline_results, args.tolerance, args.slack_ns, args.slack_bytes
+    )
+
+    if regressions:
+        fail(regressions)
+
+    print("\nNo regressions found")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,35 @@
 import warnings
 import abc
 from collections.abc import Mapping
-from pathlib import Path
+from copy import deepcopy
+import os
+import stat
 import yaml
 import random
 import string
 from contextlib import contextmanager
 
+# parsed YAML files and Config.snapshot() instances, keyed by absolute path.
+# Each entry stores the file signature so it's invalidated when the file changes
+_LOADED = {}
+_SNAPSHOTS = {}
+
+
+def _file_signature(path):
+    """
+    Return (mtime, size, inode) of a regular file, used to detect changes
+    with a single stat call. Returns None if it doesn't exist
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
 
 @contextmanager
 def set_write_attr_changes(obj, value):
@@ -146,13 +169,51 @@ class Config(abc.ABC):
 
         if self._writable_filesystem:
             path = self.path()
-            is_config_exist = Path.is_file(path)
-            if is_config_exist:
-                text = path.read_text()
-                if text:
-                    config = yaml.safe_load(text)
+            key = os.path.abspath(path)
+            signature = _file_signature(path)
 
-        return config
+            if signature is not None:
+                cached = _LOADED.get(key)
+
+                # only parse the file if it changed since the last time
+                if cached is not None and cached[0] == signature:
+                    config = cached[1]
+                else:
+                    text = path.read_text()
+
+                    if text:
+                        config = yaml.safe_load(text)
+
+                    _LOADED[key] = (signature, config)
+
+        # callers may modify the returned value
+        return deepcopy(config)
+
+    @classmethod
+    def snapshot(cls):
+        """
+        Return a process-wide instance that is only reloaded when the YAML
+        file changes (its modification time, size, or inode), so reading
+        the settings costs a single stat call. Requires path() to be a
+        classmethod
+
+        Notes
+        -----
+        The instance is shared: setting an attribute updates the file (and
+        the instance is reloaded on the next call)
+        """
+        path = cls.path()
+        key = (cls, os.path.abspath(path))
+        signature = _file_signature(path)
+        cached = _SNAPSHOTS.get(key)
+
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        instance = cls()
+        # creating the instance may have written the file
+        _SNAPSHOTS[key] = (_file_signature(path), instance)
+        return instance
 
     def _filesystem_writable(self):
         """Check if the filesystem is writable"""
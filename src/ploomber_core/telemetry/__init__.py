@@ -1,3 +1,17 @@
 from ploomber_core.telemetry.telemetry import Telemetry
+from ploomber_core.telemetry.dispatcher import EventDispatcher
+from ploomber_core.telemetry.batching import EventBatcher
+from ploomber_core.telemetry.spool import EventSpool
+from ploomber_core.telemetry.sampling import SamplingPolicy
+from ploomber_core.telemetry.aggregation import MetricsAggregator
+from ploomber_core.telemetry.transport import Transport
 
-__all__ = ["Telemetry"]
+__all__ = [
+    "Telemetry",
+    "EventDispatcher",
+    "EventBatcher",
+    "EventSpool",
+    "SamplingPolicy",
+    "MetricsAggregator",
+    "Transport",
+]
@@ -0,0 +1,391 @@
+"""
+In-process aggregation of log_call events. Instead of sending one event per
+call, calls are rolled up per action (success/error counts and a latency
+sketch) and a summary event is sent per action once per flush window and
+when the interpreter exits
+"""
+
+import atexit
+import math
+import multiprocessing
+import multiprocessing.util
+import threading
+import time
+
+
+class LatencySketch:
+    """
+    Mergeable latency histogram with logarithmic buckets (similar to
+    DDSketch): quantiles are estimated with a bounded relative error
+
+    Parameters
+    ----------
+    relative_accuracy : float, default=0.01
+        Maximum relative error of the estimated quantiles
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.aggregation import LatencySketch
+    >>> sketch = LatencySketch()
+    >>> for value in range(1, 101):
+    ...     sketch.add(value)
+    >>> round(sketch.quantile(0.5))
+    50
+    >>> sketch.count
+    100
+    """
+
+    # values below this are counted in a special bucket
+    min_value = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                f"relative_accuracy must be between 0 and 1, got {relative_accuracy}"
+            )
+
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Add a value (e.g., a duration in seconds)"""
+        if value <= self.min_value:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Merge another sketch (with the same relative accuracy) into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+
+        for name, function in (("min", min), ("max", max)):
+            values = [
+                v for v in (getattr(self, name), getattr(other, name)) if v is not None
+            ]
+            setattr(self, name, function(values) if values else None)
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1). Returns None if empty"""
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+
+        if rank < self.zero_count:
+            return 0.0
+
+        seen = self.zero_count
+
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+
+            if seen > rank:
+                value = 2 * self._gamma**index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(index): count for index, count in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.buckets = {int(index): count for index, count in data["buckets"].items()}
+
+        for key in ("zero_count", "count", "sum", "min", "max"):
+            setattr(sketch, key, data[key])
+
+        return sketch
+
+
+class ActionStats:
+    """Counts and latency sketch for a single action"""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.success = 0
+        self.error = 0
+        self.latency = LatencySketch(relative_accuracy)
+
+    def record(self, elapsed, error):
+        if error:
+            self.error += 1
+        else:
+            self.success += 1
+
+        self.latency.add(elapsed)
+
+    def merge(self, other):
+        self.success += other.success
+        self.error += other.error
+        self.latency.merge(other.latency)
+
+    def to_dict(self):
+        return {
+            "success": self.success,
+            "error": self.error,
+            "latency": self.latency.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data["latency"]["relative_accuracy"])
+        stats.success = data["success"]
+        stats.error = data["error"]
+        stats.latency = LatencySketch.from_dict(data["latency"])
+        return stats
+
+    def to_metadata(self, window):
+        """Summary sent in the metadata of the summary event"""
+        sketch = self.latency
+        return {
+            "success": self.success,
+            "error": self.error,
+            "window": window,
+            "latency": {
+                "min": sketch.min,
+                "max": sketch.max,
+                "sum": sketch.sum,
+                "p50": sketch.quantile(0.5),
+                "p90": sketch.quantile(0.9),
+                "p99": sketch.quantile(0.99),
+            },
+            "sketch": sketch.to_dict(),
+        }
+
+
+class MetricsAggregator:
+    """Roll up calls per action and periodically emit one summary per action
+
+    Parameters
+    ----------
+    flush_interval : float, default=60.0
+        Seconds between summaries
+
+    relative_accuracy : float, default=0.01
+        Relative accuracy of the latency quantiles
+
+    forward_from_children : bool, default=False
+        If True, forked processes (e.g., ``multiprocessing.Pool`` workers
+        using the "fork" start method) don't emit summaries. Instead, they
+        forward their stats to the parent process, which merges them and
+        emits a single summary per action. Children forward their stats every
+        ``child_flush_interval`` seconds and when they exit (note that
+        ``Pool.terminate`` kills workers without giving them a chance to
+        forward the last stats, use ``Pool.close`` and ``Pool.join``)
+
+    child_flush_interval : float, default=1.0
+        Seconds between forwarding stats from a forked process to the parent
+    """
+
+    def __init__(
+        self,
+        flush_interval=60.0,
+        relative_accuracy=0.01,
+        forward_from_children=False,
+        child_flush_interval=1.0,
+    ):
+        self.flush_interval = flush_interval
+        self.relative_accuracy = relative_accuracy
+        self.forward_from_children = forward_from_children
+        self.child_flush_interval = child_flush_interval
+
+        self._stats = {}
+        self._window_start = time.monotonic()
+        self._emit = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._atexit_registered = False
+
+        # used when forwarding stats from forked processes to the parent
+        self._child_queue = None
+        self._reader = None
+        self._is_child = False
+
+    def start(self, emit):
+        """
+        Start the periodic flush, emit is called with the action and the
+        summary metadata
+        """
+        self._emit = emit
+        self._start_thread()
+
+    def _start_thread(self):
+        with self._lock:
+            self._stop.clear()
+
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="ploomber-telemetry-aggregator", daemon=True
+            )
+            self._thread.start()
+
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def record(self, action, elapsed, error=False):
+        """Record a call to action that took elapsed seconds"""
+        if self._thread is None and (self._emit is not None or self._is_child):
+            # the background thread is not inherited by forked processes
+            self._start_thread()
+
+        with self._lock:
+            stats = self._stats.get(action)
+
+            if stats is None:
+                stats = self._stats[action] = ActionStats(self.relative_accuracy)
+
+            stats.record(elapsed, error)
+
+    def merge(self, action, stats):
+        """Merge ActionStats (e.g., from another process) into the current window"""
+        with self._lock:
+            current = self._stats.get(action)
+
+            if current is None:
+                self._stats[action] = stats
+            else:
+                current.merge(stats)
+
+    def snapshot(self):
+        """Return and reset the stats of the current window"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            window = time.monotonic() - self._window_start
+            self._window_start = time.monotonic()
+
+        return stats, window
+
+    def flush(self):
+        """Emit one summary per action recorded in the current window"""
+        stats, window = self.snapshot()
+
+        if self._is_child:
+            for action, action_stats in stats.items():
+                self._child_queue.put((action, action_stats.to_dict()))
+
+            return
+
+        for action, action_stats in stats.items():
+            try:
+                self._emit(action, action_stats.to_metadata(window))
+            except Exception:
+                # telemetry must never break the user's program
+                pass
+
+    def close(self):
+        """Stop the periodic flush and emit the last summaries"""
+        self._stop.set()
+
+        if self._child_queue is not None and not self._is_child:
+            self._stop_reading_from_children()
+
+        if self._emit is not None or self._is_child:
+            self.flush()
+
+    def _run(self):
+        interval = self.child_flush_interval if self._is_child else self.flush_interval
+
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def _before_fork(self):
+        if self.forward_from_children and self._child_queue is None:
+            self._child_queue = multiprocessing.get_context("fork").SimpleQueue()
+            # multiprocessing clears the exit handlers in the processes it starts,
+            # so we register them again after the fork
+            multiprocessing.util.register_after_fork(
+                self, MetricsAggregator._register_child_finalizer
+            )
+
+    def _after_fork_in_parent(self):
+        if self._child_queue is not None and self._reader is None:
+            self._reader = threading.Thread(
+                target=self._read_from_children,
+                name="ploomber-telemetry-aggregator-reader",
+                daemon=True,
+            )
+            self._reader.start()
+
+    def _after_fork_in_child(self):
+        """Discard the state inherited from the parent process"""
+        self._stats = {}
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reader = None
+
+        self._is_child = self._child_queue is not None
+
+    def _register_child_finalizer(self):
+        multiprocessing.util.Finalize(None, self.close, exitpriority=100)
+
+    def _stop_reading_from_children(self, timeout=2.0):
+        """Wait until the stats that children already forwarded are merged"""
+        reader, self._reader = self._reader, None
+
+        if reader is None:
+            return
+
+        try:
+            # the reader is the only consumer of the queue, and the queue is
+            # FIFO, so it has merged everything that was forwarded before
+            # once it reads the sentinel
+            self._child_queue.put(None)
+            reader.join(timeout)
+        except Exception:
+            pass
+
+    def _read_from_children(self):
+        while True:
+            try:
+                item = self._child_queue.get()
+            except (EOFError, OSError):
+                return
+
+            if item is None:
+                return
+
+            try:
+                action, data = item
+                self.merge(action, ActionStats.from_dict(data))
+            except Exception:
+                pass
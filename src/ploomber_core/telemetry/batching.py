@@ -0,0 +1,225 @@
+"""
+Batching of telemetry events. Events are buffered and sent together, as a
+single gzip-compressed request, once the batch is full or the oldest event
+has waited for the configured linger time
+"""
+
+import atexit
+import datetime
+import gzip
+import http.client as httplib
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def make_message(distinct_id, event, properties):
+    """Build a message in the format expected by the PostHog batch endpoint"""
+    return {
+        "type": "capture",
+        "event": event,
+        "distinct_id": distinct_id,
+        "properties": properties,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def encode_batch(api_key, messages, compression_level=6):
+    """Serialize a list of messages into a gzip-compressed batch payload"""
+    body = {
+        "api_key": api_key,
+        "batch": messages,
+        "sent_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    data = json.dumps(body, default=str).encode("utf-8")
+    return gzip.compress(data, compresslevel=compression_level)
+
+
+def post_batch(api_key, host, messages, compression_level=6, timeout=3):
+    """Send a list of messages to the PostHog batch endpoint"""
+    url = urlparse(host)
+    conn = httplib.HTTPSConnection(url.netloc, timeout=timeout)
+
+    try:
+        conn.request(
+            "POST",
+            "/batch/",
+            body=encode_batch(api_key, messages, compression_level),
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+            },
+        )
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+class EventBatcher:
+    """Buffer events and send them in batches
+
+    Parameters
+    ----------
+    max_batch_size : int, default=100
+        Send the batch as soon as it has this many events
+
+    linger_ms : int, default=1000
+        Maximum time (in milliseconds) an event waits in the buffer before
+        the batch is sent
+
+    compression_level : int, default=6
+        gzip compression level (0-9) for the batch payload
+
+    flush_timeout : float, default=2.0
+        Maximum number of seconds to wait when sending the last batch at
+        interpreter exit
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.batching import EventBatcher
+    >>> batches = []
+    >>> batcher = EventBatcher(max_batch_size=2, linger_ms=60_000)
+    >>> batcher.start(batches.append)
+    >>> batcher.add({"event": "first"})
+    >>> batcher.add({"event": "second"})
+    >>> batcher.flush()
+    >>> batches
+    [[{'event': 'first'}, {'event': 'second'}]]
+    >>> batcher.close()
+    """
+
+    def __init__(
+        self, max_batch_size=100, linger_ms=1000, compression_level=6, flush_timeout=2.0
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {max_batch_size}")
+
+        if not 0 <= compression_level <= 9:
+            raise ValueError(
+                f"compression_level must be between 0 and 9, got {compression_level}"
+            )
+
+        self.max_batch_size = max_batch_size
+        self.linger_ms = linger_ms
+        self.compression_level = compression_level
+        self.flush_timeout = flush_timeout
+
+        self._buffer = []
+        self._oldest = None
+        self._closed = False
+        self._sender = None
+        self._thread = None
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def start(self, sender):
+        """Start the background thread, sender is called with each batch"""
+        with self._cond:
+            self._sender = sender
+            self._closed = False
+
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="ploomber-telemetry-batcher", daemon=True
+            )
+            self._thread.start()
+
+            if not self._atexit_registered:
+                atexit.register(self._flush_at_exit)
+                self._atexit_registered = True
+
+    def add(self, message):
+        """Add a message to the current batch"""
+        if self._closed:
+            # the background thread is gone (e.g., the interpreter is
+            # exiting), so the message is sent in the caller's thread
+            self._send([message])
+            return
+
+        if self._thread is None and self._sender is not None:
+            # the background thread is not inherited by forked processes
+            self.start(self._sender)
+
+        with self._cond:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+
+            self._buffer.append(message)
+
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Send buffered events now, in the caller's thread"""
+        with self._cond:
+            batch = self._take()
+
+        self._send(batch)
+
+    def close(self, timeout=None):
+        """Send buffered events and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _after_fork_in_child(self):
+        """Discard the state inherited from the parent process"""
+        self._buffer = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._thread = None
+
+    def _flush_at_exit(self):
+        self.close(timeout=self.flush_timeout)
+
+    def _take(self):
+        batch, self._buffer = self._buffer, []
+        self._oldest = None
+        return batch
+
+    def _send(self, batch):
+        with self._send_lock:
+            for i in range(0, len(batch), self.max_batch_size):
+                try:
+                    self._sender(batch[i : i + self.max_batch_size])
+                except Exception:
+                    # telemetry must never break the user's program
+                    pass
+
+    def _run(self):
+        linger = self.linger_ms / 1000
+
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+
+                while (
+                    self._buffer
+                    and len(self._buffer) < self.max_batch_size
+                    and not self._closed
+                ):
+                    remaining = self._oldest + linger - time.monotonic()
+
+                    if remaining <= 0:
+                        break
+
+                    self._cond.wait(remaining)
+
+                batch = self._take()
+                closed = self._closed
+
+            self._send(batch)
+
+            if closed:
+                return
@@ -0,0 +1,209 @@
+"""
+Size budget for telemetry events. Events whose serialized size exceeds the
+budget are trimmed, lowest priority fields first: the DAG task list, the tail
+of argv, the exception message, the logged arguments and, if it's still too
+large, the largest remaining metadata fields.
+
+The size is estimated by serializing the event with orjson (if installed),
+which is much faster than the json module
+"""
+
+import json
+
+DEFAULT_MAX_BYTES = 32_768
+
+# same markers used when logging function arguments
+TRUNCATED_STR = "...[truncated]"
+TRUNCATED_LIST = "TRUNCATED"
+
+_SIZE = None
+
+
+def _json_size(obj):
+    return len(json.dumps(obj, default=str, separators=(",", ":")))
+
+
+def _load_size_function():
+    try:
+        import orjson
+    except ImportError:
+        return _json_size
+
+    def _orjson_size(obj):
+        try:
+            return len(orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS))
+        except TypeError:
+            # orjson is stricter (e.g., integers larger than 64 bits)
+            return _json_size(obj)
+
+    return _orjson_size
+
+
+def serialized_size(obj):
+    """Estimate the size (in bytes) of obj serialized as JSON
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.budget import serialized_size
+    >>> serialized_size({"key": "value"})
+    15
+    """
+    global _SIZE
+
+    if _SIZE is None:
+        _SIZE = _load_size_function()
+
+    return _SIZE(obj)
+
+
+def _truncate_str(value, max_chars):
+    return value[:max_chars] + TRUNCATED_STR
+
+
+class EventBudget:
+    """Bound the serialized size of telemetry events
+
+    Parameters
+    ----------
+    max_bytes : int, default=32_768
+        Maximum size of an event (serialized as JSON) in bytes
+
+    max_argv : int, default=10
+        Number of argv items to keep when trimming argv (longer items are
+        truncated to 200 characters)
+
+    max_exception_chars : int, default=1000
+        Number of characters of the exception message to keep when trimming
+        it
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.budget import EventBudget
+    >>> budget = EventBudget(max_bytes=200)
+    >>> properties = {"metadata": {"argv": ["bin"] + ["arg"] * 100}}
+    >>> budget.apply(properties)
+    ['argv']
+    >>> properties["metadata"]["argv"][-2:]
+    ['arg', 'TRUNCATED']
+    """
+
+    def __init__(
+        self, max_bytes=DEFAULT_MAX_BYTES, max_argv=10, max_exception_chars=1000
+    ):
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+
+        self.max_bytes = max_bytes
+        self.max_argv = max_argv
+        self.max_exception_chars = max_exception_chars
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Build a budget from a Telemetry argument (a bool, the maximum number
+        of bytes, or a budget)
+        """
+        if value is None or value is False:
+            return None
+
+        if value is True:
+            return cls()
+
+        if isinstance(value, cls):
+            return value
+
+        return cls(max_bytes=value)
+
+    def apply(self, properties):
+        """
+        Trim properties["metadata"] (in place) until the serialized
+        properties fit in the budget. Returns the names of the trimmed
+        fields, which are also stored in the "trimmed" metadata key (an empty
+        list if the event already fits)
+        """
+        if serialized_size(properties) <= self.max_bytes:
+            return []
+
+        metadata = properties.get("metadata")
+
+        if not isinstance(metadata, dict):
+            return []
+
+        # add it now so it's counted in the size
+        trimmed = metadata["trimmed"] = []
+        steps = (
+            ("dag.tasks", self._trim_dag_tasks),
+            ("argv", self._trim_argv),
+            ("exception", self._trim_exception),
+            ("args", self._drop_args),
+        )
+
+        for name, step in steps:
+            if step(metadata):
+                trimmed.append(name)
+
+                if serialized_size(properties) <= self.max_bytes:
+                    return trimmed
+
+        # as a last resort, drop the largest fields
+        sizes = {
+            key: serialized_size(value)
+            for key, value in metadata.items()
+            if key != "trimmed"
+        }
+
+        for key in sorted(sizes, key=sizes.get, reverse=True):
+            del metadata[key]
+            trimmed.append(key)
+
+            if serialized_size(properties) <= self.max_bytes:
+                break
+
+        return trimmed
+
+    def _trim_dag_tasks(self, metadata):
+        dag = metadata.get("dag")
+
+        if not isinstance(dag, dict) or "tasks" not in dag:
+            return False
+
+        # keep dag_size
+        metadata["dag"] = {key: value for key, value in dag.items() if key != "tasks"}
+        return True
+
+    def _trim_argv(self, metadata):
+        argv = metadata.get("argv")
+
+        if not isinstance(argv, list):
+            return False
+
+        trimmed = [
+            _truncate_str(arg, 200) if isinstance(arg, str) and len(arg) > 200 else arg
+            for arg in argv[: self.max_argv]
+        ]
+
+        if len(argv) > self.max_argv:
+            trimmed.append(TRUNCATED_LIST)
+
+        if trimmed == argv:
+            return False
+
+        metadata["argv"] = trimmed
+        return True
+
+    def _trim_exception(self, metadata):
+        exception = metadata.get("exception")
+        limit = self.max_exception_chars
+
+        if not isinstance(exception, str) or len(exception) <= limit:
+            return False
+
+        metadata["exception"] = _truncate_str(exception, limit)
+        return True
+
+    def _drop_args(self, metadata):
+        if "args" not in metadata:
+            return False
+
+        del metadata["args"]
+        return True
@@ -0,0 +1,190 @@
+"""
+Background dispatching of telemetry events. Instead of building and sending
+the event in the caller's thread, decorated functions push a small record
+into a bounded queue and a single worker thread calls the handler
+(usually Telemetry.log_api)
+"""
+
+import atexit
+import queue
+import threading
+import time
+
+DROP_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+_SENTINEL = object()
+
+
+class EventDispatcher:
+    """Process events in a background worker thread
+
+    Parameters
+    ----------
+    maxsize : int, default=1000
+        Maximum number of events waiting to be processed
+
+    drop_policy : str, default="drop_newest"
+        What to do when the queue is full. "drop_newest" discards the incoming
+        event, "drop_oldest" discards the oldest queued event to make room for
+        the new one, and "block" waits until there is space in the queue
+
+    flush_timeout : float, default=2.0
+        Maximum number of seconds to wait for queued events to be processed
+        when the interpreter exits
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.dispatcher import EventDispatcher
+    >>> received = []
+    >>> dispatcher = EventDispatcher(maxsize=10)
+    >>> dispatcher.start(lambda event: received.append(event["action"]))
+    >>> dispatcher.put({"action": "some-action"})
+    True
+    >>> dispatcher.flush()
+    True
+    >>> received
+    ['some-action']
+    >>> dispatcher.close()
+    """
+
+    def __init__(self, maxsize=1000, drop_policy="drop_newest", flush_timeout=2.0):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(
+                f"Invalid drop_policy: {drop_policy!r}. "
+                f"Valid values are: {', '.join(DROP_POLICIES)}"
+            )
+
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.flush_timeout = flush_timeout
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize)
+        self._handler = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._atexit_registered = False
+        self._closed = False
+
+    def start(self, handler):
+        """Start the worker thread, handler is called with each event"""
+        with self._lock:
+            self._handler = handler
+            self._closed = False
+
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="ploomber-telemetry-dispatcher", daemon=True
+            )
+            self._thread.start()
+
+            if not self._atexit_registered:
+                atexit.register(self._flush_at_exit)
+                self._atexit_registered = True
+
+    def put(self, event):
+        """Add an event to the queue. Returns False if the event was dropped"""
+        if self._closed and self._handler is not None:
+            # the worker is gone (e.g., the interpreter is exiting), so the
+            # event is processed in the caller's thread
+            try:
+                self._handler(event)
+            except Exception:
+                pass
+
+            return True
+
+        if self._thread is None and self._handler is not None:
+            # the worker is not inherited by forked processes
+            self.start(self._handler)
+
+        if self.drop_policy == "block":
+            self._queue.put(event)
+            return True
+
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return True
+            except queue.Full:
+                if self.drop_policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+
+            # drop_oldest: make room and try again
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self._queue.task_done()
+                self.dropped += 1
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued events are processed. Returns False if the
+        timeout expired before that
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                if deadline is None:
+                    self._queue.all_tasks_done.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        return False
+
+                    self._queue.all_tasks_done.wait(remaining)
+
+        return True
+
+    def close(self, timeout=None):
+        """Flush pending events and stop the worker thread"""
+        thread = self._thread
+        self._closed = True
+
+        if thread is None or not thread.is_alive():
+            return
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.flush(timeout)
+
+        # the sentinel bypasses the drop policy, so the worker always sees it
+        with self._queue.mutex:
+            self._queue.queue.append(_SENTINEL)
+            self._queue.unfinished_tasks += 1
+            self._queue.not_empty.notify()
+
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        thread.join(remaining)
+
+    def _after_fork_in_child(self):
+        """Discard the state inherited from the parent process"""
+        self._queue = queue.Queue(self.maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.dropped = 0
+
+    def _flush_at_exit(self):
+        self.close(timeout=self.flush_timeout)
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+
+            try:
+                if event is _SENTINEL:
+                    return
+
+                self._handler(event)
+            except Exception:
+                # telemetry must never break the user's program
+                pass
+            finally:
+                self._queue.task_done()
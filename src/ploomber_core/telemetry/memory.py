@@ -0,0 +1,250 @@
+"""
+Memory used by calls to functions decorated with log_call. The "rss" mode
+reads the resident set size (RSS) before and after the call (from
+/proc/self/statm, only on Linux) and the peak RSS of the process (from
+getrusage, not available on Windows), which is cheap. The "tracemalloc" mode
+also traces the Python allocations made during the call to get their peak and
+the lines that allocated the most memory, which makes the call much slower.
+
+RSS is measured for the whole process, so it includes the memory used by
+other threads during the call
+"""
+
+import os
+from pathlib import Path
+import sys
+import threading
+
+MODES = ("rss", "tracemalloc")
+DEFAULT_TOP = 5
+
+# tracemalloc is global and we reset its peak, so only one call is traced at
+# a time, nested and concurrent calls only measure RSS
+_TRACEMALLOC = threading.Lock()
+
+_PAGE_SIZE = None
+_RESOURCE = None
+
+
+def current_rss():
+    """Resident set size of the process in bytes, or None if not available"""
+    global _PAGE_SIZE
+
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    if _PAGE_SIZE is None:
+        _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+    return pages * _PAGE_SIZE
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, or None if not available"""
+    global _RESOURCE
+
+    if _RESOURCE is None:
+        try:
+            import resource
+        except ImportError:
+            # Windows
+            resource = False
+
+        _RESOURCE = resource
+
+    if not _RESOURCE:
+        return None
+
+    peak = _RESOURCE.getrusage(_RESOURCE.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _delta(after, before):
+    return None if after is None or before is None else after - before
+
+
+class MemoryMeasurement:
+    """The memory used by a call, usage is set once it finishes"""
+
+    __slots__ = (
+        "rss",
+        "peak_rss",
+        "tracing",
+        "started_tracing",
+        "snapshot",
+        "base",
+        "usage",
+    )
+
+    def __init__(self):
+        self.rss = current_rss()
+        self.peak_rss = peak_rss()
+        self.tracing = False
+        self.started_tracing = False
+        self.snapshot = None
+        self.base = None
+        self.usage = None
+
+
+class MemoryTracker:
+    """Measure the memory used by calls to a decorated function
+
+    Parameters
+    ----------
+    mode : str, default="rss"
+        "rss" measures the change in the RSS and the peak RSS of the process.
+        "tracemalloc" also traces the Python allocations made during the call
+
+    top : int, default=5
+        Number of lines that allocated the most memory to report (only in the
+        "tracemalloc" mode)
+
+    Notes
+    -----
+    The usage is a dictionary (values in bytes) with the change in RSS
+    (``rss_delta``), the peak RSS of the process after the call (``peak_rss``)
+    and how much the call raised it (``peak_rss_delta``; zero if the call
+    didn't use more memory than the process had used before). In the
+    "tracemalloc" mode, it also has the peak of the memory allocated during
+    the call (``tracemalloc_peak``) and the lines that allocated the most
+    memory that was still allocated when the call finished (``top``)
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.memory import MemoryTracker
+    >>> tracker = MemoryTracker(mode="tracemalloc")
+    >>> measurement = tracker.start()
+    >>> data = [bytes(1_000_000)]
+    >>> usage = tracker.finish(measurement)
+    >>> usage["tracemalloc_peak"] >= 1_000_000
+    True
+    """
+
+    def __init__(self, mode="rss", top=DEFAULT_TOP):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+
+        self.mode = mode
+        self.top = top
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Build a tracker from a log_call argument (None, a bool, a mode, or a
+        tracker)
+        """
+        if value is None or value is False:
+            return None
+
+        if value is True:
+            return cls()
+
+        if isinstance(value, cls):
+            return value
+
+        return cls(mode=value)
+
+    def start(self):
+        """Start measuring a call, returns a MemoryMeasurement"""
+        measurement = MemoryMeasurement()
+
+        if self.mode == "tracemalloc" and _TRACEMALLOC.acquire(blocking=False):
+            import tracemalloc
+
+            measurement.tracing = True
+
+            try:
+                if tracemalloc.is_tracing():
+                    # compare against the allocations made before the call
+                    measurement.snapshot = tracemalloc.take_snapshot()
+                else:
+                    measurement.started_tracing = True
+                    tracemalloc.start()
+
+                if hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+
+                measurement.base = tracemalloc.get_traced_memory()[0]
+            except BaseException:
+                if measurement.started_tracing:
+                    tracemalloc.stop()
+
+                _TRACEMALLOC.release()
+                raise
+
+        return measurement
+
+    def finish(self, measurement):
+        """
+        Stop measuring a call and return its usage (which is also stored in
+        measurement.usage). Never raises
+        """
+        usage = measurement.usage = {}
+
+        # measuring memory must never break the decorated function
+        try:
+            after = peak_rss()
+            usage["rss_delta"] = _delta(current_rss(), measurement.rss)
+            usage["peak_rss"] = after
+            usage["peak_rss_delta"] = _delta(after, measurement.peak_rss)
+        except Exception:
+            pass
+        finally:
+            # even if interrupted, tracemalloc is global and slows down the
+            # whole process
+            if measurement.tracing:
+                try:
+                    self._finish_tracing(measurement, usage)
+                except Exception:
+                    pass
+
+        return usage
+
+    def _finish_tracing(self, measurement, usage):
+        import tracemalloc
+
+        try:
+            usage["tracemalloc_peak"] = (
+                tracemalloc.get_traced_memory()[1] - measurement.base
+            )
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                )
+            )
+        finally:
+            if measurement.started_tracing:
+                tracemalloc.stop()
+
+            _TRACEMALLOC.release()
+
+        if measurement.snapshot is None:
+            stats = [
+                (stat.traceback[0], stat.size, stat.count)
+                for stat in snapshot.statistics("lineno")
+            ]
+        else:
+            stats = [
+                (stat.traceback[0], stat.size_diff, stat.count_diff)
+                for stat in snapshot.compare_to(measurement.snapshot, "lineno")
+            ]
+
+        stats = sorted(
+            (stat for stat in stats if stat[1] > 0),
+            key=lambda stat: stat[1],
+            reverse=True,
+        )
+        usage["top"] = [
+            {
+                # no directories, so events don't include local paths
+                "location": f"{Path(frame.filename).name}:{frame.lineno}",
+                "size": size,
+                "count": count,
+            }
+            for frame, size, count in stats[: self.top]
+        ]
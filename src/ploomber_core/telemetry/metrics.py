@@ -0,0 +1,130 @@
+"""
+In-process registry of call metrics. Functions decorated with log_call record
+the number of calls, errors, and durations (in nanoseconds, measured with
+time.perf_counter_ns) of each action, which can be queried from Python. The
+registry never sends anything
+"""
+
+import threading
+
+# memory usage (see memory.py) whose maximum is kept per action
+MEMORY_KEYS = ("rss_delta", "peak_rss_delta", "tracemalloc_peak")
+
+
+class CallMetrics:
+    """Call counts and durations (in nanoseconds) for a single action"""
+
+    __slots__ = ("calls", "errors", "total_ns", "min_ns", "max_ns", "memory")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+        # maximum memory usage, only if calls are measured (log_call(memory=...))
+        self.memory = None
+
+    def record(self, elapsed_ns, error=False, memory=None):
+        self.calls += 1
+
+        if error:
+            self.errors += 1
+
+        self.total_ns += elapsed_ns
+
+        if self.min_ns is None or elapsed_ns < self.min_ns:
+            self.min_ns = elapsed_ns
+
+        if self.max_ns is None or elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+        if memory:
+            self._record_memory(memory)
+
+    def _record_memory(self, memory):
+        if self.memory is None:
+            self.memory = {}
+
+        for key in MEMORY_KEYS:
+            value = memory.get(key)
+
+            if value is not None:
+                name = f"max_{key}"
+                previous = self.memory.get(name)
+                self.memory[name] = value if previous is None else max(previous, value)
+
+    @property
+    def mean_ns(self):
+        return self.total_ns / self.calls if self.calls else None
+
+    def to_dict(self):
+        metrics = {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ns": self.total_ns,
+            "min_ns": self.min_ns,
+            "max_ns": self.max_ns,
+            "mean_ns": self.mean_ns,
+        }
+
+        if self.memory is not None:
+            metrics["memory"] = dict(self.memory)
+
+        return metrics
+
+
+class MetricsRegistry:
+    """Call metrics per action, recorded by functions decorated with log_call
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.metrics import MetricsRegistry
+    >>> registry = MetricsRegistry()
+    >>> registry.record("some-action", 1_000)
+    >>> registry.record("some-action", 3_000, error=True)
+    >>> registry.snapshot()["some-action"]
+    {'calls': 2, 'errors': 1, 'total_ns': 4000, 'min_ns': 1000, 'max_ns': 3000, \
+'mean_ns': 2000.0}
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, action, elapsed_ns, error=False, memory=None):
+        """
+        Record a call to action that took elapsed_ns nanoseconds, memory is
+        the usage measured by a MemoryTracker (if any)
+        """
+        with self._lock:
+            metrics = self._metrics.get(action)
+
+            if metrics is None:
+                metrics = self._metrics[action] = CallMetrics()
+
+            metrics.record(elapsed_ns, error=error, memory=memory)
+
+    def get(self, action):
+        """Return the metrics of an action as a dictionary, or None"""
+        with self._lock:
+            metrics = self._metrics.get(action)
+            return None if metrics is None else metrics.to_dict()
+
+    def snapshot(self):
+        """Return the metrics of all actions (action name to dictionary)"""
+        with self._lock:
+            return {
+                action: metrics.to_dict() for action, metrics in self._metrics.items()
+            }
+
+    def reset(self):
+        """Remove all the recorded metrics"""
+        with self._lock:
+            self._metrics.clear()
+
+    def _after_fork_in_child(self):
+        # the lock might have been held by another thread when forking, and
+        # calls recorded by the parent are not the child's
+        self._lock = threading.Lock()
+        self._metrics = {}
@@ -0,0 +1,262 @@
+"""
+Exposition of the call metrics recorded by log_call (see metrics.py) in the
+OpenMetrics text format, so they can be scraped by Prometheus (or any
+compatible agent) without sending anything over the network. Metrics can be
+written to a file read by the node-exporter textfile collector, or served by a
+small HTTP server listening on localhost
+"""
+
+import os
+from pathlib import Path
+import re
+import threading
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_PREFIX = "ploomber"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9464
+
+_METRIC_NAME = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+
+# (name, type, unit, help, samples), samples are (suffix, key in CallMetrics)
+_FAMILIES = (
+    (
+        "calls",
+        "counter",
+        None,
+        "Calls to functions decorated with log_call",
+        (("_total", "calls"),),
+    ),
+    (
+        "errors",
+        "counter",
+        None,
+        "Calls to functions decorated with log_call that raised an exception",
+        (("_total", "errors"),),
+    ),
+    (
+        "call_duration_seconds",
+        "summary",
+        "seconds",
+        "Duration of calls to functions decorated with log_call",
+        (("_count", "calls"), ("_sum", "total_ns")),
+    ),
+    (
+        "call_min_duration_seconds",
+        "gauge",
+        "seconds",
+        "Duration of the fastest call",
+        (("", "min_ns"),),
+    ),
+    (
+        "call_max_duration_seconds",
+        "gauge",
+        "seconds",
+        "Duration of the slowest call",
+        (("", "max_ns"),),
+    ),
+)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(key, value):
+    # durations are stored in nanoseconds, but exposed in seconds
+    return repr(value / 1e9) if key.endswith("_ns") else str(value)
+
+
+def render(registry, prefix=DEFAULT_PREFIX, openmetrics=True):
+    """Render the metrics in a registry in the OpenMetrics text format
+
+    Parameters
+    ----------
+    registry : MetricsRegistry
+        The registry with the metrics
+
+    prefix : str, default="ploomber"
+        Prefix for the metric names
+
+    openmetrics : bool, default=True
+        If False, use the Prometheus text format (version 0.0.4), which is
+        what the node-exporter textfile collector reads
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.metrics import MetricsRegistry
+    >>> from ploomber_core.telemetry.openmetrics import render
+    >>> registry = MetricsRegistry()
+    >>> registry.record("some-action", 1_500_000_000)
+    >>> print(render(registry).splitlines()[2])
+    ploomber_calls_total{action="some-action"} 1
+    """
+    if not _METRIC_NAME.match(prefix):
+        raise ValueError(f"Invalid metric name prefix: {prefix!r}")
+
+    snapshot = registry.snapshot()
+    lines = []
+
+    for name, type_, unit, help_, samples in _FAMILIES:
+        family = f"{prefix}_{name}"
+
+        # the Prometheus format includes the _total suffix in the family name
+        if type_ == "counter" and not openmetrics:
+            family = f"{family}_total"
+
+        lines.append(f"# HELP {family} {help_}")
+        lines.append(f"# TYPE {family} {type_}")
+
+        if unit and openmetrics:
+            lines.append(f"# UNIT {family} {unit}")
+
+        for action in sorted(snapshot):
+            metrics = snapshot[action]
+            labels = f'{{action="{_escape(action)}"}}'
+
+            for suffix, key in samples:
+                value = metrics[key]
+
+                if value is not None:
+                    sample = f"{prefix}_{name}{suffix}"
+                    lines.append(f"{sample}{labels} {_format_value(key, value)}")
+
+    if openmetrics:
+        lines.append("# EOF")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(registry, path, prefix=DEFAULT_PREFIX):
+    """
+    Write the metrics to a file for the node-exporter textfile collector.
+    The file is replaced atomically, so the collector never reads a partially
+    written file. If path is a directory, metrics are written to
+    {prefix}.prom in it. Returns the path to the file
+    """
+    path = Path(path)
+
+    if path.is_dir():
+        path = path / f"{prefix}.prom"
+
+    # the collector only reads files ending in .prom
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    tmp.write_text(render(registry, prefix=prefix, openmetrics=False))
+    os.replace(tmp, path)
+    return path
+
+
+class MetricsServer:
+    """Serve the metrics over HTTP (at /metrics) from a daemon thread
+
+    Parameters
+    ----------
+    registry : MetricsRegistry
+        The registry with the metrics
+
+    host : str, default="127.0.0.1"
+        Address to listen on. Defaults to localhost so the metrics aren't
+        exposed to the network
+
+    port : int, default=9464
+        Port to listen on, pass 0 to pick a free one (see ``address``)
+
+    prefix : str, default="ploomber"
+        Prefix for the metric names
+    """
+
+    def __init__(
+        self, registry, host=DEFAULT_HOST, port=DEFAULT_PORT, prefix=DEFAULT_PREFIX
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        """The (host, port) the server is listening on, or None"""
+        server = self._server
+        return None if server is None else server.server_address[:2]
+
+    def start(self):
+        """Start listening, returns the server"""
+        with self._lock:
+            if self._server is not None:
+                return self
+
+            # imported here so importing this module stays cheap
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?", 1)[0] != "/metrics":
+                        self.send_error(404)
+                        return
+
+                    openmetrics = "application/openmetrics-text" in self.headers.get(
+                        "Accept", ""
+                    )
+                    body = render(
+                        exporter.registry,
+                        prefix=exporter.prefix,
+                        openmetrics=openmetrics,
+                    ).encode("utf-8")
+                    content_type = (
+                        OPENMETRICS_CONTENT_TYPE
+                        if openmetrics
+                        else PROMETHEUS_CONTENT_TYPE
+                    )
+
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    # don't print a line to stderr for every scrape
+                    pass
+
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._server.daemon_threads = True
+            self._thread = threading.Thread(
+                target=self._server.serve_forever,
+                name="ploomber-telemetry-metrics-server",
+                daemon=True,
+            )
+            self._thread.start()
+            return self
+
+    def close(self, timeout=None):
+        """Stop the server"""
+        with self._lock:
+            server, thread = self._server, self._thread
+            self._server = self._thread = None
+
+        if server is None:
+            return
+
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout)
+
+
+def serve(registry, host=DEFAULT_HOST, port=DEFAULT_PORT, prefix=DEFAULT_PREFIX):
+    """Start a MetricsServer and return it
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.metrics import MetricsRegistry
+    >>> from ploomber_core.telemetry.openmetrics import serve
+    >>> server = serve(MetricsRegistry(), port=0)
+    >>> server.close()
+    """
+    return MetricsServer(registry, host=host, port=port, prefix=prefix).start()
@@ -0,0 +1,257 @@
+"""
+On-demand profiling of functions decorated with log_call. When a call is
+slower than a threshold (or, at random, with a given probability), the next
+calls run under cProfile and the functions that took the longest (by
+cumulative time) are saved to a JSON file, so slow calls can be investigated
+without re-running them under a profiler
+"""
+
+import itertools
+import json
+import os
+from pathlib import Path
+import re
+import threading
+import time
+
+from ploomber_core.telemetry.sampling import _RANDOM
+
+DEFAULT_PROFILES_DIR = "profiles"
+
+# only one profiler can be enabled at a time (Python 3.12+ raises an error
+# otherwise), so nested and concurrent calls aren't profiled
+_ACTIVE = threading.Lock()
+
+_COUNTER = itertools.count()
+
+
+def _short_name(func):
+    """Format a pstats key as file.py:line(function), without the full path"""
+    filename, line, name = func
+
+    if filename == "~":
+        # built-in functions
+        return name
+
+    return f"{Path(filename).name}:{line}({name})"
+
+
+class ProfiledCall:
+    """A call running under cProfile, summary is set once it finishes"""
+
+    __slots__ = ("profile", "summary")
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.summary = None
+
+
+class SlowCallProfiler:
+    """Profile the calls that follow a slow call to a decorated function
+
+    Parameters
+    ----------
+    threshold : float, default=1.0
+        Calls that take at least this many seconds trigger profiling. If
+        None, only ``probability`` triggers it
+
+    probability : float, default=0.0
+        Probability that any call triggers profiling (between 0 and 1)
+
+    calls : int, default=1
+        Number of calls to profile once triggered
+
+    top : int, default=20
+        Number of functions (sorted by cumulative time) to save
+
+    cooldown : float, default=60.0
+        Seconds to wait after profiling before it can be triggered again, so
+        a function that is always slow isn't profiled on every call
+
+    directory : str or pathlib.Path, default=None
+        Where to save the profiles. If None, Telemetry.log_call sets it to
+        ``{home}/stats/profiles``
+
+    summary : bool, default=False
+        If True, the name of the file and the three functions that took the
+        longest are added to the event (in the ``profile`` metadata key)
+
+    max_files : int, default=100
+        Maximum number of profiles to keep in the directory, the oldest ones
+        are deleted
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.profiling import SlowCallProfiler
+    >>> profiler = SlowCallProfiler(threshold=0.5, calls=2)
+    >>> profiler.start() is None
+    True
+    >>> profiler.observe(elapsed_ns=1_000_000_000)
+    >>> profiler.pending
+    2
+    """
+
+    def __init__(
+        self,
+        threshold=1.0,
+        probability=0.0,
+        calls=1,
+        top=20,
+        cooldown=60.0,
+        directory=None,
+        summary=False,
+        max_files=100,
+    ):
+        if not 0 <= probability <= 1:
+            raise ValueError(f"probability must be between 0 and 1, got {probability}")
+
+        if calls < 1:
+            raise ValueError(f"calls must be at least 1, got {calls}")
+
+        self.threshold = threshold
+        self.probability = probability
+        self.calls = calls
+        self.top = top
+        self.cooldown = cooldown
+        self.directory = directory
+        self.summary = summary
+        self.max_files = max_files
+
+        self.pending = 0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Build a profiler from a log_call argument (None, a bool, the
+        threshold in seconds, or a profiler)
+        """
+        if value is None or value is False:
+            return None
+
+        if value is True:
+            return cls()
+
+        if isinstance(value, cls):
+            return value
+
+        return cls(threshold=value)
+
+    def observe(self, elapsed_ns):
+        """
+        Trigger profiling if a call (that wasn't profiled) was slow, or at
+        random
+        """
+        slow = self.threshold is not None and elapsed_ns >= self.threshold * 1e9
+
+        # the private generator, so seeding the global one doesn't change
+        # which calls trigger profiling
+        if not slow and not (self.probability and _RANDOM.random() < self.probability):
+            return
+
+        with self._lock:
+            if not self.pending and time.monotonic() >= self._resume_at:
+                self.pending = self.calls
+
+    def start(self):
+        """
+        Start profiling if it was triggered. Returns a ProfiledCall (pass it
+        to finish once the call finishes) or None
+        """
+        # read without the lock first, this runs on every call
+        if not self.pending:
+            return None
+
+        with self._lock:
+            if not self.pending or not _ACTIVE.acquire(blocking=False):
+                return None
+
+            self.pending -= 1
+
+            if not self.pending:
+                self._resume_at = time.monotonic() + self.cooldown
+
+        import cProfile
+
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler (not started by us) is enabled
+            _ACTIVE.release()
+            return None
+
+        return ProfiledCall(profile)
+
+    def finish(self, profiled, action, elapsed_ns):
+        """Stop profiling and save the stats. Never raises"""
+        try:
+            profiled.profile.disable()
+        finally:
+            # otherwise, no call would be profiled again
+            _ACTIVE.release()
+
+        try:
+            profiled.summary = self._save(profiled.profile, action, elapsed_ns)
+        except Exception:
+            # profiling must never break the decorated function
+            pass
+
+    def _save(self, profile, action, elapsed_ns):
+        import pstats
+
+        stats = pstats.Stats(profile)
+        # values are (primitive calls, calls, total time, cumulative time, callers)
+        items = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        top = [
+            {
+                "function": _short_name(func),
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            }
+            for func, (primitive_calls, calls, tottime, cumtime, _) in items[: self.top]
+        ]
+
+        directory = Path(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        name = re.sub(r"[^\w.-]", "_", action)
+        path = directory / f"{name}-{timestamp}-{os.getpid()}-{next(_COUNTER)}.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "action": action,
+                    "elapsed": elapsed_ns / 1e9,
+                    "timestamp": time.time(),
+                    "total_calls": stats.total_calls,
+                    "top": top,
+                },
+                indent=2,
+            )
+        )
+
+        self._prune(directory)
+
+        if not self.summary:
+            return None
+
+        return {
+            "file": path.name,
+            "top": [
+                {"function": entry["function"], "cumtime": entry["cumtime"]}
+                for entry in top[:3]
+            ],
+        }
+
+    def _prune(self, directory):
+        paths = sorted(directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+
+        for path in paths[: max(len(paths) - self.max_files, 0)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,119 @@
+"""
+Sampling policies for Telemetry.log_call. A policy decides, before calling
+the function, whether the call is logged ("head" sampling). Calls that were
+sampled out can still be logged after they finish if they raised an error or
+were slow ("tail" rules)
+"""
+
+import os
+import random
+import threading
+import time
+
+# a private generator (seeded from os.urandom), so sampling decisions don't
+# depend on (or change) the state of the global one, which users may seed
+_RANDOM = random.Random()
+
+if hasattr(os, "register_at_fork"):
+    # otherwise, forked processes make the same decisions as their parent
+    os.register_at_fork(after_in_child=_RANDOM.seed)
+
+
+class SamplingPolicy:
+    """Decide which calls to a decorated function are logged
+
+    Parameters
+    ----------
+    rate : float, default=1.0
+        Fraction of calls to log (between 0 and 1)
+
+    max_per_second : float, default=None
+        If not None, log at most this many calls per second for each action
+        (token bucket rate limit)
+
+    burst : int, default=None
+        Maximum number of calls logged in a burst when using
+        ``max_per_second``. Defaults to ``max(1, max_per_second)``
+
+    keep_errors : bool, default=True
+        Always log calls that raise an exception
+
+    slow_threshold : float, default=None
+        If not None, always log calls that take at least this many seconds
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.sampling import SamplingPolicy
+    >>> policy = SamplingPolicy(rate=0.0, slow_threshold=1.0)
+    >>> policy.should_sample("some-action")
+    False
+    >>> policy.should_keep(elapsed=2.0, error=False)
+    True
+    >>> policy.should_keep(elapsed=0.1, error=True)
+    True
+    """
+
+    def __init__(
+        self,
+        rate=1.0,
+        max_per_second=None,
+        burst=None,
+        keep_errors=True,
+        slow_threshold=None,
+    ):
+        if not 0 <= rate <= 1:
+            raise ValueError(f"rate must be between 0 and 1, got {rate}")
+
+        if max_per_second is not None and max_per_second <= 0:
+            raise ValueError(f"max_per_second must be positive, got {max_per_second}")
+
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self.burst = burst if burst is not None else max(1, max_per_second or 0)
+        self.keep_errors = keep_errors
+        self.slow_threshold = slow_threshold
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_value(cls, value):
+        """Build a policy from a log_call argument (None, a float, or a policy)"""
+        if value is None or isinstance(value, cls):
+            return value
+
+        return cls(rate=value)
+
+    def should_sample(self, action):
+        """Decide (before the call) whether a call to action is logged"""
+        if self.rate < 1 and _RANDOM.random() >= self.rate:
+            return False
+
+        if self.max_per_second is None:
+            return True
+
+        return self._take_token(action)
+
+    def should_keep(self, elapsed, error):
+        """
+        Decide (after the call) whether a call that was sampled out is logged
+        anyway. elapsed is the duration in seconds
+        """
+        if error:
+            return self.keep_errors
+
+        return self.slow_threshold is not None and elapsed >= self.slow_threshold
+
+    def _take_token(self, action):
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, last = self._buckets.get(action, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.max_per_second)
+
+            if tokens >= 1:
+                self._buckets[action] = (tokens - 1, now)
+                return True
+
+            self._buckets[action] = (tokens, now)
+            return False
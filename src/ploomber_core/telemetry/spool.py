@@ -0,0 +1,310 @@
+"""
+Durable on-disk spool for telemetry events. Events are appended to a
+newline-delimited JSON file and sent in batches later (from a background
+thread, periodically while the process logs events, or by a later process),
+so a slow or unavailable network never stalls the caller and events are not
+lost.
+
+Concurrent processes coordinate through a lock file: appends take a shared
+lock, while replaying and compacting take an exclusive one
+"""
+
+from contextlib import contextmanager
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+
+try:
+    import fcntl
+except ModuleNotFoundError:  # Windows
+    fcntl = None
+
+# replays that take longer than this (in seconds) are assumed to have died
+STALE_REPLAY_AGE = 3600
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill terminates the process on Windows, rely on the file's age
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g., the process belongs to another user
+        return True
+
+    return True
+
+
+@contextmanager
+def _file_lock(path, exclusive):
+    """Lock a file (shared or exclusive). This is a no-op if fcntl is missing"""
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+        yield
+    finally:
+        # closing the file descriptor releases the lock
+        os.close(fd)
+
+
+class EventSpool:
+    """Append-only file that stores telemetry events until they're sent
+
+    Parameters
+    ----------
+    path : str or pathlib.Path, default=None
+        Path to the spool file. If None, Telemetry stores it in the stats
+        directory inside the ploomber home directory
+
+    max_bytes : int, default=5_000_000
+        Maximum size of the spool file. When exceeded, the oldest events are
+        evicted
+
+    max_age : float, default=604_800
+        Maximum age (in seconds) of spooled events; older ones are evicted.
+        Defaults to one week
+
+    batch_size : int, default=100
+        Number of events to send per batch when replaying
+
+    low_water : float, default=0.75
+        When the spool exceeds max_bytes, the oldest events are evicted until
+        it's below this fraction of max_bytes, so it isn't compacted again on
+        the next append
+
+    replay_interval : float, default=10.0
+        Minimum number of seconds between replays
+
+    max_replay_interval : float, default=600.0
+        Replays that fail to send events are retried with exponential
+        backoff, up to this many seconds apart
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_bytes=5_000_000,
+        max_age=604_800,
+        batch_size=100,
+        low_water=0.75,
+        replay_interval=10.0,
+        max_replay_interval=600.0,
+    ):
+        if not 0 < low_water <= 1:
+            raise ValueError(f"low_water must be between 0 and 1, got {low_water}")
+
+        self.path = None if path is None else Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.replay_interval = replay_interval
+        self.max_replay_interval = max_replay_interval
+
+        self._replaying = False
+        self._next_replay = 0.0
+        self._replay_delay = replay_interval
+        self._replay_lock = threading.Lock()
+
+    @property
+    def _lock_path(self):
+        return self.path.with_name(self.path.name + ".lock")
+
+    def append(self, message):
+        """Append a message to the spool"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps({"time": time.time(), "message": message}, default=str)
+        data = (line + "\n").encode("utf-8")
+
+        with _file_lock(self._lock_path, exclusive=False):
+            # a single write to a file opened with O_APPEND so lines from
+            # concurrent processes don't interleave
+            fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+
+        if size > self.max_bytes:
+            self.compact()
+
+    def compact(self):
+        """
+        Remove corrupted and expired events and, if over max_bytes, the oldest
+        events until the spool is below the low water mark
+        """
+        with _file_lock(self._lock_path, exclusive=True):
+            if not self.path.exists():
+                return
+
+            lines = self._fresh_lines(self.path.read_bytes().splitlines())
+
+            total = sum(len(line) + 1 for line in lines)
+            target = (
+                self.max_bytes * self.low_water if total > self.max_bytes else total
+            )
+            start = 0
+
+            while total > target and start < len(lines):
+                total -= len(lines[start]) + 1
+                start += 1
+
+            self._rewrite(lines[start:])
+
+    def replay(self, sender):
+        """
+        Send spooled events in batches. Events that fail to send are kept in
+        the spool. Returns the number of events sent
+        """
+        return self._replay(sender)[0]
+
+    def replay_in_background(self, sender):
+        """
+        Replay events in a daemon thread, unless a replay is running or the
+        last one was too recent (see replay_interval)
+        """
+        with self._replay_lock:
+            if self._replaying or time.monotonic() < self._next_replay:
+                return
+
+            self._replaying = True
+
+        thread = threading.Thread(
+            target=self._replay_silently,
+            args=(sender,),
+            name="ploomber-telemetry-spool",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _after_fork_in_child(self):
+        # the parent process is in charge of replaying
+        self._replay_lock = threading.Lock()
+        self._next_replay = math.inf
+
+    def _replay(self, sender):
+        """Returns the number of events sent, and whether sending failed"""
+        if self.path is None:
+            return 0, False
+
+        # take ownership of the current spool by renaming it, so other
+        # processes can keep appending (to a new file) while we send
+        replay_path = self.path.with_name(f"{self.path.name}.replay-{os.getpid()}")
+
+        with _file_lock(self._lock_path, exclusive=True):
+            stale = self._stale_replay_paths()
+
+            if not self.path.exists() and not stale:
+                return 0, False
+
+            if stale:
+                # events left by processes that died while replaying
+                paths = stale + [self.path] if self.path.exists() else stale
+                tmp = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+                tmp.write_bytes(b"".join(path.read_bytes() for path in paths))
+                os.replace(tmp, replay_path)
+
+                for path in paths:
+                    path.unlink()
+            else:
+                os.replace(self.path, replay_path)
+
+        failed = False
+
+        try:
+            lines = self._fresh_lines(replay_path.read_bytes().splitlines())
+            sent = 0
+
+            for i in range(0, len(lines), self.batch_size):
+                chunk = lines[i : i + self.batch_size]
+                messages = [json.loads(line)["message"] for line in chunk]
+
+                try:
+                    sender(messages)
+                except Exception:
+                    # put back the pending events so another process retries
+                    self._put_back(lines[i:])
+                    failed = True
+                    break
+
+                sent += len(chunk)
+        finally:
+            replay_path.unlink()
+
+        return sent, failed
+
+    def _replay_silently(self, sender):
+        try:
+            failed = self._replay(sender)[1]
+        except Exception:
+            failed = True
+
+        with self._replay_lock:
+            if failed:
+                self._replay_delay = min(
+                    self._replay_delay * 2, self.max_replay_interval
+                )
+            else:
+                self._replay_delay = self.replay_interval
+
+            self._next_replay = time.monotonic() + self._replay_delay
+            self._replaying = False
+
+    def _stale_replay_paths(self):
+        """
+        Files left by replays that didn't finish (the process died), must hold
+        the exclusive lock
+        """
+        stale = []
+
+        for path in self.path.parent.glob(f"{self.path.name}.replay-*"):
+            try:
+                pid = int(path.name.rsplit("-", 1)[1])
+                age = time.time() - path.stat().st_mtime
+            except (ValueError, OSError):
+                continue
+
+            if pid != os.getpid() and (age > STALE_REPLAY_AGE or not _pid_alive(pid)):
+                stale.append(path)
+
+        return stale
+
+    def _put_back(self, lines):
+        with _file_lock(self._lock_path, exclusive=True):
+            existing = self.path.read_bytes().splitlines() if self.path.exists() else []
+            self._rewrite(lines + existing)
+
+    def _fresh_lines(self, lines):
+        """Drop corrupted and expired lines"""
+        oldest = time.time() - self.max_age
+        fresh = []
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+
+            if isinstance(record, dict) and record.get("time", 0) >= oldest:
+                fresh.append(line)
+
+        return fresh
+
+    def _rewrite(self, lines):
+        """Atomically replace the spool content, must hold the exclusive lock"""
+        tmp = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        tmp.write_bytes(b"".join(line + b"\n" for line in lines))
+        os.replace(tmp, self.path)
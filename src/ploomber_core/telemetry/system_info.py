@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import platform
+import re
 import sys
 
 
@@ -128,6 +129,32 @@ def get_package_version(package_name):
         return None
 
 
+def _normalize_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def get_ploomber_packages():
+    """
+    Return the names of the installed packages that depend on ploomber-core
+    (e.g., ploomber, jupysql), including ploomber-core
+    """
+    names = {"ploomber-core"}
+
+    for distribution in importlib_metadata.distributions():
+        for requirement in distribution.requires or []:
+            # skip optional dependencies, e.g., "ploomber-core; extra == 'dev'"
+            if "extra" in requirement.partition(";")[2]:
+                continue
+
+            requirement_name = re.split(r"[\s<>=!~;\[(]", requirement, maxsplit=1)[0]
+
+            if _normalize_name(requirement_name) == "ploomber-core":
+                names.add(_normalize_name(distribution.metadata["Name"]))
+                break
+
+    return sorted(names)
+
+
 def get_system_info():
     return {
         "os": safe_call(get_os),
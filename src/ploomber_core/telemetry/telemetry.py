@@ -29,8 +29,14 @@ The data we collect is limited to:
 
 """
 
-from copy import copy
-from inspect import signature, _empty
+from inspect import (
+    signature,
+    iscoroutinefunction,
+    isgeneratorfunction,
+    isasyncgenfunction,
+    Parameter,
+)
+import atexit
 import logging
 import datetime
 import http.client as httplib
@@ -38,31 +44,49 @@ import json
 import os
 from pathlib import Path
 import sys
+import threading
 from uuid import uuid4
-from functools import wraps
+from functools import partial, wraps
 import warnings
 import random
-
-import posthog
+import time
+import weakref
 
 from ploomber_core.telemetry import validate_inputs
-from ploomber_core.config import Config
-from ploomber_core.telemetry.system_info import get_system_info, get_package_version
+from ploomber_core.telemetry.dispatcher import EventDispatcher
+from ploomber_core.telemetry.batching import EventBatcher, make_message
+from ploomber_core.telemetry.spool import EventSpool
+from ploomber_core.telemetry.sampling import SamplingPolicy
+from ploomber_core.telemetry.aggregation import MetricsAggregator
+from ploomber_core.telemetry.transport import make_transport
+from ploomber_core.telemetry.budget import EventBudget
+from ploomber_core.telemetry.memory import MemoryTracker
+from ploomber_core.telemetry.metrics import MetricsRegistry
+from ploomber_core.telemetry.profiling import DEFAULT_PROFILES_DIR, SlowCallProfiler
+from ploomber_core.telemetry.tracing import Tracer
+from ploomber_core.telemetry.version_cache import VersionCache
+from ploomber_core.config import Config, _file_signature
+from ploomber_core.telemetry.system_info import (
+    get_system_info,
+    get_package_version,
+    get_ploomber_packages,
+)
 
 TELEMETRY_VERSION = "0.5"
 DEFAULT_HOME_DIR = str(Path.home() / ".ploomber")
 DEFAULT_USER_CONF = "config.yaml"
 DEFAULT_PLOOMBER_CONF = "uid.yaml"
+DEFAULT_SPOOL = "spool.jsonl"
+DEFAULT_EVENTS_LOG = "events.jsonl"
+DEFAULT_VERSION_CACHE = "latest-versions.json"
 CONF_DIR = "stats"
+DEFAULT_DAG_SAMPLE_SIZE = 10
 PLOOMBER_HOME_DIR = os.getenv("PLOOMBER_HOME_DIR")
 # posthog client logs errors which are confusing for users
 # https://github.com/PostHog/posthog-python/blob/fd92502d990499a61804034e3feb7e17f64a14a1/posthog/consumer.py#L81
 logging.getLogger("posthog").disabled = True
 
 
-SYSTEM_INFO = get_system_info()
-
-
 class UserSettings(Config):
     """User-customizable settings"""
 
@@ -137,28 +161,188 @@ def clean_tasks_upstream_products(input):
     return clean_input
 
 
-def parse_dag(dag):
-    try:
-        dag_dict = {}
-        dag_dict["dag_size"] = str(len(dag))
-        tasks_list = list(dag)
-        if tasks_list:
-            dag_dict["tasks"] = {}
-            for task in tasks_list:
-                task_dict = {}
-                task_dict["status"] = dag[task]._exec_status.name
-                task_dict["type"] = str(type(dag[task])).split(".")[-1].split("'")[0]
-                task_dict["upstream"] = clean_tasks_upstream_products(
-                    dag[task].upstream
-                )
-                task_dict["products"] = clean_tasks_upstream_products(
-                    dag[task].product.to_json_serializable()
-                )
-                dag_dict["tasks"][task] = task_dict
+def _parse_task(task):
+    return {
+        "status": task._exec_status.name,
+        "type": type(task).__name__,
+        "upstream": clean_tasks_upstream_products(task.upstream),
+        "products": clean_tasks_upstream_products(task.product.to_json_serializable()),
+    }
+
+
+class DAGSnapshots:
+    """
+    The structure (tasks and their upstream dependencies) and the task
+    states (status and serialized product) of the last parsed version of
+    each DAG, used by parse_dag to log only what changed. DAGs are tracked by
+    identity, and their snapshot is removed when they're garbage collected
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+
+    def get(self, dag):
+        """Return the (structure, states) snapshot of a DAG, or None"""
+        entry = self._snapshots.get(id(dag))
+
+        if entry is None or entry[0]() is not dag:
+            return None
+
+        return entry[1]
+
+    def set(self, dag, snapshot):
+        key = id(dag)
+
+        try:
+            ref = weakref.ref(dag, lambda _: self._snapshots.pop(key, None))
+        except TypeError:
+            # can't tell if it's the same object next time
+            return
+
+        self._snapshots[key] = (ref, snapshot)
+
+
+def _parse_dag(dag, full, max_tasks, track=False, previous=None):
+    """
+    Parse a DAG in a single pass. If track is True, it also returns a
+    snapshot of its structure and task states; if previous is a snapshot,
+    only the tasks whose state changed are included
+    """
+    n_tasks = len(dag)
+    dag_dict = {}
+    dag_dict["dag_size"] = str(n_tasks)
+
+    status, types, tasks = {}, {}, {}
+    downstream = {}
+    edges = max_upstream = sources = changed = 0
+    structure, states = [], {}
+    previous_states = None if previous is None else previous[1]
+
+    for name in dag:
+        task = dag[name]
+        status_name = task._exec_status.name
+        status[status_name] = status.get(status_name, 0) + 1
+        type_name = type(task).__name__
+        types[type_name] = types.get(type_name, 0) + 1
+
+        upstream = task.upstream
+        n_upstream = len(upstream)
+        edges += n_upstream
+        max_upstream = max(max_upstream, n_upstream)
+
+        if not n_upstream:
+            sources += 1
+
+        for upstream_name in upstream:
+            downstream[upstream_name] = downstream.get(upstream_name, 0) + 1
+
+        if track:
+            structure.append((name, tuple(upstream)))
+            # the serialized product, since products may change in place and
+            # the snapshot must not keep them alive
+            product = str(task.product.to_json_serializable())
+            state = states[name] = (status_name, product)
+
+            if previous_states is not None:
+                if previous_states.get(name) == state:
+                    continue
+
+                changed += 1
+
+        if full or len(tasks) < max_tasks:
+            tasks[name] = _parse_task(task)
+
+    if n_tasks:
+        if not full:
+            dag_dict["status"] = status
+            dag_dict["types"] = types
+            dag_dict["degree"] = {
+                "edges": edges,
+                "max_upstream": max_upstream,
+                "max_downstream": max(downstream.values(), default=0),
+                "sources": sources,
+                "sinks": n_tasks - len(downstream),
+            }
+
+        dag_dict["tasks"] = tasks
+
+    if previous_states is not None:
+        dag_dict["changed"] = changed
+
+    snapshot = (tuple(structure), states) if track else None
+    return dag_dict, snapshot
+
+
+class _ParsedDAG:
+    """
+    A DAG that was already parsed (see Telemetry._freeze_event), and its new
+    snapshot, which is stored once the event is logged with its task list
+    """
+
+    __slots__ = ("value", "dag", "snapshot")
+
+    def __init__(self, value, dag=None, snapshot=None):
+        self.value = value
+        self.dag = dag
+        self.snapshot = snapshot
+
+
+def parse_dag(dag, full=False, max_tasks=DEFAULT_DAG_SAMPLE_SIZE, snapshots=None):
+    """
+    Summarize a DAG (it returns None if it fails). The summary contains the
+    number of tasks per status and type, degree statistics (number of edges,
+    maximum number of upstream and downstream dependencies, and the number of
+    tasks without upstream dependencies or without downstream dependencies),
+    and the details (status, type, upstream and products) of the first
+    max_tasks tasks. Everything is computed in a single pass over the tasks
+
+    If full=True, it returns the details of every task instead (this is
+    slow, and the output is large for DAGs with many tasks)
+
+    If snapshots (a DAGSnapshots instance) is passed and the same DAG object
+    was parsed before, and its structure (tasks and upstream dependencies)
+    didn't change, only the tasks whose status or product changed are
+    included, "incremental" is set to True, and "changed" contains the
+    number of changed tasks
+    """
+    if snapshots is None:
+        try:
+            dag_dict, _ = _parse_dag(dag, full, max_tasks)
+        except Exception:
+            return None
 
         return dag_dict
+
+    dag_dict, snapshot = _parse_dag_incremental(dag, full, max_tasks, snapshots)
+
+    if snapshot is not None:
+        snapshots.set(dag, snapshot)
+
+    return dag_dict
+
+
+def _parse_dag_incremental(dag, full, max_tasks, snapshots):
+    """
+    Like parse_dag, but it returns the summary and the new snapshot instead
+    of storing it, so it can be stored once the summary is logged. Returns
+    (None, None) if it fails
+    """
+    try:
+        previous = snapshots.get(dag)
+        dag_dict, snapshot = _parse_dag(
+            dag, full, max_tasks, track=True, previous=previous
+        )
+
+        if previous is not None:
+            if snapshot[0] == previous[0]:
+                dag_dict["incremental"] = True
+            else:
+                # the tasks or their dependencies changed, log it as a new DAG
+                dag_dict, snapshot = _parse_dag(dag, full, max_tasks, track=True)
+
+        return dag_dict, snapshot
     except Exception:
-        return None
+        return None, None
 
 
 def get_home_dir():
@@ -189,22 +373,82 @@ def check_dir_exist(input_location=None):
     return p
 
 
-def check_telemetry_enabled():
+# (home directory, conf directory) -> path to the user settings file, and
+# path -> (file signature, stats_enabled, time it was checked), used by
+# check_telemetry_enabled
+_USER_SETTINGS_PATHS = {}
+_STATS_ENABLED = {}
+
+# seconds a value read from the config file is used by coroutines before
+# checking again if the file changed
+_STATS_ENABLED_MAX_AGE = 10.0
+
+
+def check_telemetry_enabled(cached=False):
     """
     Check if the user allows us to use telemetry. In order of precedence:
 
     1. If the CI (GtiHub Actions) or READTHEDOCS env var is set, return False
     2. If PLOOMBER_STATS_ENABLED defined, check its value
     3. Otherwise use the value in stats_enabled in the config.yaml file
+
+    Environment variables are checked on every call, the config file is only
+    loaded again if it changed. If cached is True, the value read the last
+    time is used without checking if the file changed (so it doesn't touch
+    the file system, e.g., when called from an event loop), and it returns
+    None if the file was never read, or was checked more than 10 seconds ago
     """
-    if "CI" in os.environ or "READTHEDOCS" in os.environ:
+    environ = os.environ
+
+    if "CI" in environ or "READTHEDOCS" in environ:
         return False
 
-    if "PLOOMBER_STATS_ENABLED" in os.environ:
-        return os.environ["PLOOMBER_STATS_ENABLED"].lower() == "true"
+    value = environ.get("PLOOMBER_STATS_ENABLED")
+
+    if value is not None:
+        return value.lower() == "true"
 
-    settings = UserSettings()
-    return settings.stats_enabled
+    # this runs on every call to a function decorated with log_call, so
+    # resolve the path once and only load the settings if the file changed
+    location = (get_home_dir(), CONF_DIR)
+    path = _USER_SETTINGS_PATHS.get(location)
+
+    if cached:
+        entry = None if path is None else _STATS_ENABLED.get(path)
+
+        if entry is None or time.monotonic() - entry[2] > _STATS_ENABLED_MAX_AGE:
+            return None
+
+        return entry[1]
+
+    if path is None:
+        path = _USER_SETTINGS_PATHS[location] = str(UserSettings.path())
+
+    signature = _file_signature(path)
+    entry = _STATS_ENABLED.get(path)
+
+    if entry is not None and entry[0] == signature:
+        stats_enabled = entry[1]
+    else:
+        stats_enabled = UserSettings.snapshot().stats_enabled
+        # loading the settings may have created the file
+        signature = _file_signature(path)
+
+    _STATS_ENABLED[path] = (signature, stats_enabled, time.monotonic())
+    return stats_enabled
+
+
+async def _check_telemetry_enabled_off_loop():
+    """
+    Read the config file in the default executor, so the event loop isn't
+    blocked. Once read, coroutines use check_telemetry_enabled(cached=True),
+    and call this again once the value expires, so changes to the file are
+    picked up even if no events are logged
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, check_telemetry_enabled)
 
 
 def check_first_time_usage():
@@ -212,12 +456,25 @@ def check_first_time_usage():
     The function checks for first time usage if the conf file exists and the
     uid file doesn't exist.
     """
+    internal = _get_internal()
     first_time = internal.is_first_time()
     if first_time:
         internal.first_time = False
     return first_time
 
 
+def _request_latest_version(conn, package_name):
+    conn.request("GET", f"/pypi/{package_name}/json")
+    response = conn.getresponse()
+    # read the whole response so the connection can be reused
+    content = response.read()
+
+    if response.status != 200:
+        raise ValueError(f"Unexpected status: {response.status}")
+
+    return json.loads(content)["info"]["version"]
+
+
 def get_latest_version(package_name, version):
     """
     The function checks for the latest available ploomber version
@@ -225,24 +482,60 @@ def get_latest_version(package_name, version):
     """
     conn = httplib.HTTPSConnection("pypi.org", timeout=1)
     try:
-        conn.request("GET", f"/pypi/{package_name}/json")
-        content = conn.getresponse().read()
-        data = json.loads(content)
-        latest = data["info"]["version"]
-        return latest
+        return _request_latest_version(conn, package_name)
     except Exception:
         return version
     finally:
         conn.close()
 
 
+def get_latest_versions(package_names, max_workers=4, timeout=1):
+    """
+    Look up the latest version of several packages concurrently. Each worker
+    thread reuses a single keep-alive connection to pypi.org. Returns a
+    dictionary with the package names as keys, values are None if the
+    lookup failed
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    package_names = list(package_names)
+
+    if not package_names:
+        return {}
+
+    local = threading.local()
+    connections = []
+
+    def lookup(package_name):
+        conn = getattr(local, "conn", None)
+
+        if conn is None:
+            conn = local.conn = httplib.HTTPSConnection("pypi.org", timeout=timeout)
+            connections.append(conn)
+
+        try:
+            return _request_latest_version(conn, package_name)
+        except Exception:
+            # the connection might be in a bad state, close it so the next
+            # request opens a new one
+            conn.close()
+            return None
+
+    try:
+        with ThreadPoolExecutor(min(max_workers, len(package_names))) as executor:
+            return dict(zip(package_names, executor.map(lookup, package_names)))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
 def is_cloud_user():
     """
     The function checks if the cloud api key is set for the user.
     Checks if the cloud_key is set in the User conf file (config.yaml).
     returns True/False accordingly.
     """
-    settings = UserSettings()
+    settings = UserSettings.snapshot()
     return settings.cloud_key is not None
 
 
@@ -252,7 +545,7 @@ def email_registered():
     Checks if the user_email is set in the User conf file (config.yaml).
     returns True/False accordingly.
     """
-    settings = UserSettings()
+    settings = UserSettings.snapshot()
     return settings.user_email
 
 
@@ -262,8 +555,12 @@ def check_version(package_name, version):
     This check will be skipped if the version_check_enabled is set to False
     If it's not the latest, notifies the user and saves the metadata to conf
     Alerting every 2 days on stale versions
+
+    The latest version is read from a cache shared by all processes. If the
+    cache is missing or stale, it's updated in a background thread, so the
+    notification is displayed by the next call that reads it
     """
-    settings = UserSettings()
+    settings = UserSettings.snapshot()
 
     if not settings.version_check_enabled:
         return
@@ -273,22 +570,36 @@ def check_version(package_name, version):
     if "PLOOMBER_VERSION_CHECK_DISABLED" in os.environ:
         return
 
-    now = datetime.datetime.now()
-
-    # Check if we already notified in the last 2 days
-    if internal.last_version_check and (now - internal.last_version_check).days < 2:
+    # If in development mode we don't want to display the warning
+    if "dev" in version:
         return
 
+    cache = VersionCache(check_dir_exist(CONF_DIR) / DEFAULT_VERSION_CACHE)
+    entry = cache.get(package_name)
+
     # check latest version (this is an expensive call since it hits pypi.org)
-    # so we only ping the server when it's been 2 days
-    latest = get_latest_version(package_name, version)
+    # so we only ping the server when the cached value is stale
+    # other ploomber packages are checked in the same pass, so they can read
+    # the cache without hitting pypi.org
+    if not cache.is_fresh(entry):
+        cache.refresh_in_background(
+            package_name, get_latest_versions, related=get_ploomber_packages
+        )
 
-    # If latest version, do nothing
-    if version == latest:
+    if entry is None:
         return
 
-    # If in development mode we don't want to display the warning
-    if "dev" in version:
+    latest = entry["latest"]
+
+    # If latest version (or the lookup failed), do nothing
+    if latest is None or version == latest:
+        return
+
+    now = datetime.datetime.now()
+    internal = _get_internal()
+
+    # Check if we already notified in the last 2 days
+    if internal.last_version_check and (now - internal.last_version_check).days < 2:
         return
 
     print(
@@ -303,7 +614,7 @@ def check_version(package_name, version):
 
 def check_cloud():
     """Displays a message to ask the user to sign up for Ploomber Cloud"""
-    settings = UserSettings()
+    settings = UserSettings.snapshot()
 
     if not settings.version_check_enabled:
         return
@@ -314,6 +625,7 @@ def check_cloud():
         return
 
     now = datetime.datetime.now()
+    internal = _get_internal()
 
     # Check if we already notified in the last 2 days
     if internal.last_cloud_check and (now - internal.last_cloud_check).days < 1:
@@ -348,7 +660,7 @@ def _get_telemetry_info():
         # Check first time install
         is_install = check_first_time_usage()
 
-        return telemetry_enabled, internal.uid, is_install
+        return telemetry_enabled, _get_internal().uid, is_install
     else:
         return False, "", False
 
@@ -378,18 +690,49 @@ class TelemetryGroup:
         self._telemetry = telemetry
         self._group = group
 
-    def log_call(self, action=None, payload=False, log_args=False, ignore_args=None):
+    def log_call(
+        self,
+        action=None,
+        payload=False,
+        log_args=False,
+        ignore_args=None,
+        sample=None,
+        aggregate=False,
+        profile_slow_calls=None,
+        memory=None,
+    ):
         return self._telemetry.log_call(
             action=action,
             payload=payload,
             log_args=log_args,
             ignore_args=ignore_args,
             group=self._group,
+            sample=sample,
+            aggregate=aggregate,
+            profile_slow_calls=profile_slow_calls,
+            memory=memory,
         )
 
 
 class Telemetry:
-    def __init__(self, api_key, package_name, version, *, print_cloud_message=True):
+    def __init__(
+        self,
+        api_key,
+        package_name,
+        version,
+        *,
+        print_cloud_message=True,
+        dispatcher=False,
+        batcher=False,
+        spool=False,
+        aggregator=None,
+        transport=None,
+        budget=True,
+        full_dag=False,
+        incremental_dag=True,
+        metrics=False,
+        tracing=False,
+    ):
         """
 
         Parameters
@@ -406,6 +749,71 @@ class Telemetry:
         print_cloud_message : bool, default=True
             If True, it'll print a message to ask the user to sign up for
             Ploomber Cloud
+
+        dispatcher : bool or EventDispatcher, default=False
+            If True (or an EventDispatcher instance), functions decorated with
+            ``log_call`` only queue the event and a background thread logs it.
+            Pass an EventDispatcher to customize the queue size, drop policy,
+            and the timeout to flush events when the interpreter exits
+
+        batcher : bool or EventBatcher, default=False
+            If True (or an EventBatcher instance), events are buffered and sent
+            in gzip-compressed batches instead of one request per event. Pass
+            an EventBatcher to customize the batch size, linger time, and
+            compression level
+
+        spool : bool or EventSpool, default=False
+            If True (or an EventSpool instance), events are appended to a file
+            in the ploomber home directory, and sent in batches (in a background
+            thread) the next time a process logs an event. Pass an EventSpool
+            to customize the location, size and age limits
+
+        aggregator : MetricsAggregator, default=None
+            Aggregator used by functions decorated with
+            ``log_call(aggregate=True)``. If None, a MetricsAggregator with the
+            default settings is created the first time it's needed
+
+        transport : str or Transport, default=None
+            How to deliver events: "posthog", "jsonl" (append to
+            ``{home}/stats/events.jsonl``), "jsonl:{path}", "memory" (keep the
+            last events in memory), "null" (discard events), or a Transport
+            instance. If None, it uses the value in the
+            PLOOMBER_TELEMETRY_TRANSPORT environment variable, and defaults to
+            "posthog"
+
+        budget : bool, int or EventBudget, default=True
+            If True (or an EventBudget instance), events larger than 32 KiB
+            (serialized as JSON) are trimmed, lowest priority fields first
+            (DAG tasks, the tail of argv, the exception message, and the
+            logged arguments); the trimmed fields are listed in the "trimmed"
+            metadata key. Pass an int to change the limit (in bytes), or False
+            to disable it
+
+        full_dag : bool, default=False
+            DAGs passed in the "dag" metadata key are summarized (number of
+            tasks per status and type, degree statistics, and the details of
+            the first 10 tasks). If True, the status, type, upstream and
+            products of every task are logged instead
+
+        incremental_dag : bool, default=True
+            If True, when the same DAG object is logged again (and its tasks
+            and dependencies didn't change), only the tasks whose status or
+            product changed since the last event are logged
+
+        metrics : bool or MetricsRegistry, default=False
+            If True (or a MetricsRegistry instance), functions decorated with
+            ``log_call`` record their number of calls, errors, and durations
+            (in nanoseconds) per action in the ``metrics`` attribute, which
+            can be queried from Python. It never sends anything, so calls are
+            recorded even if telemetry is disabled
+
+        tracing : bool or Tracer, default=False
+            If True (or a Tracer instance), each call to a function decorated
+            with ``log_call`` is recorded as a span in the ``tracer``
+            attribute, nested under the span of the decorated function that
+            called it (if any). Events include the ``trace_id``, ``span_id``
+            and ``parent_span_id`` in their metadata. Spans are recorded even
+            if telemetry is disabled
         """
         if "_PLOOMBER_TELEMETRY_DEBUG" in os.environ:
             warnings.warn(
@@ -418,24 +826,68 @@ class Telemetry:
         self.package_name = package_name
         self.version = version
         self.print_cloud_message = print_cloud_message
+        self.full_dag = full_dag
+        self._dag_snapshots = DAGSnapshots() if incremental_dag else None
 
-        # Initialize PostHog client
-        try:
-            self._posthog_client = posthog.Posthog(
-                api_key, host="https://us.i.posthog.com"
-            )
-        except Exception as e:
-            raise ImportError(
-                "Failed to initialize posthog client. This likely means your posthog "
-                "version is incompatible. To fix this, either upgrade to posthog>=3.0 "
-                "or downgrade to ploomber-core<=0.2.26"
-            ) from e
+        self._transport = make_transport(
+            transport,
+            api_key=api_key,
+            default_jsonl_path=Path(get_home_dir(), CONF_DIR, DEFAULT_EVENTS_LOG),
+        )
+
+        if dispatcher is True:
+            dispatcher = EventDispatcher()
+
+        self._dispatcher = dispatcher or None
+
+        if self._dispatcher is not None:
+            self._dispatcher.start(self._log_dispatched_event)
+
+        if batcher is True:
+            batcher = EventBatcher()
+
+        self._batcher = batcher or None
+
+        if self._batcher is not None:
+            self._batcher.start(self._send_batch)
+
+        self._shutdown_registered = False
+
+        if self._dispatcher is not None or self._batcher is not None:
+            self._register_shutdown()
+
+        if spool is True:
+            spool = EventSpool()
+
+        self._spool = spool or None
+
+        if self._spool is not None and self._spool.path is None:
+            self._spool.path = Path(get_home_dir(), CONF_DIR, DEFAULT_SPOOL)
+
+        self._aggregator = aggregator
+        self._aggregator_started = False
+        self._budget = EventBudget.from_value(budget)
+
+        if metrics is True:
+            metrics = MetricsRegistry()
+
+        self.metrics = metrics or None
+
+        if tracing is True:
+            tracing = Tracer()
+
+        self.tracer = tracing or None
+
+        _INSTANCES.add(self)
 
     @classmethod
-    def from_package(cls, package_name, *, print_cloud_message=True, api_key=None):
+    def from_package(
+        cls, package_name, *, print_cloud_message=True, api_key=None, **kwargs
+    ):
         """
         Initialize a Telemetry client with the default configuration for
-        a package with the given name
+        a package with the given name. Extra keyword arguments are passed to
+        the constructor
         """
         default_api_key = api_key or "phc_P9SpSeypyPwxrMdFn2edOOEooQioF2axppyEeDwtMSP"
         version = get_package_version(package_name)
@@ -444,7 +896,183 @@ class Telemetry:
             package_name=package_name,
             version=version,
             print_cloud_message=print_cloud_message,
+            **kwargs,
+        )
+
+    def _log_event(self, event):
+        """Log an event generated by log_call"""
+        if self._dispatcher is None:
+            self.log_api(**event)
+        else:
+            self._dispatcher.put(self._freeze_event(event))
+
+    def _freeze_event(self, event):
+        """
+        Prepare an event that is logged later (in another thread): record the
+        time, and parse the DAG (if any) so the event reflects its state at
+        the time of the call, and the worker doesn't iterate over a DAG that
+        may be changing
+        """
+        metadata = event.get("metadata")
+
+        if metadata is not None:
+            metadata = dict(metadata)
+
+            if "dag" in metadata and not isinstance(metadata["dag"], _ParsedDAG):
+                metadata["dag"] = self._parse_dag(metadata["dag"])
+
+        return dict(event, metadata=metadata, client_time=datetime.datetime.now())
+
+    def _parse_dag(self, dag):
+        """Parse a DAG, returns a _ParsedDAG"""
+        if self._dag_snapshots is None:
+            return _ParsedDAG(parse_dag(dag, full=self.full_dag))
+
+        value, snapshot = _parse_dag_incremental(
+            dag, self.full_dag, DEFAULT_DAG_SAMPLE_SIZE, self._dag_snapshots
         )
+        return _ParsedDAG(value, dag=dag, snapshot=snapshot)
+
+    def _store_dag_snapshot(self, parsed, trimmed):
+        """
+        Store the snapshot of a logged DAG, so the next event only includes
+        what changed since then. If the tasks were trimmed, they weren't
+        reported, so the next event is compared against the previous snapshot
+        """
+        if parsed is None or parsed.snapshot is None:
+            return
+
+        if "dag" in trimmed or "dag.tasks" in trimmed:
+            return
+
+        self._dag_snapshots.set(parsed.dag, parsed.snapshot)
+
+    def _log_event_from_loop(self, event):
+        """
+        Log an event generated by log_call from a coroutine, without blocking
+        the event loop (logging reads config files and may perform requests)
+        """
+        event = self._freeze_event(event)
+
+        if self._dispatcher is not None and self._dispatcher.drop_policy != "block":
+            self._dispatcher.put(event)
+            return
+
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, partial(self._log_event, event))
+        # retrieve the exception (if any) so asyncio doesn't complain about it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def _get_aggregator(self):
+        if not self._aggregator_started:
+            if self._aggregator is None:
+                self._aggregator = MetricsAggregator()
+
+            self._aggregator.start(self._log_summary)
+            self._aggregator_started = True
+            self._register_shutdown()
+
+        return self._aggregator
+
+    def _register_shutdown(self):
+        # atexit runs handlers in the reverse order they were registered, so
+        # this one runs before the ones registered by the components, which
+        # would otherwise close the batcher before the dispatcher hands it the
+        # queued events
+        if not self._shutdown_registered:
+            atexit.register(self._shutdown)
+            self._shutdown_registered = True
+
+    def _shutdown(self):
+        """
+        Deliver the pending events when the interpreter exits, closing the
+        components in pipeline order: the dispatcher, the aggregator, the
+        batcher, and the transport. Events logged after a component closes
+        are processed in the caller's thread
+        """
+        steps = []
+
+        if self._dispatcher is not None:
+            steps.append(
+                partial(self._dispatcher.close, timeout=self._dispatcher.flush_timeout)
+            )
+
+        if self._aggregator_started:
+            steps.append(self._aggregator.close)
+
+        if self._batcher is not None:
+            steps.append(
+                partial(self._batcher.close, timeout=self._batcher.flush_timeout)
+            )
+
+        steps.append(self._transport.flush)
+
+        for step in steps:
+            try:
+                step()
+            except Exception:
+                # telemetry must never break the user's program
+                pass
+
+    def _log_summary(self, action, metadata):
+        self._log_event(
+            dict(
+                action=f"{action}-summary",
+                total_runtime=str(
+                    datetime.timedelta(seconds=metadata["latency"]["sum"])
+                ),
+                metadata=metadata,
+            )
+        )
+
+    def _components(self):
+        return [
+            component
+            for component in (
+                self._dispatcher,
+                self._batcher,
+                self._spool,
+                self._aggregator,
+                self._transport,
+                self.metrics,
+                self.tracer,
+            )
+            if component is not None
+        ]
+
+    def _before_fork(self):
+        for component in self._components():
+            if hasattr(component, "_before_fork"):
+                component._before_fork()
+
+    def _after_fork_in_parent(self):
+        aggregator = self._aggregator
+
+        # the parent must emit the summaries forwarded by its children
+        if aggregator is not None and aggregator.forward_from_children:
+            self._get_aggregator()
+
+        for component in self._components():
+            if hasattr(component, "_after_fork_in_parent"):
+                component._after_fork_in_parent()
+
+    def _after_fork_in_child(self):
+        for component in self._components():
+            if hasattr(component, "_after_fork_in_child"):
+                component._after_fork_in_child()
+
+    def _log_dispatched_event(self, event):
+        self.log_api(**event)
+
+    def _send_batch(self, messages):
+        kwargs = {}
+
+        if self._batcher is not None:
+            kwargs["compression_level"] = self._batcher.compression_level
+
+        self._transport.send_batch(messages, **kwargs)
 
     def log_api(self, action, client_time=None, total_runtime=None, metadata=None):
         """
@@ -474,36 +1102,45 @@ class Telemetry:
 
         cloud = is_cloud_user()
         email = email_registered()
-        colab = SYSTEM_INFO["is_colab"]
+        system_info = _get_system_info()
+        colab = system_info["is_colab"]
 
         if colab:
             metadata["colab"] = colab
 
-        paperspace = SYSTEM_INFO["is_paperspace"]
+        paperspace = system_info["is_paperspace"]
 
         if paperspace:
             metadata["paperspace"] = paperspace
 
-        slurm = SYSTEM_INFO["is_slurm"]
+        slurm = system_info["is_slurm"]
 
         if slurm:
             metadata["slurm"] = slurm
 
-        airflow = SYSTEM_INFO["is_airflow"]
+        airflow = system_info["is_airflow"]
 
         if airflow:
             metadata["airflow"] = airflow
 
-        argo = SYSTEM_INFO["is_argo"]
+        argo = system_info["is_argo"]
 
         if argo:
             metadata["argo"] = argo
 
+        parsed_dag = None
+
         if "dag" in metadata:
-            metadata["dag"] = parse_dag(metadata["dag"])
+            parsed_dag = metadata["dag"]
+
+            # events logged from another thread are parsed before queueing them
+            if not isinstance(parsed_dag, _ParsedDAG):
+                parsed_dag = self._parse_dag(parsed_dag)
 
-        os = SYSTEM_INFO["os"]
-        environment = SYSTEM_INFO["env"]
+            metadata["dag"] = parsed_dag.value
+
+        os = system_info["os"]
+        environment = system_info["env"]
 
         if telemetry_enabled:
             (event_id, uid, action, client_time, elapsed_time) = validate_entries(
@@ -515,10 +1152,10 @@ class Telemetry:
                 "action": action,
                 "client_time": str(client_time),
                 "total_runtime": total_runtime,
-                "python_version": SYSTEM_INFO["python_version"],
+                "python_version": system_info["python_version"],
                 "version": self.version,
                 "package_name": self.package_name,
-                "docker_container": SYSTEM_INFO["is_docker"],
+                "docker_container": system_info["is_docker"],
                 "cloud": cloud,
                 "email": email,
                 "os": os,
@@ -527,24 +1164,40 @@ class Telemetry:
                 "metadata": metadata,
             }
 
-            if self._posthog_client is not None:
-                if is_install:
-                    self._posthog_client.capture(
-                        distinct_id=uid,
-                        event="install_success_indirect",
-                        properties=props,
+            trimmed = [] if self._budget is None else self._budget.apply(props)
+            self._store_dag_snapshot(parsed_dag, trimmed)
+
+            events = [action]
+
+            if is_install:
+                events.insert(0, "install_success_indirect")
+
+            for event in events:
+                if self._spool is not None:
+                    self._spool.append(make_message(uid, event, props))
+                elif self._batcher is not None:
+                    self._batcher.add(make_message(uid, event, props))
+                else:
+                    self._transport.capture(
+                        distinct_id=uid, event=event, properties=props
                     )
 
-                self._posthog_client.capture(
-                    distinct_id=uid, event=action, properties=props
-                )
-            else:
-                raise RuntimeError("Log call failed: PostHog client not initialized")
+            if self._spool is not None:
+                self._spool.replay_in_background(self._send_batch)
 
     # NOTE: should we log differently depending on the error type?
     # NOTE: how should we handle chained exceptions?
     def log_call(
-        self, action=None, payload=False, log_args=False, ignore_args=None, group=None
+        self,
+        action=None,
+        payload=False,
+        log_args=False,
+        ignore_args=None,
+        group=None,
+        sample=None,
+        aggregate=False,
+        profile_slow_calls=None,
+        memory=None,
     ):
         """Log function call
 
@@ -569,6 +1222,36 @@ class Telemetry:
             An arbitrary string to group events. You may use this to group calls
             to methods in the same class
 
+        sample : float or SamplingPolicy, default=None
+            If None, every call is logged. If a float, the fraction of calls
+            to log. Pass a SamplingPolicy to rate limit calls per action, and
+            to always log errors and slow calls. Calls that are sampled out
+            skip all the per-call logging work
+
+        aggregate : bool, default=False
+            If True, calls are not logged individually. Instead, success and
+            error counts and a latency histogram are aggregated and a single
+            ``{action}-summary`` event is logged per flush window (and when
+            the interpreter exits). See the ``aggregator`` argument in
+            the constructor
+
+        profile_slow_calls : bool, float or SlowCallProfiler, default=None
+            If not None, when a call takes at least this many seconds (one if
+            True), the next call runs under cProfile and the functions that
+            took the longest are saved to ``{home}/stats/profiles``. Pass a
+            SlowCallProfiler to profile calls at random, profile more calls,
+            or add a summary to the event. Only supported in regular
+            functions (not coroutines or generators). Calls are profiled even
+            if telemetry is disabled
+
+        memory : bool, str or MemoryTracker, default=None
+            If not None, events include the memory used by the call in the
+            ``memory`` metadata key (and the metrics registry keeps the
+            maximum per action). True or "rss" measures the change in the
+            resident set size and peak RSS of the process (cheap), and
+            "tracemalloc" also traces Python allocations to get their peak and
+            the lines that allocated the most memory (much slower)
+
         Examples
         --------
         Log function call:
@@ -636,6 +1319,16 @@ class Telemetry:
         >>> obj.add(x=1, y=2)
         3
 
+        Log 10% of the calls (errors are always logged):
+
+        >>> from ploomber_core.telemetry import Telemetry
+        >>> telemetry = Telemetry("APIKEY", "packagename", "0.1")
+        >>> @telemetry.log_call(sample=0.1)
+        ... def add(x, y):
+        ...     return x + y
+        >>> add(x=1, y=2)
+        3
+
 
         Unit testing (check the ``_telemetry`` attribute):
 
@@ -660,11 +1353,33 @@ class Telemetry:
         else:
             ignore_args = set(ignore_args)
 
+        sample = SamplingPolicy.from_value(sample)
+        profiler = SlowCallProfiler.from_value(profile_slow_calls)
+        memory_tracker = MemoryTracker.from_value(memory)
+
+        if profiler is not None and profiler.directory is None:
+            profiler.directory = Path(get_home_dir(), CONF_DIR, DEFAULT_PROFILES_DIR)
+
         def _log_call(func):
+            if profiler is not None and (
+                iscoroutinefunction(func)
+                or isgeneratorfunction(func)
+                or isasyncgenfunction(func)
+            ):
+                raise ValueError(
+                    "profile_slow_calls is only supported in regular functions, "
+                    f"got {func.__name__!r}"
+                )
+
             # we'll use this on each call, so compute it once
             func._signature = signature(func)
 
             is_method = is_first_arg_self(func._signature)
+
+            if log_args:
+                binder = _ArgumentBinder(
+                    func._signature, ignore_args, is_method=is_method, payload=payload
+                )
             # determine action name
             action_ = self.package_name
 
@@ -686,73 +1401,447 @@ class Telemetry:
                 group=group,
             )
 
+            def call(_payload, args, kwargs):
+                if payload:
+                    if is_method:
+                        injected_args = list(args)
+                        injected_args.insert(1, _payload)
+                        return func(*injected_args, **kwargs)
+                    else:
+                        return func(_payload, *args, **kwargs)
+                else:
+                    return func(*args, **kwargs)
+
+            def log_error(
+                e,
+                elapsed_ns,
+                _payload,
+                args_parsed,
+                log_event=None,
+                extra=None,
+                span=None,
+            ):
+                metadata_error = {
+                    # can we log None to posthog?
+                    "type": getattr(e, "type_", None),
+                    "exception": str(e),
+                    "argv": get_sanitized_argv(),
+                    **_payload,
+                    **(extra or {}),
+                    "total_runtime_ns": elapsed_ns,
+                }
+
+                if log_args:
+                    metadata_error["args"] = args_parsed
+
+                if span is not None:
+                    metadata_error.update(span.to_metadata())
+
+                error = dict(
+                    action=f"{action_}-error",
+                    total_runtime=str(_timedelta_from_ns(elapsed_ns)),
+                    metadata=metadata_error,
+                )
+                func._telemetry_error = error
+                (log_event or self._log_event)(error)
+
+            def log_success(
+                elapsed_ns, _payload, args_parsed, log_event=None, extra=None, span=None
+            ):
+                metadata_success = {
+                    "argv": get_sanitized_argv(),
+                    **_payload,
+                    **(extra or {}),
+                    "total_runtime_ns": elapsed_ns,
+                }
+
+                if log_args:
+                    metadata_success["args"] = args_parsed
+
+                if span is not None:
+                    metadata_success.update(span.to_metadata())
+
+                success = dict(
+                    action=f"{action_}-success",
+                    total_runtime=str(_timedelta_from_ns(elapsed_ns)),
+                    metadata=metadata_success,
+                )
+                func._telemetry_success = success
+                (log_event or self._log_event)(success)
+
+            def get_args(args, kwargs):
+                if log_args:
+                    return _get_args(binder, args, kwargs)
+                else:
+                    return None
+
+            def start_call(activate=True):
+                """
+                Start timing a call (and its span, if tracing, the profiler,
+                if triggered, and its memory usage, if measured). Returns the
+                start time in nanoseconds, the span, the profiled call, and
+                the memory measurement (each one can be None)
+                """
+                measurement = None if memory_tracker is None else memory_tracker.start()
+                profiled = None if profiler is None else profiler.start()
+                start = time.perf_counter_ns()
+                tracer = self.tracer
+
+                if tracer is None:
+                    return start, None, profiled, measurement
+
+                span = tracer.start(action_, start, activate=activate)
+                return start, span, profiled, measurement
+
+            def stop(started, error):
+                """
+                Return the nanoseconds elapsed since the call started, record
+                them in the metrics registry (if any), finish the span, save
+                the profile, and measure the memory used
+                """
+                end = time.perf_counter_ns()
+                start, span, profiled, measurement = started
+
+                if profiled is not None:
+                    profiler.finish(profiled, action_, end - start)
+                elif profiler is not None:
+                    profiler.observe(end - start)
+
+                usage = (
+                    None if measurement is None else memory_tracker.finish(measurement)
+                )
+                metrics = self.metrics
+
+                if metrics is not None:
+                    metrics.record(action_, end - start, error=error, memory=usage)
+
+                if span is not None:
+                    self.tracer.finish(span, end, error=error)
+
+                return end - start
+
+            def call_metadata(started):
+                """Metadata from the profile and memory usage of a call"""
+                _, _, profiled, measurement = started
+                metadata = {}
+
+                if profiled is not None and profiled.summary is not None:
+                    metadata["profile"] = profiled.summary
+
+                if measurement is not None:
+                    metadata["memory"] = measurement.usage
+
+                return metadata or None
+
+            def call_measured(args, kwargs):
+                # telemetry is disabled, only record the call locally
+                started = start_call()
+
+                try:
+                    result = call(dict(), args, kwargs)
+                except BaseException:
+                    stop(started, error=True)
+                    raise
+
+                stop(started, error=False)
+                return result
+
+            def call_aggregated(args, kwargs):
+                aggregator = self._get_aggregator()
+                started = start_call()
+
+                try:
+                    result = call(dict(), args, kwargs)
+                except Exception:
+                    aggregator.record(action_, stop(started, True) / 1e9, error=True)
+                    raise
+                except BaseException:
+                    # interrupted (e.g., KeyboardInterrupt), see wrapper
+                    stop(started, error=True)
+                    raise
+
+                aggregator.record(action_, stop(started, False) / 1e9)
+                return result
+
+            def call_sampled_out(args, kwargs):
+                # only time the call, the rest of the work happens if the tail
+                # rules decide to keep it
+                _payload = dict()
+                started = start_call()
+                span = started[1]
+
+                try:
+                    result = call(_payload, args, kwargs)
+                except Exception as e:
+                    elapsed_ns = stop(started, error=True)
+
+                    if sample.should_keep(elapsed_ns / 1e9, error=True):
+                        parsed = get_args(args, kwargs)
+                        extra = call_metadata(started)
+                        log_error(
+                            e, elapsed_ns, _payload, parsed, extra=extra, span=span
+                        )
+
+                    raise
+                except BaseException:
+                    # interrupted (e.g., KeyboardInterrupt), see wrapper
+                    stop(started, error=True)
+                    raise
+
+                elapsed_ns = stop(started, error=False)
+
+                if sample.should_keep(elapsed_ns / 1e9, error=False):
+                    parsed = get_args(args, kwargs)
+                    extra = call_metadata(started)
+                    log_success(elapsed_ns, _payload, parsed, extra=extra, span=span)
+
+                return result
+
             @wraps(func)
             def wrapper(*args, **kwargs):
                 # reset attributes before calling
                 func._telemetry_success = None
                 func._telemetry_error = None
 
-                if log_args:
-                    args_parsed = _get_args(func._signature, args, kwargs, ignore_args)
-                else:
-                    args_parsed = None
+                # users who opted out don't pay for telemetry
+                if not check_telemetry_enabled():
+                    if (
+                        self.metrics is not None
+                        or self.tracer is not None
+                        or profiler is not None
+                    ):
+                        return call_measured(args, kwargs)
 
-                _payload = dict()
+                    if payload:
+                        return call(dict(), args, kwargs)
 
-                metadata_started = {"argv": get_sanitized_argv()}
+                    return func(*args, **kwargs)
 
-                if log_args:
-                    metadata_started["args"] = args_parsed
+                if aggregate:
+                    return call_aggregated(args, kwargs)
+
+                if sample is not None and not sample.should_sample(action_):
+                    return call_sampled_out(args, kwargs)
 
-                start = datetime.datetime.now()
+                args_parsed = get_args(args, kwargs)
+                _payload = dict()
+                started = start_call()
+                span = started[1]
 
                 try:
-                    if payload:
-                        if is_method:
-                            injected_args = list(args)
-                            injected_args.insert(1, _payload)
-                            result = func(*injected_args, **kwargs)
-                        else:
-                            result = func(_payload, *args, **kwargs)
-                    else:
-                        result = func(*args, **kwargs)
+                    result = call(_payload, args, kwargs)
                 except Exception as e:
-                    metadata_error = {
-                        # can we log None to posthog?
-                        "type": getattr(e, "type_", None),
-                        "exception": str(e),
-                        "argv": get_sanitized_argv(),
-                        **_payload,
-                    }
-
-                    if log_args:
-                        metadata_error["args"] = args_parsed
-
-                    error = dict(
-                        action=f"{action_}-error",
-                        total_runtime=str(datetime.datetime.now() - start),
-                        metadata=metadata_error,
+                    elapsed_ns = stop(started, error=True)
+                    extra = call_metadata(started)
+                    log_error(
+                        e, elapsed_ns, _payload, args_parsed, extra=extra, span=span
                     )
-                    func._telemetry_error = error
-                    self.log_api(**error)
+                    raise
+                except BaseException:
+                    # the call was interrupted (e.g., KeyboardInterrupt or
+                    # SystemExit), it isn't logged, but the span, the profiler
+                    # and the memory tracing must be stopped
+                    stop(started, error=True)
                     raise
                 else:
-                    metadata_success = {"argv": get_sanitized_argv(), **_payload}
+                    elapsed_ns = stop(started, error=False)
+                    extra = call_metadata(started)
+                    log_success(
+                        elapsed_ns, _payload, args_parsed, extra=extra, span=span
+                    )
 
-                    if log_args:
-                        metadata_success["args"] = args_parsed
+                return result
 
-                    success = dict(
-                        action=f"{action_}-success",
-                        total_runtime=str(datetime.datetime.now() - start),
-                        metadata=metadata_success,
-                    )
-                    func._telemetry_success = success
-                    self.log_api(**success)
+            def begin(args, kwargs, activate=True, enabled=None):
+                """
+                Start timing a call. Returns the payload to pass to the function
+                and a function to call (with the exception or None) once the call
+                finishes (a no-op if telemetry is disabled); for generators, items
+                is the number of yielded items. If activate is False, the span
+                isn't set as the current one (see generator_wrapper). enabled is
+                the value of check_telemetry_enabled, if the caller has it
+                """
+                _payload = dict()
+
+                if enabled is None:
+                    enabled = check_telemetry_enabled()
+
+                if not enabled:
+                    if self.metrics is None and self.tracer is None:
+
+                        def finish(error, log_event, items=None):
+                            pass
+
+                    else:
+                        started = start_call(activate)
+
+                        def finish(error, log_event, items=None):
+                            stop(started, error=error is not None)
+
+                    return _payload, finish
+
+                if aggregate:
+                    aggregator = self._get_aggregator()
+                    started = start_call(activate)
+
+                    def finish(error, log_event, items=None):
+                        failed = error is not None
+                        elapsed = stop(started, error=failed) / 1e9
 
+                        if not _interrupted(error):
+                            aggregator.record(action_, elapsed, error=failed)
+
+                    return _payload, finish
+
+                sampled_in = sample is None or sample.should_sample(action_)
+                args_parsed = get_args(args, kwargs) if sampled_in else None
+                started = start_call(activate)
+                span = started[1]
+
+                def finish(error, log_event, items=None):
+                    elapsed_ns = stop(started, error=error is not None)
+
+                    if _interrupted(error):
+                        return
+
+                    # sampled out calls are only logged if the tail rules keep them
+                    if not sampled_in and not sample.should_keep(
+                        elapsed_ns / 1e9, error=error is not None
+                    ):
+                        return
+
+                    parsed = args_parsed if sampled_in else get_args(args, kwargs)
+                    extra = call_metadata(started)
+
+                    if items is not None:
+                        extra = {**(extra or {}), **_throughput(items, elapsed_ns)}
+
+                    if error is None:
+                        log_success(
+                            elapsed_ns, _payload, parsed, log_event, extra, span
+                        )
+                    else:
+                        log_error(
+                            error, elapsed_ns, _payload, parsed, log_event, extra, span
+                        )
+
+                return _payload, finish
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                func._telemetry_success = None
+                func._telemetry_error = None
+
+                # don't read the config file in the event loop
+                enabled = check_telemetry_enabled(cached=True)
+
+                if enabled is None:
+                    enabled = await _check_telemetry_enabled_off_loop()
+
+                if self.metrics is None and self.tracer is None and not enabled:
+                    return await call(dict(), args, kwargs)
+
+                _payload, finish = begin(args, kwargs, enabled=enabled)
+
+                try:
+                    result = await call(_payload, args, kwargs)
+                except BaseException as e:
+                    finish(e, self._log_event_from_loop)
+                    raise
+
+                finish(None, self._log_event_from_loop)
                 return result
 
-            return wrapper
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                # this runs on the first next(), so we time the consumption of
+                # the generator until it's exhausted or closed
+                func._telemetry_success = None
+                func._telemetry_error = None
+
+                # generators run in the consumer's context (between items), so their
+                # span isn't set as the current one
+                _payload, finish = begin(args, kwargs, activate=False)
+                generator = call(_payload, args, kwargs)
+                items = 0
+
+                # like "yield from generator" but counting the yielded items
+                try:
+                    item = next(generator)
+
+                    while True:
+                        items += 1
+
+                        try:
+                            sent = yield item
+                        except GeneratorExit:
+                            generator.close()
+                            raise
+                        except BaseException as e:
+                            item = generator.throw(e)
+                        else:
+                            item = generator.send(sent)
+                except StopIteration as e:
+                    finish(None, self._log_event, items)
+                    return e.value
+                except GeneratorExit:
+                    finish(None, self._log_event, items)
+                    raise
+                except BaseException as e:
+                    finish(e, self._log_event, items)
+                    raise
+
+            @wraps(func)
+            async def async_generator_wrapper(*args, **kwargs):
+                func._telemetry_success = None
+                func._telemetry_error = None
+
+                # don't read the config file in the event loop
+                enabled = check_telemetry_enabled(cached=True)
+
+                if enabled is None:
+                    enabled = await _check_telemetry_enabled_off_loop()
+
+                # generators run in the consumer's context (between items), so their
+                # span isn't set as the current one
+                _payload, finish = begin(args, kwargs, activate=False, enabled=enabled)
+                generator = call(_payload, args, kwargs)
+                items = 0
+
+                try:
+                    item = await generator.__anext__()
+
+                    while True:
+                        items += 1
+
+                        try:
+                            sent = yield item
+                        except GeneratorExit:
+                            await generator.aclose()
+                            raise
+                        except BaseException as e:
+                            item = await generator.athrow(e)
+                        else:
+                            item = await generator.asend(sent)
+                except StopAsyncIteration:
+                    finish(None, self._log_event_from_loop, items)
+                except GeneratorExit:
+                    finish(None, self._log_event_from_loop, items)
+                    raise
+                except BaseException as e:
+                    finish(e, self._log_event_from_loop, items)
+                    raise
+
+            # the sync wrapper would only time the creation of the coroutine
+            # (or generator)
+            if iscoroutinefunction(func):
+                return async_wrapper
+            elif isgeneratorfunction(func):
+                return generator_wrapper
+            elif isasyncgenfunction(func):
+                return async_generator_wrapper
+            else:
+                return wrapper
 
         return _log_call
 
@@ -760,18 +1849,153 @@ class Telemetry:
         return TelemetryGroup(self, group)
 
 
-def _get_args(sig, fn_args, fn_kwargs, ignore_args):
-    mapping = _map_parameters_in_fn_call_from_signature(fn_args, fn_kwargs, sig)
+# Telemetry objects are usually module-level globals, so they're inherited by
+# forked processes (e.g., multiprocessing.Pool workers) along with their
+# background threads and buffers, which are not usable in the child
+_INSTANCES = weakref.WeakSet()
+
+
+def _call_fork_hook(name):
+    def hook():
+        for instance in list(_INSTANCES):
+            try:
+                getattr(instance, name)()
+            except Exception:
+                pass
 
+    return hook
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_call_fork_hook("_before_fork"),
+        after_in_parent=_call_fork_hook("_after_fork_in_parent"),
+        after_in_child=_call_fork_hook("_after_fork_in_child"),
+    )
+
+
+def _get_args(binder, fn_args, fn_kwargs):
     values_to_log = {}
 
-    for key, value in mapping.items():
-        if key not in ignore_args and _should_log_value(value):
+    for key, value in binder.bind(fn_args, fn_kwargs).items():
+        if _should_log_value(value):
             values_to_log[key] = _process_value(value)
 
     return values_to_log
 
 
+class _ArgumentBinder:
+    """
+    Maps the arguments in a function call to the function's parameters. The
+    signature is processed once (when decorating the function) so binding
+    the arguments of each call only takes a pass over them
+
+    Parameters
+    ----------
+    sig : inspect.Signature
+        The signature of the decorated function
+
+    ignore_args : set
+        Parameters to leave out
+
+    is_method : bool, default=False
+        Whether the first parameter is self (it's left out)
+
+    payload : bool, default=False
+        Whether log_call injects the payload (it's left out, and it isn't
+        counted when matching positional arguments since the caller doesn't
+        pass it)
+    """
+
+    def __init__(self, sig, ignore_args, is_method=False, payload=False):
+        names = list(sig.parameters)
+        ignore = set(ignore_args)
+
+        if is_method:
+            ignore.add(names[0])
+
+        # the payload goes after self in methods, first in functions
+        index = 1 if is_method else 0
+        injected = names[index] if payload and len(names) > index else None
+
+        if injected is not None:
+            ignore.add(injected)
+
+        positional_kinds = (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
+        self._positional = []
+        self._var_positional = None
+        self._defaults = {}
+
+        for name, parameter in sig.parameters.items():
+            if name == injected:
+                continue
+
+            if parameter.kind in positional_kinds:
+                self._positional.append(name)
+            elif parameter.kind is Parameter.VAR_POSITIONAL:
+                self._var_positional = name
+
+            if parameter.default is not Parameter.empty and name not in ignore:
+                self._defaults[name] = parameter.default
+
+        self._n_positional = len(self._positional)
+        self._ignore = ignore
+
+    def bind(self, args, kwargs):
+        """
+        Return a dictionary with the value of each parameter. Parameters not
+        in the call get their default value, extra positional arguments are
+        stored under the name of the *args parameter, and extra keyword
+        arguments under their own names
+        """
+        ignore = self._ignore
+        bound = {
+            name: value
+            for name, value in zip(self._positional, args)
+            if name not in ignore
+        }
+
+        if self._var_positional is not None and len(args) > self._n_positional:
+            if self._var_positional not in ignore:
+                bound[self._var_positional] = args[self._n_positional :]
+
+        for name, value in kwargs.items():
+            if name not in ignore:
+                bound[name] = value
+
+        for name, value in self._defaults.items():
+            if name not in bound:
+                bound[name] = value
+
+        return bound
+
+
+def _timedelta_from_ns(ns):
+    """
+    Convert a duration measured with time.perf_counter_ns to a timedelta (the
+    type logged in total_runtime)
+    """
+    return datetime.timedelta(microseconds=ns / 1000)
+
+
+def _interrupted(error):
+    """
+    Whether a call was interrupted (e.g., KeyboardInterrupt, SystemExit or
+    asyncio.CancelledError) instead of failing. Interrupted calls aren't
+    logged
+    """
+    return error is not None and not isinstance(error, Exception)
+
+
+def _throughput(items, elapsed_ns):
+    """Number of items yielded by a generator and items per second"""
+    seconds = elapsed_ns / 1e9
+    return {
+        "items": items,
+        "items_per_second": items / seconds if seconds > 0 else None,
+    }
+
+
 def get_sanitized_argv():
     if not sys.argv:
         return None
@@ -801,56 +2025,33 @@ def _process_value(value):
         return value
 
 
-# taken from sklearn-evaluation/util.py
-def _map_parameters_in_fn_call_from_signature(args, kwargs, sig):
-    """
-    Based on function signature, parse args to to convert them to key-value
-    pairs and merge them with kwargs
-    Any parameter found in args that does not match the function signature
-    is still passed.
-    Missing parameters are filled with their default values
-    """
-    # Get missing parameters in kwargs to look for them in args
-    args_spec = list(sig.parameters)
-    params_all = set(args_spec)
-    params_missing = params_all - set(kwargs.keys())
+# the system information and the internal settings are loaded on first use,
+# since they're expensive (reading files, importing modules, writing the
+# settings file) and importing this module should be fast
+def _get_system_info():
+    info = globals().get("SYSTEM_INFO")
 
-    if "self" in args_spec:
-        offset = 1
-    else:
-        offset = 0
+    if info is None:
+        info = globals()["SYSTEM_INFO"] = get_system_info()
 
-    # Get indexes for those args
-    idxs = [args_spec.index(name) for name in params_missing]
-
-    # Parse args
-    args_parsed = dict()
-
-    for idx in idxs:
-        key = args_spec[idx]
-
-        try:
-            value = args[idx - offset]
-        except IndexError:
-            pass
-        else:
-            args_parsed[key] = value
+    return info
 
-    parsed = copy(kwargs)
-    parsed.update(args_parsed)
 
-    # fill default values
-    default = {k: v.default for k, v in sig.parameters.items() if v.default != _empty}
+def _get_internal():
+    internal = globals().get("internal")
 
-    to_add = set(default.keys()) - set(parsed.keys())
+    if internal is None:
+        internal = globals()["internal"] = Internal()
 
-    default_to_add = {k: v for k, v in default.items() if k in to_add}
-    parsed.update(default_to_add)
+    return internal
 
-    return parsed
 
+def __getattr__(name):
+    # backwards compatibility: SYSTEM_INFO and internal used to be created when
+    # importing this module
+    if name == "SYSTEM_INFO":
+        return _get_system_info()
+    elif name == "internal":
+        return _get_internal()
 
-try:
-    internal = Internal()
-except Exception:
-    pass
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,192 @@
+"""
+Span tracing for functions decorated with log_call. Each call is a span, and
+the span of the decorated function that is running (in the current thread or
+asyncio task) is tracked in a context variable, so calls made from it are
+recorded as its children and share its trace id. Finished spans are kept in
+memory and can be written to a file in the Chrome trace event format, which
+can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing
+"""
+
+from collections import deque
+import contextvars
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+from ploomber_core.telemetry.sampling import _RANDOM
+
+DEFAULT_MAX_SPANS = 10_000
+
+_CURRENT_SPAN = contextvars.ContextVar("ploomber_telemetry_span", default=None)
+
+
+def _new_id(bits):
+    # the private generator (reseeded in forked processes), so seeding the
+    # global one doesn't make ids repeat
+    return f"{_RANDOM.getrandbits(bits):0{bits // 4}x}"
+
+
+def current_span():
+    """Return the span of the decorated function that is running, or None"""
+    return _CURRENT_SPAN.get()
+
+
+class Span:
+    """A timed call to a decorated function
+
+    Durations are measured with time.perf_counter_ns, so start_ns and end_ns
+    are only meaningful relative to each other (and to other spans in the same
+    process)
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+        "start_ns",
+        "end_ns",
+        "error",
+        "pid",
+        "thread_id",
+        "_token",
+    )
+
+    def __init__(self, name, trace_id, span_id, parent_span_id, start_ns):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.error = False
+        self.pid = os.getpid()
+        self.thread_id = threading.get_ident()
+        self._token = None
+
+    def to_metadata(self):
+        """The identifiers added to the metadata of telemetry events"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+        }
+
+    def to_chrome_event(self):
+        """A complete ("X") event in the Chrome trace event format"""
+        return {
+            "name": self.name,
+            "cat": "ploomber",
+            "ph": "X",
+            # microseconds
+            "ts": self.start_ns / 1000,
+            "dur": (self.end_ns - self.start_ns) / 1000,
+            "pid": self.pid,
+            "tid": self.thread_id,
+            "args": {**self.to_metadata(), "error": self.error},
+        }
+
+
+class Tracer:
+    """Record the spans of calls to functions decorated with log_call
+
+    Parameters
+    ----------
+    max_spans : int, default=10_000
+        Maximum number of finished spans to keep, once reached, the oldest
+        ones are discarded
+
+    Examples
+    --------
+    >>> from ploomber_core.telemetry.tracing import Tracer
+    >>> tracer = Tracer()
+    >>> parent = tracer.start("build")
+    >>> child = tracer.start("load")
+    >>> child.parent_span_id == parent.span_id
+    True
+    >>> tracer.finish(child)
+    >>> tracer.finish(parent)
+    >>> [span.name for span in tracer.spans()]
+    ['load', 'build']
+    """
+
+    def __init__(self, max_spans=DEFAULT_MAX_SPANS):
+        self.max_spans = max_spans
+        self._spans = deque(maxlen=max_spans)
+
+    def start(self, name, start_ns=None, activate=True):
+        """
+        Start a span, as a child of the current span (if any). If activate is
+        True, it becomes the current span until it finishes
+        """
+        parent = _CURRENT_SPAN.get()
+
+        if parent is None:
+            trace_id, parent_span_id = _new_id(128), None
+        else:
+            trace_id, parent_span_id = parent.trace_id, parent.span_id
+
+        span = Span(
+            name,
+            trace_id=trace_id,
+            span_id=_new_id(64),
+            parent_span_id=parent_span_id,
+            start_ns=time.perf_counter_ns() if start_ns is None else start_ns,
+        )
+
+        if activate:
+            span._token = _CURRENT_SPAN.set(span)
+
+        return span
+
+    def finish(self, span, end_ns=None, error=False):
+        """Finish a span, and restore the previous current span"""
+        span.end_ns = time.perf_counter_ns() if end_ns is None else end_ns
+        span.error = error
+
+        if span._token is not None:
+            try:
+                _CURRENT_SPAN.reset(span._token)
+            except ValueError:
+                # finished in a different context than the one that started
+                # it, there's nothing to restore
+                pass
+
+            span._token = None
+
+        self._spans.append(span)
+
+    def spans(self):
+        """Return the finished spans (in the order they finished)"""
+        return list(self._spans)
+
+    def clear(self):
+        """Remove the finished spans"""
+        self._spans.clear()
+
+    def to_chrome_trace(self):
+        """Return the finished spans in the Chrome trace event format"""
+        return {
+            "traceEvents": [span.to_chrome_event() for span in self.spans()],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path):
+        """
+        Write the finished spans to a JSON file in the Chrome trace event
+        format. Returns the path to the file
+        """
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+
+        with open(tmp, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+        os.replace(tmp, path)
+        return path
+
+    def _after_fork_in_child(self):
+        # spans finished by the parent are exported by the parent
+        self._spans = deque(maxlen=self.max_spans)
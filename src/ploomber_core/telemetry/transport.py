@@ -0,0 +1,217 @@
+"""
+Transports deliver telemetry events. Telemetry uses PostHog by default, but
+events can also be stored in a local newline-delimited JSON file, kept in an
+in-memory ring buffer (useful for testing), or discarded.
+
+The transport is selected with the ``transport`` argument in Telemetry or the
+PLOOMBER_TELEMETRY_TRANSPORT environment variable. Valid values are
+"posthog", "jsonl" (or "jsonl:/path/to/file.jsonl"), "memory", and "null"
+"""
+
+import abc
+from collections import deque
+import json
+import os
+from pathlib import Path
+import threading
+import warnings
+
+from ploomber_core.telemetry.batching import post_batch
+
+POSTHOG_HOST = "https://us.i.posthog.com"
+TRANSPORT_ENV_VAR = "PLOOMBER_TELEMETRY_TRANSPORT"
+
+
+class Transport(abc.ABC):
+    """Base class for telemetry transports"""
+
+    @abc.abstractmethod
+    def capture(self, distinct_id, event, properties):
+        """Send a single event"""
+        pass
+
+    def send_batch(self, messages, compression_level=6):
+        """
+        Send a list of messages (see batching.make_message). Transports that
+        compress payloads use compression_level. Must raise an exception if
+        the batch could not be sent
+        """
+        for message in messages:
+            self.capture(
+                distinct_id=message["distinct_id"],
+                event=message["event"],
+                properties=message["properties"],
+            )
+
+    def flush(self):
+        """Send any buffered events"""
+        pass
+
+    def _after_fork_in_child(self):
+        """Discard state (e.g., threads) that is unusable in a forked process"""
+        pass
+
+
+class PosthogTransport(Transport):
+    """Send events to PostHog"""
+
+    def __init__(self, api_key, host=POSTHOG_HOST):
+        self.api_key = api_key
+        self.host = host
+        # created on the first event since importing posthog is expensive
+        self.client = None
+        self._unavailable = False
+
+    def _make_client(self):
+        import posthog
+
+        try:
+            return posthog.Posthog(self.api_key, host=self.host)
+        except Exception as e:
+            raise ImportError(
+                "Failed to initialize posthog client. This likely means your posthog "
+                "version is incompatible. To fix this, either upgrade to posthog>=3.0 "
+                "or downgrade to ploomber-core<=0.2.26"
+            ) from e
+
+    def capture(self, distinct_id, event, properties):
+        if self.client is None:
+            if self._unavailable:
+                return
+
+            try:
+                self.client = self._make_client()
+            except ImportError as e:
+                # the client is created in the user's call, so a missing or
+                # incompatible posthog disables the transport instead of
+                # raising there
+                self._unavailable = True
+                warnings.warn(f"{e}. Telemetry events won't be sent")
+                return
+
+        self.client.capture(distinct_id=distinct_id, event=event, properties=properties)
+
+    def send_batch(self, messages, compression_level=6):
+        status = post_batch(
+            self.api_key, self.host, messages, compression_level=compression_level
+        )
+
+        if status >= 300:
+            raise RuntimeError(f"Failed to send telemetry batch (status: {status})")
+
+    def flush(self):
+        if self.client is not None:
+            self.client.flush()
+
+    def _after_fork_in_child(self):
+        # the client's consumer threads are not inherited by forked processes,
+        # a new client is created when needed
+        self.client = None
+
+
+class JSONLinesTransport(Transport):
+    """Append events to a local newline-delimited JSON file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _after_fork_in_child(self):
+        self._lock = threading.Lock()
+
+    def capture(self, distinct_id, event, properties):
+        self.send_batch(
+            [dict(distinct_id=distinct_id, event=event, properties=properties)]
+        )
+
+    def send_batch(self, messages, compression_level=6):
+        data = "".join(json.dumps(m, default=str) + "\n" for m in messages)
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # a single write to a file opened with O_APPEND so lines from
+            # concurrent processes don't interleave
+            fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+            try:
+                os.write(fd, data.encode("utf-8"))
+            finally:
+                os.close(fd)
+
+
+class InMemoryTransport(Transport):
+    """Keep the last ``maxlen`` events in memory (see the ``events`` attribute)"""
+
+    def __init__(self, maxlen=1000):
+        self.events = deque(maxlen=maxlen)
+
+    def capture(self, distinct_id, event, properties):
+        self.events.append(
+            dict(distinct_id=distinct_id, event=event, properties=properties)
+        )
+
+    def clear(self):
+        self.events.clear()
+
+    def _after_fork_in_child(self):
+        # events logged by the parent are not the child's
+        self.clear()
+
+
+class NullTransport(Transport):
+    """Discard all events"""
+
+    def capture(self, distinct_id, event, properties):
+        pass
+
+    def send_batch(self, messages, compression_level=6):
+        pass
+
+
+def make_transport(transport, api_key, default_jsonl_path):
+    """
+    Return a Transport. transport can be a Transport instance, a string
+    ("posthog", "jsonl", "jsonl:{path}", "memory" or "null") or None, in such
+    case, the value in the PLOOMBER_TELEMETRY_TRANSPORT environment variable
+    is used (defaults to "posthog"). An invalid value in the environment
+    variable shows a warning and uses the default
+    """
+    if transport is None:
+        value = os.environ.get(TRANSPORT_ENV_VAR)
+
+        if not value:
+            return PosthogTransport(api_key)
+
+        try:
+            return _transport_from_string(value, api_key, default_jsonl_path)
+        except ValueError as e:
+            # a typo in the environment must not break the user's program
+            warnings.warn(
+                f"{e} (set in the {TRANSPORT_ENV_VAR} environment variable). "
+                "Using 'posthog'"
+            )
+            return PosthogTransport(api_key)
+    elif not isinstance(transport, str):
+        return transport
+
+    return _transport_from_string(transport, api_key, default_jsonl_path)
+
+
+def _transport_from_string(transport, api_key, default_jsonl_path):
+    name, _, argument = transport.partition(":")
+    name = name.strip().lower()
+
+    if name == "posthog":
+        return PosthogTransport(api_key)
+    elif name == "jsonl":
+        return JSONLinesTransport(argument or default_jsonl_path)
+    elif name == "memory":
+        return InMemoryTransport()
+    elif name == "null":
+        return NullTransport()
+    else:
+        raise ValueError(
+            f"Invalid telemetry transport: {transport!r}. "
+            "Valid values are: 'posthog', 'jsonl', 'jsonl:{path}', "
+            "'memory', and 'null'"
+        )
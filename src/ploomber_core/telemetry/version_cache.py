@@ -0,0 +1,173 @@
+"""
+Cache of the latest version of each package (as reported by PyPI), shared by
+all processes through a JSON file in the ploomber home directory. Lookups
+happen in a daemon thread so checking for a new version never blocks the
+caller: the result is used by the next call (or process) that reads the cache.
+All installed packages from the ploomber family are refreshed in the same pass
+"""
+
+import json
+import os
+import threading
+import time
+
+from ploomber_core.telemetry.spool import _file_lock
+
+# seconds after which a lookup that didn't finish (e.g., the process died) is
+# started again by other processes
+CLAIM_TIMEOUT = 60
+
+# threads refreshing the cache in this process, keyed by (path, package name)
+_REFRESHING = {}
+_REFRESHING_LOCK = threading.Lock()
+
+
+class VersionCache:
+    """Latest versions of packages, stored in a JSON file
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the cache file
+
+    ttl : float, default=172_800
+        Seconds after which an entry is considered stale and it's looked up
+        again. Defaults to two days
+    """
+
+    def __init__(self, path, ttl=172_800):
+        self.path = path
+        self.ttl = ttl
+
+    @property
+    def _lock_path(self):
+        return f"{self.path}.lock"
+
+    def read(self):
+        """
+        Return a dictionary with the cached entries (package name to
+        {"latest": version, "checked_at": timestamp}). Returns an empty
+        dictionary if the file does not exist or it's corrupted
+        """
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        return content if isinstance(content, dict) else {}
+
+    def get(self, package_name):
+        """Return the cached entry for a package, or None"""
+        return self._entry(self.read(), package_name)
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry.get("checked_at", 0) < self.ttl
+
+    def refresh(self, package_names, fetch):
+        """
+        Look up the latest version of the packages with stale (or missing)
+        entries and store them in a single write. fetch is called with the
+        list of package names and must return a dictionary with their latest
+        versions (None if the lookup failed). Packages that another process
+        is looking up (or already refreshed) are not looked up again
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # claim the stale entries, so other processes don't look them up too,
+        # the lock isn't held during the lookup, which may take a while
+        with _file_lock(self._lock_path, exclusive=True):
+            content = self.read()
+            now = time.time()
+            stale = [
+                name
+                for name in package_names
+                if not self.is_fresh(self._entry(content, name))
+                and not self._is_claimed(content.get(name), now)
+            ]
+
+            if not stale:
+                return
+
+            for name in stale:
+                entry = self._entry(content, name) or {"latest": None, "checked_at": 0}
+                content[name] = dict(entry, looking_up_at=now)
+
+            self._write(content)
+
+        latest = fetch(stale)
+        checked_at = time.time()
+
+        with _file_lock(self._lock_path, exclusive=True):
+            content = self.read()
+
+            for name in stale:
+                # failed lookups are stored too, so they aren't retried until
+                # the entry expires
+                content[name] = {"latest": latest.get(name), "checked_at": checked_at}
+
+            self._write(content)
+
+    def refresh_in_background(self, package_name, fetch, related=None):
+        """
+        Refresh the entry in a daemon thread (unless one is already running).
+        related is an optional function that returns the names of other
+        packages to refresh in the same pass
+        """
+        key = (os.path.abspath(self.path), package_name)
+
+        with _REFRESHING_LOCK:
+            if key in _REFRESHING:
+                return _REFRESHING[key]
+
+            thread = threading.Thread(
+                target=self._refresh_silently,
+                args=(package_name, fetch, related),
+                name="ploomber-telemetry-version-check",
+                daemon=True,
+            )
+            _REFRESHING[key] = thread
+
+        thread.start()
+        return thread
+
+    def _refresh_silently(self, package_name, fetch, related):
+        try:
+            package_names = [package_name]
+
+            if related is not None:
+                package_names.extend(name for name in related() if name != package_name)
+
+            self.refresh(package_names, fetch)
+        except Exception:
+            pass
+        finally:
+            with _REFRESHING_LOCK:
+                _REFRESHING.pop((os.path.abspath(self.path), package_name), None)
+
+    def _write(self, content):
+        """Atomically replace the cache file, must hold the exclusive lock"""
+        tmp = f"{self.path}.tmp-{os.getpid()}"
+
+        with open(tmp, "w") as f:
+            json.dump(content, f)
+
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _is_claimed(entry, now):
+        """Whether another process is looking up the entry"""
+        if not isinstance(entry, dict):
+            return False
+
+        looking_up_at = entry.get("looking_up_at")
+        return looking_up_at is not None and now - looking_up_at < CLAIM_TIMEOUT
+
+    @staticmethod
+    def _entry(content, package_name):
+        entry = content.get(package_name)
+
+        if not isinstance(entry, dict) or "latest" not in entry:
+            return None
+
+        return entry
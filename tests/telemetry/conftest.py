@@ -0,0 +1,51 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+
+
+@pytest.fixture(autouse=True)
+def enable_telemetry(monkeypatch):
+    """
+    log_call skips all the telemetry work when telemetry is disabled, and
+    GitHub Actions disables it (it sets CI and PLOOMBER_STATS_ENABLED), so we
+    enable it; tests that check the disabled case override these variables
+    """
+    monkeypatch.delenv("CI", raising=False)
+    monkeypatch.delenv("READTHEDOCS", raising=False)
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "true")
+
+
+@pytest.fixture
+def log_api(monkeypatch):
+    """
+    Replace Telemetry.log_api with a mock, the identifiers of the threads that
+    called it are stored in its threads attribute
+    """
+    threads = []
+
+    def record_thread(**kwargs):
+        threads.append(threading.get_ident())
+
+    mock = Mock(side_effect=record_thread)
+    mock.threads = threads
+    monkeypatch.setattr(telemetry.Telemetry, "log_api", mock)
+    return mock
+
+
+@pytest.fixture
+def telemetry_kwargs():
+    """
+    Extra arguments for the Telemetry created by the _telemetry fixture,
+    override this fixture in a test module to change them
+    """
+    return {}
+
+
+@pytest.fixture
+def _telemetry(telemetry_kwargs):
+    return telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="null", **telemetry_kwargs
+    )
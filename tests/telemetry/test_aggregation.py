@@ -0,0 +1,118 @@
+import random
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.aggregation import (
+    ActionStats,
+    LatencySketch,
+    MetricsAggregator,
+)
+
+
+@pytest.mark.parametrize("q", [0.1, 0.5, 0.9, 0.99])
+def test_sketch_quantiles_within_relative_accuracy(q):
+    values = sorted(random.Random(0).lognormvariate(0, 2) for _ in range(10_000))
+    sketch = LatencySketch(relative_accuracy=0.01)
+
+    for value in values:
+        sketch.add(value)
+
+    expected = values[int(q * (len(values) - 1))]
+
+    assert sketch.quantile(q) == pytest.approx(expected, rel=0.02)
+
+
+def test_sketch_merge_and_serialization():
+    first, second, both = LatencySketch(), LatencySketch(), LatencySketch()
+
+    for value in range(1, 50):
+        first.add(value)
+        both.add(value)
+
+    for value in range(50, 100):
+        second.add(value)
+        both.add(value)
+
+    first.merge(LatencySketch.from_dict(second.to_dict()))
+
+    assert first.to_dict() == both.to_dict()
+
+
+def test_sketch_merge_requires_same_accuracy():
+    with pytest.raises(ValueError):
+        LatencySketch(0.01).merge(LatencySketch(0.02))
+
+
+def test_aggregator_emits_one_summary_per_action():
+    emitted = []
+    aggregator = MetricsAggregator(flush_interval=3600)
+    aggregator.start(lambda action, metadata: emitted.append((action, metadata)))
+
+    for _ in range(10):
+        aggregator.record("a", 0.1)
+
+    aggregator.record("a", 0.2, error=True)
+    aggregator.record("b", 0.3)
+    aggregator.flush()
+
+    summaries = dict(emitted)
+    assert set(summaries) == {"a", "b"}
+    assert summaries["a"]["success"] == 10
+    assert summaries["a"]["error"] == 1
+    assert summaries["a"]["latency"]["max"] == 0.2
+    assert summaries["b"]["success"] == 1
+
+    # stats are reset after each window
+    emitted.clear()
+    aggregator.flush()
+    assert emitted == []
+
+    aggregator.close()
+
+
+def test_aggregator_merge():
+    aggregator = MetricsAggregator()
+    stats = ActionStats()
+    stats.record(1.0, error=False)
+
+    aggregator.record("a", 2.0)
+    aggregator.merge("a", stats)
+    aggregator.merge("b", ActionStats.from_dict(stats.to_dict()))
+
+    snapshot, _ = aggregator.snapshot()
+
+    assert snapshot["a"].success == 2
+    assert snapshot["b"].success == 1
+
+
+def test_log_call_aggregate(monkeypatch):
+    log_api = Mock()
+    monkeypatch.setattr(telemetry.Telemetry, "log_api", log_api)
+    aggregator = MetricsAggregator(flush_interval=3600)
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", aggregator=aggregator
+    )
+
+    @_telemetry.log_call(aggregate=True, payload=True)
+    def divide(payload, x, y):
+        return x / y
+
+    for _ in range(100):
+        divide(1, 2)
+
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    log_api.assert_not_called()
+
+    aggregator.flush()
+
+    log_api.assert_called_once()
+    kwargs = log_api.call_args[1]
+    assert kwargs["action"] == "some-package-divide-summary"
+    assert kwargs["metadata"]["success"] == 100
+    assert kwargs["metadata"]["error"] == 1
+
+    aggregator.close()
@@ -0,0 +1,202 @@
+import asyncio
+import datetime
+import inspect
+from pathlib import Path
+import threading
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.dispatcher import EventDispatcher
+from ploomber_core.telemetry.sampling import SamplingPolicy
+
+
+def _runtime(event):
+    # total_runtime is str(timedelta), e.g., 0:00:00.050000
+    hours, minutes, seconds = event["total_runtime"].split(":")
+    return datetime.timedelta(
+        hours=int(hours), minutes=int(minutes), seconds=float(seconds)
+    ).total_seconds()
+
+
+def test_decorated_coroutine_function_is_still_a_coroutine_function(_telemetry):
+    @_telemetry.log_call()
+    async def fn():
+        pass
+
+    assert inspect.iscoroutinefunction(fn)
+
+
+def test_times_the_awaited_execution(log_api, _telemetry):
+    @_telemetry.log_call(log_args=True)
+    async def fn(x):
+        await asyncio.sleep(0.05)
+        return x
+
+    async def main():
+        result = await fn(42)
+        loop_thread = threading.get_ident()
+        # let the executor finish logging the event
+        await asyncio.sleep(0.1)
+        return result, loop_thread
+
+    result, loop_thread = asyncio.run(main())
+
+    assert result == 42
+    assert _runtime(fn.__wrapped__._telemetry_success) >= 0.05
+    assert fn.__wrapped__._telemetry_success["metadata"]["args"] == {"x": 42}
+    log_api.assert_called_once()
+    assert log_api.call_args[1]["action"] == "some-package-fn-success"
+    assert log_api.threads[0] != loop_thread
+
+
+def test_logs_errors_raised_while_awaiting(log_api, _telemetry):
+    @_telemetry.log_call()
+    async def fn():
+        await asyncio.sleep(0)
+        raise ValueError("some error")
+
+    with pytest.raises(ValueError, match="some error"):
+        asyncio.run(fn())
+
+    assert fn.__wrapped__._telemetry_success is None
+    assert fn.__wrapped__._telemetry_error["action"] == "some-package-fn-error"
+    assert fn.__wrapped__._telemetry_error["metadata"]["exception"] == "some error"
+    log_api.assert_called_once()
+
+
+def test_injects_payload(log_api, _telemetry):
+    class Something:
+        @_telemetry.log_call(payload=True)
+        async def method(self, payload, x):
+            payload["x"] = x
+            return x
+
+    assert asyncio.run(Something().method(1)) == 1
+    assert Something.method.__wrapped__._telemetry_success["metadata"]["x"] == 1
+
+
+def test_uses_the_dispatcher(log_api):
+    dispatcher = EventDispatcher()
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", dispatcher=dispatcher, transport="null"
+    )
+
+    @_telemetry.log_call()
+    async def fn():
+        pass
+
+    asyncio.run(fn())
+    dispatcher.flush(timeout=5)
+
+    log_api.assert_called_once()
+    assert log_api.call_args[1]["action"] == "some-package-fn-success"
+    assert isinstance(log_api.call_args[1]["client_time"], datetime.datetime)
+    dispatcher.close(timeout=5)
+
+
+def test_aggregate(log_api, _telemetry):
+    @_telemetry.log_call(aggregate=True)
+    async def fn():
+        await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(*(fn() for _ in range(10)))
+
+    asyncio.run(main())
+    stats, _ = _telemetry._aggregator.snapshot()
+
+    assert stats["some-package-fn"].success == 10
+    log_api.assert_not_called()
+
+
+def test_sampled_out_calls_are_not_logged(log_api, _telemetry):
+    @_telemetry.log_call(sample=SamplingPolicy(rate=0.0))
+    async def fn():
+        pass
+
+    asyncio.run(fn())
+
+    assert fn.__wrapped__._telemetry_success is None
+    log_api.assert_not_called()
+
+
+def test_skips_telemetry_if_disabled(log_api, monkeypatch, _telemetry):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+
+    @_telemetry.log_call(payload=True)
+    async def fn(payload, x):
+        payload["x"] = x
+        return x
+
+    assert asyncio.run(fn(1)) == 1
+    log_api.assert_not_called()
+    assert fn.__wrapped__._telemetry_success is None
+
+
+def test_does_not_read_the_config_file_in_the_event_loop(
+    log_api, _telemetry, monkeypatch, tmp_directory
+):
+    monkeypatch.delenv("PLOOMBER_STATS_ENABLED")
+    monkeypatch.setattr(telemetry, "DEFAULT_HOME_DIR", str(Path().absolute()))
+    file_signature = telemetry._file_signature
+    threads = []
+
+    def record_thread(path):
+        threads.append(threading.get_ident())
+        return file_signature(path)
+
+    monkeypatch.setattr(telemetry, "_file_signature", record_thread)
+
+    @_telemetry.log_call()
+    async def fn():
+        pass
+
+    async def main():
+        for _ in range(3):
+            await fn()
+
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+
+    assert threads
+    assert loop_thread not in threads
+    assert log_api.call_count == 3
+
+
+def test_picks_up_changes_to_the_config_file_if_nothing_is_logged(
+    log_api, _telemetry, monkeypatch, tmp_directory
+):
+    monkeypatch.delenv("PLOOMBER_STATS_ENABLED")
+    monkeypatch.setattr(telemetry, "DEFAULT_HOME_DIR", str(Path().absolute()))
+    # check the file every time
+    monkeypatch.setattr(telemetry, "_STATS_ENABLED_MAX_AGE", -1)
+    config = Path("stats", "config.yaml")
+    config.parent.mkdir()
+    config.write_text("stats_enabled: false\n")
+
+    @_telemetry.log_call()
+    async def fn():
+        pass
+
+    asyncio.run(fn())
+    log_api.assert_not_called()
+
+    config.write_text("stats_enabled: true\n")
+    asyncio.run(fn())
+
+    log_api.assert_called_once()
+
+
+def test_skips_telemetry_if_disabled_after_a_call(log_api, monkeypatch, _telemetry):
+    @_telemetry.log_call()
+    async def fn():
+        pass
+
+    asyncio.run(fn())
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+    asyncio.run(fn())
+
+    log_api.assert_called_once()
+    assert fn.__wrapped__._telemetry_success is None
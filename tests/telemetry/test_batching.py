@@ -0,0 +1,147 @@
+import atexit
+import gzip
+import json
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.batching import EventBatcher, encode_batch, make_message
+
+
+def test_sends_batch_when_full():
+    batches = []
+    sent = threading.Event()
+
+    def sender(batch):
+        batches.append(batch)
+        sent.set()
+
+    batcher = EventBatcher(max_batch_size=3, linger_ms=60_000)
+    batcher.start(sender)
+
+    for i in range(3):
+        batcher.add(i)
+
+    assert sent.wait(5)
+    assert batches == [[0, 1, 2]]
+
+    batcher.close(timeout=5)
+
+
+def test_sends_batch_after_linger_time():
+    sent = threading.Event()
+    batches = []
+
+    def sender(batch):
+        batches.append(batch)
+        sent.set()
+
+    batcher = EventBatcher(max_batch_size=100, linger_ms=10)
+    batcher.start(sender)
+    batcher.add("event")
+
+    assert sent.wait(5)
+    assert batches == [["event"]]
+
+    batcher.close(timeout=5)
+
+
+def test_close_sends_pending_events():
+    batches = []
+    batcher = EventBatcher(max_batch_size=100, linger_ms=60_000)
+    batcher.start(batches.append)
+
+    batcher.add("event")
+    batcher.close(timeout=5)
+
+    assert batches == [["event"]]
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        [dict(max_batch_size=0), "max_batch_size must be >= 1"],
+        [dict(compression_level=10), "compression_level must be between 0 and 9"],
+    ],
+)
+def test_invalid_parameters(kwargs, message):
+    with pytest.raises(ValueError) as excinfo:
+        EventBatcher(**kwargs)
+
+    assert message in str(excinfo.value)
+
+
+def test_encode_batch():
+    messages = [make_message("uid", "some-action", {"key": "value"})]
+
+    body = json.loads(gzip.decompress(encode_batch("KEY", messages, 9)))
+
+    assert body["api_key"] == "KEY"
+    assert body["batch"][0]["event"] == "some-action"
+    assert body["batch"][0]["distinct_id"] == "uid"
+    assert body["batch"][0]["properties"] == {"key": "value"}
+
+
+def test_log_api_with_batcher(monkeypatch):
+    mock_info = Mock(return_value=(True, "fake-uuid", True))
+    monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
+    transport = Mock()
+
+    batcher = EventBatcher(linger_ms=60_000, compression_level=1)
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", batcher=batcher, transport=transport
+    )
+
+    _telemetry.log_api("some-action")
+    batcher.flush()
+
+    transport.capture.assert_not_called()
+    transport.send_batch.assert_called_once()
+    args, kwargs = transport.send_batch.call_args
+    assert [message["event"] for message in args[0]] == [
+        "install_success_indirect",
+        "some-action",
+    ]
+    assert kwargs == {"compression_level": 1}
+
+    batcher.close(timeout=5)
+
+
+def test_events_queued_by_the_dispatcher_are_sent_at_exit(monkeypatch):
+    mock_info = Mock(return_value=(True, "fake-uuid", False))
+    monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
+    handlers = []
+    monkeypatch.setattr(atexit, "register", handlers.append)
+    transport = Mock()
+
+    def log_slowly(self, event):
+        time.sleep(0.05)
+        self.log_api(**event)
+
+    # keep events in the dispatcher's queue when the interpreter exits
+    monkeypatch.setattr(telemetry.Telemetry, "_log_dispatched_event", log_slowly)
+    _telemetry = telemetry.Telemetry(
+        "KEY",
+        "some-package",
+        "0.1",
+        dispatcher=True,
+        batcher=EventBatcher(linger_ms=60_000),
+        transport=transport,
+    )
+
+    for i in range(5):
+        _telemetry._log_event({"action": f"action-{i}"})
+
+    # atexit runs handlers in the reverse order they were registered
+    for handler in reversed(handlers):
+        handler()
+
+    sent = [
+        message["event"]
+        for args, _ in transport.send_batch.call_args_list
+        for message in args[0]
+    ]
+    assert sent == [f"action-{i}" for i in range(5)]
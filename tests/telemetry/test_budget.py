@@ -0,0 +1,128 @@
+import sys
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import budget, telemetry
+from ploomber_core.telemetry.budget import EventBudget, serialized_size
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    mock_info = Mock(return_value=(True, "fake-uuid", False))
+    monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
+
+
+def make_properties(**metadata):
+    return {"action": "some-action", "metadata": metadata}
+
+
+def test_keeps_events_that_fit():
+    properties = make_properties(argv=["bin", "arg"], exception="error")
+
+    assert EventBudget().apply(properties) == []
+    assert properties == make_properties(argv=["bin", "arg"], exception="error")
+
+
+def test_trims_dag_tasks_first():
+    tasks = {f"task-{i}": {"status": "Executed"} for i in range(100)}
+    properties = make_properties(
+        argv=["bin"] + ["arg"] * 20, dag={"dag_size": "100", "tasks": tasks}
+    )
+
+    assert EventBudget(max_bytes=300).apply(properties) == ["dag.tasks"]
+    assert properties["metadata"]["dag"] == {"dag_size": "100"}
+    assert len(properties["metadata"]["argv"]) == 21
+    assert properties["metadata"]["trimmed"] == ["dag.tasks"]
+
+
+def test_trims_fields_by_priority():
+    properties = make_properties(
+        argv=["bin"] + ["a" * 300] * 20,
+        exception="e" * 5000,
+        args={"x": "value"},
+        type=None,
+    )
+
+    trimmed = EventBudget(max_bytes=3000, max_exception_chars=100).apply(properties)
+    metadata = properties["metadata"]
+
+    assert trimmed == ["argv", "exception"]
+    assert metadata["argv"][0] == "bin"
+    assert metadata["argv"][1] == "a" * 200 + "...[truncated]"
+    assert metadata["argv"][-1] == "TRUNCATED"
+    assert len(metadata["argv"]) == 11
+    assert metadata["exception"] == "e" * 100 + "...[truncated]"
+    assert metadata["args"] == {"x": "value"}
+    assert serialized_size(properties) <= 3000
+
+
+def test_drops_the_largest_fields_as_a_last_resort():
+    properties = make_properties(
+        args={"x": 1}, big="b" * 1000, bigger="b" * 2000, small="value"
+    )
+
+    trimmed = EventBudget(max_bytes=500).apply(properties)
+
+    assert trimmed == ["args", "bigger", "big"]
+    assert properties["metadata"] == {"small": "value", "trimmed": trimmed}
+
+
+@pytest.mark.parametrize(
+    "value, max_bytes",
+    [
+        [True, budget.DEFAULT_MAX_BYTES],
+        [1000, 1000],
+        [EventBudget(max_bytes=10), 10],
+    ],
+)
+def test_from_value(value, max_bytes):
+    assert EventBudget.from_value(value).max_bytes == max_bytes
+
+
+@pytest.mark.parametrize("value", [False, None])
+def test_from_value_disabled(value):
+    assert EventBudget.from_value(value) is None
+
+
+def test_invalid_max_bytes():
+    with pytest.raises(ValueError, match="max_bytes must be positive"):
+        EventBudget(max_bytes=0)
+
+
+def test_serialized_size_without_orjson(monkeypatch):
+    obj = {"key": "value", "number": 1, "items": [1, 2.5, None, True]}
+    expected = serialized_size(obj)
+
+    # setting a module to None makes importing it raise ImportError
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    monkeypatch.setattr(budget, "_SIZE", None)
+
+    assert serialized_size(obj) == expected
+    assert budget._SIZE is budget._json_size
+
+
+def test_log_api_trims_large_events(enabled):
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="memory", budget=2000
+    )
+
+    _telemetry.log_api("some-action", metadata={"argv": ["bin"] + ["arg"] * 1000})
+
+    (event,) = _telemetry._transport.events
+    metadata = event["properties"]["metadata"]
+
+    assert metadata["trimmed"] == ["argv"]
+    assert len(metadata["argv"]) == 11
+    assert serialized_size(event["properties"]) <= 2000
+
+
+def test_log_api_without_budget(enabled):
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="memory", budget=False
+    )
+
+    _telemetry.log_api("some-action", metadata={"argv": ["bin"] + ["arg"] * 10_000})
+
+    (event,) = _telemetry._transport.events
+    assert len(event["properties"]["metadata"]["argv"]) == 10_001
@@ -0,0 +1,329 @@
+from enum import Enum
+import gc
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+
+
+class Status(Enum):
+    Executed = "executed"
+    Errored = "errored"
+
+
+class Product:
+    def __init__(self, path):
+        self.path = path
+
+    def to_json_serializable(self):
+        return self.path
+
+
+class PythonCallable:
+    def __init__(self, name, upstream, status=Status.Executed):
+        self._exec_status = status
+        self.upstream = upstream
+        self.product = Product(f"/path/to/{name}.csv")
+
+    def __str__(self):
+        return self.product.path
+
+
+class NotebookRunner(PythonCallable):
+    pass
+
+
+class DAG(dict):
+    """Mimics the interface of ploomber's DAG"""
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+def make_dag():
+    # load -> clean -> features -> fit
+    #              \-> report
+    dag = DAG()
+    dag["load"] = PythonCallable("load", {})
+    dag["clean"] = PythonCallable("clean", {"load": dag["load"]})
+    dag["features"] = PythonCallable("features", {"clean": dag["clean"]})
+    dag["report"] = NotebookRunner("report", {"clean": dag["clean"]})
+    dag["fit"] = PythonCallable(
+        "fit",
+        {"features": dag["features"], "load": dag["load"]},
+        status=Status.Errored,
+    )
+    return dag
+
+
+def test_parse_dag_summary():
+    summary = telemetry.parse_dag(make_dag(), max_tasks=2)
+
+    assert summary == {
+        "dag_size": "5",
+        "status": {"Executed": 4, "Errored": 1},
+        "types": {"PythonCallable": 4, "NotebookRunner": 1},
+        "degree": {
+            "edges": 5,
+            "max_upstream": 2,
+            "max_downstream": 2,
+            "sources": 1,
+            "sinks": 2,
+        },
+        "tasks": {
+            "load": {
+                "status": "Executed",
+                "type": "PythonCallable",
+                "upstream": {},
+                "products": "load.csv",
+            },
+            "clean": {
+                "status": "Executed",
+                "type": "PythonCallable",
+                "upstream": {"load": "load.csv"},
+                "products": "clean.csv",
+            },
+        },
+    }
+
+
+def test_parse_dag_full():
+    parsed = telemetry.parse_dag(make_dag(), full=True)
+
+    assert parsed["dag_size"] == "5"
+    assert list(parsed["tasks"]) == ["load", "clean", "features", "report", "fit"]
+    assert parsed["tasks"]["fit"]["status"] == "Errored"
+    assert parsed["tasks"]["report"]["type"] == "NotebookRunner"
+    assert "status" not in parsed
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_parse_empty_dag(full):
+    assert telemetry.parse_dag(DAG(), full=full) == {"dag_size": "0"}
+
+
+def test_parse_dag_returns_none_if_it_fails():
+    assert telemetry.parse_dag(object()) is None
+
+
+def test_summary_of_large_dag_is_bounded():
+    dag = DAG()
+
+    for i in range(10_000):
+        upstream = {f"task-{i - 1}": None} if i else {}
+        dag[f"task-{i}"] = PythonCallable(f"task-{i}", upstream)
+
+    summary = telemetry.parse_dag(dag)
+
+    assert summary["dag_size"] == "10000"
+    assert len(summary["tasks"]) == telemetry.DEFAULT_DAG_SAMPLE_SIZE
+    assert summary["degree"] == {
+        "edges": 9999,
+        "max_upstream": 1,
+        "max_downstream": 1,
+        "sources": 1,
+        "sinks": 1,
+    }
+
+
+@pytest.mark.parametrize("full_dag, has_status", [(False, True), (True, False)])
+def test_log_api_parses_dag(monkeypatch, full_dag, has_status):
+    monkeypatch.setattr(
+        telemetry, "_get_telemetry_info", Mock(return_value=(True, "uuid", False))
+    )
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="memory", full_dag=full_dag
+    )
+
+    _telemetry.log_api("some-action", metadata={"dag": make_dag()})
+
+    (event,) = _telemetry._transport.events
+    dag = event["properties"]["metadata"]["dag"]
+
+    assert dag["dag_size"] == "5"
+    assert ("status" in dag) is has_status
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_parse_dag_only_includes_changed_tasks(full):
+    snapshots = telemetry.DAGSnapshots()
+    dag = make_dag()
+
+    first = telemetry.parse_dag(dag, full=full, snapshots=snapshots)
+    second = telemetry.parse_dag(dag, full=full, snapshots=snapshots)
+
+    dag["clean"]._exec_status = Status.Errored
+    dag["fit"].product = Product("/path/to/another.csv")
+    third = telemetry.parse_dag(dag, full=full, snapshots=snapshots)
+    fourth = telemetry.parse_dag(dag, full=full, snapshots=snapshots)
+
+    assert "incremental" not in first
+    assert len(first["tasks"]) == 5
+    assert second["incremental"] is True
+    assert second["changed"] == 0
+    assert second["tasks"] == {}
+    assert third["changed"] == 2
+    assert third["tasks"]["clean"]["status"] == "Errored"
+    assert third["tasks"]["fit"]["products"] == "another.csv"
+    assert list(third["tasks"]) == ["clean", "fit"]
+    assert fourth["tasks"] == {}
+
+
+def test_parse_dag_detects_products_changed_in_place():
+    snapshots = telemetry.DAGSnapshots()
+    dag = make_dag()
+
+    telemetry.parse_dag(dag, snapshots=snapshots)
+    dag["fit"].product.path = "/path/to/another.csv"
+    parsed = telemetry.parse_dag(dag, snapshots=snapshots)
+
+    assert parsed["changed"] == 1
+    assert parsed["tasks"]["fit"]["products"] == "another.csv"
+
+
+def test_parse_dag_summary_is_complete_in_incremental_events():
+    snapshots = telemetry.DAGSnapshots()
+    dag = make_dag()
+
+    first = telemetry.parse_dag(dag, snapshots=snapshots)
+    second = telemetry.parse_dag(dag, snapshots=snapshots)
+
+    for key in ("dag_size", "status", "types", "degree"):
+        assert first[key] == second[key]
+
+
+def test_parse_dag_logs_everything_if_the_structure_changes():
+    snapshots = telemetry.DAGSnapshots()
+    dag = make_dag()
+    telemetry.parse_dag(dag, snapshots=snapshots)
+
+    dag["evaluate"] = PythonCallable("evaluate", {"fit": dag["fit"]})
+    parsed = telemetry.parse_dag(dag, snapshots=snapshots)
+
+    assert "incremental" not in parsed
+    assert parsed["dag_size"] == "6"
+    assert len(parsed["tasks"]) == 6
+
+    assert telemetry.parse_dag(dag, snapshots=snapshots)["incremental"] is True
+
+
+def test_parse_dag_tracks_dags_by_identity():
+    snapshots = telemetry.DAGSnapshots()
+    telemetry.parse_dag(make_dag(), snapshots=snapshots)
+
+    assert "incremental" not in telemetry.parse_dag(make_dag(), snapshots=snapshots)
+
+
+def test_snapshots_are_removed_when_the_dag_is_garbage_collected():
+    snapshots = telemetry.DAGSnapshots()
+    dag = make_dag()
+    telemetry.parse_dag(dag, snapshots=snapshots)
+
+    assert snapshots.get(dag) is not None
+
+    del dag
+    gc.collect()
+
+    assert snapshots._snapshots == {}
+
+
+@pytest.mark.parametrize("incremental_dag, incremental", [(True, True), (False, None)])
+def test_log_api_logs_dag_changes(monkeypatch, incremental_dag, incremental):
+    monkeypatch.setattr(
+        telemetry, "_get_telemetry_info", Mock(return_value=(True, "uuid", False))
+    )
+    _telemetry = telemetry.Telemetry(
+        "KEY",
+        "some-package",
+        "0.1",
+        transport="memory",
+        incremental_dag=incremental_dag,
+    )
+    dag = make_dag()
+
+    _telemetry.log_api("build", metadata={"dag": dag})
+    _telemetry.log_api("status", metadata={"dag": dag})
+
+    first, second = _telemetry._transport.events
+
+    assert "incremental" not in first["properties"]["metadata"]["dag"]
+    assert second["properties"]["metadata"]["dag"].get("incremental") is incremental
+
+
+def test_dispatched_events_parse_the_dag_when_logged(monkeypatch):
+    monkeypatch.setattr(
+        telemetry, "_get_telemetry_info", Mock(return_value=(True, "uuid", False))
+    )
+    dispatcher = Mock()
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="memory", dispatcher=dispatcher
+    )
+    dag = make_dag()
+
+    _telemetry._log_event(dict(action="build", metadata={"dag": dag}))
+    # the DAG changes before the worker processes the event
+    dag["load"]._exec_status = Status.Errored
+
+    (event,), _ = dispatcher.put.call_args
+    _telemetry._log_dispatched_event(event)
+
+    (sent,) = _telemetry._transport.events
+    dag_dict = sent["properties"]["metadata"]["dag"]
+
+    assert dag_dict["status"] == {"Executed": 4, "Errored": 1}
+    assert dag_dict["tasks"]["load"]["status"] == "Executed"
+
+
+def test_log_api_reports_tasks_trimmed_by_the_budget_in_the_next_event(monkeypatch):
+    monkeypatch.setattr(
+        telemetry, "_get_telemetry_info", Mock(return_value=(True, "uuid", False))
+    )
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="memory", full_dag=True, budget=1500
+    )
+    dag = make_dag()
+
+    for name in range(20):
+        dag[f"task-{name}"] = PythonCallable(f"task-{name}", {})
+
+    _telemetry.log_api("build", metadata={"dag": dag})
+    # the next events fit in the budget
+    _telemetry._budget.max_bytes = 1_000_000
+    _telemetry.log_api("status", metadata={"dag": dag})
+    _telemetry.log_api("status", metadata={"dag": dag})
+
+    first, second, third = [
+        event["properties"]["metadata"] for event in _telemetry._transport.events
+    ]
+
+    assert "dag.tasks" in first["trimmed"]
+    assert "tasks" not in first["dag"]
+    assert "incremental" not in second["dag"]
+    assert len(second["dag"]["tasks"]) == 25
+    assert third["dag"]["incremental"] is True
+    assert third["dag"]["tasks"] == {}
+
+
+def test_dropped_events_dont_update_the_dag_snapshot(monkeypatch):
+    monkeypatch.setattr(
+        telemetry, "_get_telemetry_info", Mock(return_value=(True, "uuid", False))
+    )
+    dispatcher = Mock()
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="memory", dispatcher=dispatcher
+    )
+    dag = make_dag()
+
+    _telemetry.log_api("build", metadata={"dag": dag})
+    dag["load"]._exec_status = Status.Errored
+    # the queue is full, so the event is dropped
+    _telemetry._log_event(dict(action="status", metadata={"dag": dag}))
+    _telemetry.log_api("status", metadata={"dag": dag})
+
+    _, sent = _telemetry._transport.events
+    dag_dict = sent["properties"]["metadata"]["dag"]
+
+    assert dag_dict["incremental"] is True
+    assert dag_dict["changed"] == 1
+    assert dag_dict["tasks"]["load"]["status"] == "Errored"
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.dispatcher import EventDispatcher
+
+
+def test_processes_events_in_background_thread():
+    threads = []
+    dispatcher = EventDispatcher()
+    dispatcher.start(lambda event: threads.append(threading.current_thread()))
+
+    dispatcher.put({"action": "some-action"})
+
+    assert dispatcher.flush(timeout=5)
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+
+    dispatcher.close(timeout=5)
+
+
+def test_invalid_drop_policy():
+    with pytest.raises(ValueError) as excinfo:
+        EventDispatcher(drop_policy="something")
+
+    assert "Invalid drop_policy: 'something'" in str(excinfo.value)
+
+
+@pytest.mark.parametrize(
+    "drop_policy, expected",
+    [
+        ["drop_newest", [0, 1, 2]],
+        ["drop_oldest", [0, 3, 4]],
+    ],
+)
+def test_drop_policy(drop_policy, expected):
+    received = []
+    release = threading.Event()
+    processing = threading.Event()
+
+    def handler(event):
+        processing.set()
+        release.wait(5)
+        received.append(event)
+
+    dispatcher = EventDispatcher(maxsize=2, drop_policy=drop_policy)
+    dispatcher.start(handler)
+
+    # the worker takes the first one and blocks, the queue holds two more
+    dispatcher.put(0)
+    processing.wait(5)
+
+    for event in range(1, 5):
+        dispatcher.put(event)
+
+    release.set()
+    dispatcher.flush(timeout=5)
+
+    assert received == expected
+    assert dispatcher.dropped == 2
+
+    dispatcher.close(timeout=5)
+
+
+def test_flush_respects_timeout():
+    release = threading.Event()
+    dispatcher = EventDispatcher()
+    dispatcher.start(lambda event: release.wait(5))
+
+    dispatcher.put({"action": "some-action"})
+
+    assert dispatcher.flush(timeout=0.05) is False
+
+    release.set()
+    assert dispatcher.flush(timeout=5)
+
+    dispatcher.close(timeout=5)
+
+
+def test_handler_errors_do_not_stop_the_worker():
+    received = []
+
+    def handler(event):
+        if event == "fail":
+            raise ValueError
+
+        received.append(event)
+
+    dispatcher = EventDispatcher()
+    dispatcher.start(handler)
+
+    dispatcher.put("fail")
+    dispatcher.put("ok")
+    dispatcher.flush(timeout=5)
+
+    assert received == ["ok"]
+
+    dispatcher.close(timeout=5)
+
+
+def test_log_call_with_dispatcher(log_api):
+    dispatcher = EventDispatcher()
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", dispatcher=dispatcher
+    )
+
+    @_telemetry.log_call()
+    def my_function():
+        return 42
+
+    assert my_function() == 42
+    assert dispatcher.flush(timeout=5)
+
+    log_api.assert_called_once()
+    kwargs = log_api.call_args[1]
+    assert kwargs["action"] == "some-package-my-function-success"
+    assert kwargs["client_time"] is not None
+
+    dispatcher.close(timeout=5)
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.aggregation import MetricsAggregator
+from ploomber_core.telemetry.batching import EventBatcher
+from ploomber_core.telemetry.dispatcher import EventDispatcher
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "register_at_fork"), reason="requires os.register_at_fork"
+)
+
+_aggregator = MetricsAggregator(flush_interval=3600, forward_from_children=True)
+_telemetry = telemetry.Telemetry(
+    "KEY", "some-package", "0.1", aggregator=_aggregator, transport="null"
+)
+
+
+@_telemetry.log_call(aggregate=True)
+def square(x):
+    return x * x
+
+
+def _inspect_child_state(telemetry_, queue):
+    queue.put(
+        (
+            telemetry_._dispatcher._thread is None,
+            telemetry_._dispatcher._queue.qsize(),
+            telemetry_._batcher._thread is None,
+            telemetry_._batcher._buffer,
+        )
+    )
+
+
+def test_resets_background_state_in_forked_process():
+    ctx = multiprocessing.get_context("fork")
+    dispatcher = EventDispatcher()
+    batcher = EventBatcher(linger_ms=60_000)
+    telemetry_ = telemetry.Telemetry(
+        "KEY",
+        "some-package",
+        "0.1",
+        dispatcher=dispatcher,
+        batcher=batcher,
+        transport="null",
+    )
+    # leave some state behind in the parent
+    batcher.add({"event": "pending"})
+
+    queue = ctx.SimpleQueue()
+    process = ctx.Process(target=_inspect_child_state, args=(telemetry_, queue))
+    process.start()
+    process.join()
+
+    assert queue.get() == (True, 0, True, [])
+    assert batcher._buffer == [{"event": "pending"}]
+
+    dispatcher.close(timeout=5)
+    batcher.close(timeout=5)
+
+
+def test_pool_workers_forward_stats_to_parent(monkeypatch):
+    log_api = Mock()
+    monkeypatch.setattr(telemetry.Telemetry, "log_api", log_api)
+    ctx = multiprocessing.get_context("fork")
+
+    pool = ctx.Pool(4)
+    assert pool.map(square, range(100)) == [x * x for x in range(100)]
+    pool.close()
+    pool.join()
+
+    log_api.assert_not_called()
+
+    _aggregator.close()
+
+    log_api.assert_called_once()
+    kwargs = log_api.call_args[1]
+    assert kwargs["action"] == "some-package-square-summary"
+    assert kwargs["metadata"]["success"] == 100
+
+
+def _get_metrics(telemetry_, queue):
+    queue.put(telemetry_.metrics.snapshot())
+
+
+def test_resets_metrics_in_forked_process():
+    ctx = multiprocessing.get_context("fork")
+    telemetry_ = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="null", metrics=True
+    )
+    telemetry_.metrics.record("some-action", 1_000)
+
+    queue = ctx.SimpleQueue()
+    process = ctx.Process(target=_get_metrics, args=(telemetry_, queue))
+    process.start()
+    process.join()
+
+    assert queue.get() == {}
+    assert telemetry_.metrics.get("some-action")["calls"] == 1
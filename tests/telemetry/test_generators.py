@@ -0,0 +1,189 @@
+import asyncio
+import inspect
+import time
+
+import pytest
+
+
+def test_decorated_functions_keep_their_kind(_telemetry):
+    @_telemetry.log_call()
+    def gen():
+        yield 1
+
+    @_telemetry.log_call()
+    async def agen():
+        yield 1
+
+    assert inspect.isgeneratorfunction(gen)
+    assert inspect.isasyncgenfunction(agen)
+
+
+def test_times_generator_until_exhausted(_telemetry, log_api):
+    @_telemetry.log_call(log_args=True)
+    def numbers(n):
+        for i in range(n):
+            time.sleep(0.01)
+            yield i
+
+        return "done"
+
+    generator = numbers(5)
+
+    log_api.assert_not_called()
+    assert list(generator) == [0, 1, 2, 3, 4]
+
+    success = numbers.__wrapped__._telemetry_success
+    metadata = success["metadata"]
+
+    log_api.assert_called_once()
+    assert success["action"] == "some-package-numbers-success"
+    assert metadata["args"] == {"n": 5}
+    assert metadata["items"] == 5
+    assert metadata["items_per_second"] > 0
+    assert success["total_runtime"] >= "0:00:00.05"
+
+
+def test_keeps_the_return_value(_telemetry, log_api):
+    @_telemetry.log_call()
+    def gen():
+        yield 1
+        return "done"
+
+    def delegate():
+        result = yield from gen()
+        return result
+
+    with pytest.raises(StopIteration) as excinfo:
+        generator = delegate()
+        next(generator)
+        next(generator)
+
+    assert excinfo.value.value == "done"
+
+
+def test_logs_when_closed_early(_telemetry, log_api):
+    @_telemetry.log_call()
+    def gen():
+        yield from range(100)
+
+    generator = gen()
+    next(generator)
+    next(generator)
+    generator.close()
+
+    log_api.assert_called_once()
+    assert gen.__wrapped__._telemetry_success["metadata"]["items"] == 2
+
+
+def test_logs_errors_raised_while_iterating(_telemetry, log_api):
+    @_telemetry.log_call()
+    def gen():
+        yield 1
+        raise ValueError("some error")
+
+    with pytest.raises(ValueError, match="some error"):
+        list(gen())
+
+    error = gen.__wrapped__._telemetry_error
+
+    log_api.assert_called_once()
+    assert error["action"] == "some-package-gen-error"
+    assert error["metadata"]["exception"] == "some error"
+    assert error["metadata"]["items"] == 1
+
+
+def test_forwards_send_and_throw(_telemetry, log_api):
+    @_telemetry.log_call()
+    def accumulate():
+        total = 0
+
+        while True:
+            try:
+                total += yield total
+            except ValueError:
+                total = 0
+
+    generator = accumulate()
+    next(generator)
+
+    assert generator.send(1) == 1
+    assert generator.send(2) == 3
+    assert generator.throw(ValueError) == 0
+
+    generator.close()
+    log_api.assert_called_once()
+
+
+def test_aggregate(_telemetry, log_api):
+    @_telemetry.log_call(aggregate=True)
+    def gen():
+        yield 1
+
+    for _ in range(3):
+        list(gen())
+
+    stats, _ = _telemetry._aggregator.snapshot()
+
+    assert stats["some-package-gen"].success == 3
+    log_api.assert_not_called()
+
+
+def test_times_async_generator_until_exhausted(_telemetry, log_api):
+    @_telemetry.log_call()
+    async def numbers(n):
+        for i in range(n):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def main():
+        items = [i async for i in numbers(3)]
+        # let the executor finish logging the event
+        await asyncio.sleep(0.1)
+        return items
+
+    assert asyncio.run(main()) == [0, 1, 2]
+
+    success = numbers.__wrapped__._telemetry_success
+
+    log_api.assert_called_once()
+    assert success["metadata"]["items"] == 3
+    assert success["total_runtime"] >= "0:00:00.03"
+
+
+def test_logs_errors_raised_while_iterating_async_generator(_telemetry, log_api):
+    @_telemetry.log_call()
+    async def agen():
+        yield 1
+        raise ValueError("some error")
+
+    async def main():
+        return [i async for i in agen()]
+
+    with pytest.raises(ValueError, match="some error"):
+        asyncio.run(main())
+
+    assert agen.__wrapped__._telemetry_error["metadata"]["items"] == 1
+
+
+def test_skips_telemetry_if_disabled(_telemetry, log_api, monkeypatch):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+
+    @_telemetry.log_call()
+    def gen():
+        sent = yield 1
+        yield sent
+
+    @_telemetry.log_call()
+    async def agen():
+        yield 1
+        yield 2
+
+    generator = gen()
+    assert next(generator) == 1
+    assert generator.send("value") == "value"
+
+    async def main():
+        return [i async for i in agen()]
+
+    assert asyncio.run(main()) == [1, 2]
+    log_api.assert_not_called()
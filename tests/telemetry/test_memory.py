@@ -0,0 +1,209 @@
+import sys
+import tracemalloc
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import memory
+from ploomber_core.telemetry.memory import MemoryTracker
+
+
+@pytest.fixture
+def telemetry_kwargs():
+    return {"metrics": True}
+
+
+def allocate(size):
+    return bytearray(size)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="requires /proc")
+def test_current_rss():
+    assert memory.current_rss() > 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires resource")
+def test_peak_rss():
+    assert memory.peak_rss() > 0
+
+
+def test_rss_mode(monkeypatch):
+    monkeypatch.setattr(memory, "current_rss", Mock(side_effect=[100, 250]))
+    monkeypatch.setattr(memory, "peak_rss", Mock(side_effect=[1_000, 1_200]))
+    tracker = MemoryTracker()
+
+    measurement = tracker.start()
+    usage = tracker.finish(measurement)
+
+    assert usage == {"rss_delta": 150, "peak_rss": 1_200, "peak_rss_delta": 200}
+    assert measurement.usage is usage
+
+
+def test_rss_not_available(monkeypatch):
+    monkeypatch.setattr(memory, "current_rss", Mock(return_value=None))
+    monkeypatch.setattr(memory, "peak_rss", Mock(return_value=None))
+    tracker = MemoryTracker()
+
+    usage = tracker.finish(tracker.start())
+
+    assert usage == {"rss_delta": None, "peak_rss": None, "peak_rss_delta": None}
+
+
+def test_tracemalloc_mode():
+    tracker = MemoryTracker(mode="tracemalloc", top=3)
+
+    measurement = tracker.start()
+    data = allocate(5_000_000)
+    usage = tracker.finish(measurement)
+
+    assert usage["tracemalloc_peak"] >= 5_000_000
+    assert len(usage["top"]) <= 3
+    assert usage["top"][0]["location"].startswith("test_memory.py:")
+    assert usage["top"][0]["size"] >= 5_000_000
+    assert not tracemalloc.is_tracing()
+    del data
+
+
+def test_tracemalloc_mode_if_already_tracing():
+    tracker = MemoryTracker(mode="tracemalloc")
+    tracemalloc.start()
+    before = allocate(1_000_000)
+
+    try:
+        measurement = tracker.start()
+        data = allocate(2_000_000)
+        usage = tracker.finish(measurement)
+
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    assert 2_000_000 <= usage["tracemalloc_peak"] < 3_000_000
+    assert usage["top"][0]["size"] >= 2_000_000
+    del before, data
+
+
+def test_only_one_call_is_traced_at_a_time():
+    tracker = MemoryTracker(mode="tracemalloc")
+
+    outer = tracker.start()
+    inner = tracker.start()
+    inner_usage = tracker.finish(inner)
+    outer_usage = tracker.finish(outer)
+
+    assert "tracemalloc_peak" not in inner_usage
+    assert "tracemalloc_peak" in outer_usage
+    assert "tracemalloc_peak" in tracker.finish(tracker.start())
+
+
+def test_errors_are_ignored(monkeypatch):
+    monkeypatch.setattr(memory, "peak_rss", Mock(side_effect=[0, OSError, 0, 0]))
+    tracker = MemoryTracker(mode="tracemalloc")
+
+    usage = tracker.finish(tracker.start())
+    measurement = tracker.start()
+    tracker.finish(measurement)
+
+    assert "tracemalloc_peak" in usage
+    # the lock was released
+    assert measurement.tracing
+
+
+def test_stops_tracing_if_interrupted(monkeypatch):
+    tracker = MemoryTracker(mode="tracemalloc")
+    measurement = tracker.start()
+    monkeypatch.setattr(memory, "peak_rss", Mock(side_effect=KeyboardInterrupt))
+
+    with pytest.raises(KeyboardInterrupt):
+        tracker.finish(measurement)
+
+    assert not tracemalloc.is_tracing()
+    assert not memory._TRACEMALLOC.locked()
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError, match="mode must be one of"):
+        MemoryTracker(mode="psutil")
+
+
+@pytest.mark.parametrize(
+    "value, mode",
+    [
+        [True, "rss"],
+        ["rss", "rss"],
+        ["tracemalloc", "tracemalloc"],
+        [MemoryTracker(mode="tracemalloc"), "tracemalloc"],
+    ],
+)
+def test_from_value(value, mode):
+    assert MemoryTracker.from_value(value).mode == mode
+
+
+@pytest.mark.parametrize("value", [None, False])
+def test_from_value_disabled(value):
+    assert MemoryTracker.from_value(value) is None
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_log_call_records_memory(_telemetry, log_api, fails):
+    @_telemetry.log_call(memory="tracemalloc")
+    def build():
+        data = allocate(1_000_000)
+
+        if fails:
+            raise ValueError
+
+        return data
+
+    if fails:
+        with pytest.raises(ValueError):
+            build()
+    else:
+        build()
+
+    usage = log_api.call_args.kwargs["metadata"]["memory"]
+    metrics = _telemetry.metrics.get("some-package-build")
+
+    assert usage["tracemalloc_peak"] >= 1_000_000
+    assert set(usage) >= {"rss_delta", "peak_rss", "peak_rss_delta", "top"}
+    assert metrics["memory"]["max_tracemalloc_peak"] == usage["tracemalloc_peak"]
+
+
+@pytest.mark.parametrize("exception", [KeyboardInterrupt, SystemExit])
+def test_log_call_stops_tracing_interrupted_calls(_telemetry, log_api, exception):
+    @_telemetry.log_call(memory="tracemalloc")
+    def build():
+        allocate(1_000)
+        raise exception
+
+    with pytest.raises(exception):
+        build()
+
+    assert not tracemalloc.is_tracing()
+    assert not memory._TRACEMALLOC.locked()
+    assert _telemetry.metrics.get("some-package-build")["errors"] == 1
+    log_api.assert_not_called()
+
+
+def test_log_call_records_memory_of_generators(_telemetry, log_api):
+    @_telemetry.log_call(memory=True)
+    def numbers():
+        yield 1
+
+    list(numbers())
+
+    metadata = log_api.call_args.kwargs["metadata"]
+
+    assert metadata["items"] == 1
+    assert "peak_rss_delta" in metadata["memory"]
+
+
+def test_log_call_without_memory(_telemetry, log_api):
+    @_telemetry.log_call()
+    def build():
+        pass
+
+    build()
+
+    assert "memory" not in log_api.call_args.kwargs["metadata"]
+    assert "memory" not in _telemetry.metrics.get("some-package-build")
@@ -0,0 +1,172 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def telemetry_kwargs():
+    return {"metrics": True}
+
+
+def test_registry_records_calls():
+    registry = MetricsRegistry()
+
+    registry.record("action", 3_000)
+    registry.record("action", 1_000, error=True)
+    registry.record("another-action", 5)
+
+    assert registry.get("action") == {
+        "calls": 2,
+        "errors": 1,
+        "total_ns": 4_000,
+        "min_ns": 1_000,
+        "max_ns": 3_000,
+        "mean_ns": 2_000,
+    }
+    assert set(registry.snapshot()) == {"action", "another-action"}
+    assert registry.get("missing") is None
+
+
+def test_registry_reset():
+    registry = MetricsRegistry()
+    registry.record("action", 1)
+
+    registry.reset()
+
+    assert registry.snapshot() == {}
+
+
+def test_snapshot_is_a_copy():
+    registry = MetricsRegistry()
+    registry.record("action", 1)
+
+    snapshot = registry.snapshot()
+    registry.record("action", 1)
+
+    assert snapshot["action"]["calls"] == 1
+
+
+@pytest.mark.parametrize(
+    "value, expected_type",
+    [
+        [False, type(None)],
+        [True, MetricsRegistry],
+    ],
+)
+def test_metrics_argument(value, expected_type):
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="null", metrics=value
+    )
+    assert isinstance(_telemetry.metrics, expected_type)
+
+
+def test_metrics_argument_with_registry():
+    registry = MetricsRegistry()
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="null", metrics=registry
+    )
+    assert _telemetry.metrics is registry
+
+
+def test_log_call_records_calls_and_errors(_telemetry, log_api):
+    @_telemetry.log_call()
+    def divide(a, b):
+        return a / b
+
+    divide(1, 2)
+
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    metrics = _telemetry.metrics.get("some-package-divide")
+
+    assert metrics["calls"] == 2
+    assert metrics["errors"] == 1
+    assert 0 < metrics["min_ns"] <= metrics["max_ns"] <= metrics["total_ns"]
+    assert log_api.call_count == 2
+
+
+def test_records_calls_if_telemetry_is_disabled(_telemetry, log_api, monkeypatch):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+
+    @_telemetry.log_call()
+    def function():
+        pass
+
+    @_telemetry.log_call()
+    async def coroutine():
+        pass
+
+    @_telemetry.log_call()
+    def numbers():
+        yield 1
+        raise ValueError
+
+    function()
+    asyncio.run(coroutine())
+
+    with pytest.raises(ValueError):
+        list(numbers())
+
+    snapshot = _telemetry.metrics.snapshot()
+
+    assert snapshot["some-package-function"]["calls"] == 1
+    assert snapshot["some-package-coroutine"]["calls"] == 1
+    assert snapshot["some-package-numbers"]["errors"] == 1
+    log_api.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(aggregate=True),
+        dict(sample=0.0),
+    ],
+    ids=["aggregate", "sampled-out"],
+)
+def test_records_aggregated_and_sampled_out_calls(_telemetry, log_api, kwargs):
+    @_telemetry.log_call(**kwargs)
+    def function():
+        pass
+
+    for _ in range(3):
+        function()
+
+    assert _telemetry.metrics.get("some-package-function")["calls"] == 3
+
+
+def test_uses_perf_counter_ns(_telemetry, log_api, monkeypatch):
+    monkeypatch.setattr(
+        telemetry.time, "perf_counter_ns", Mock(side_effect=[10, 1_500_010])
+    )
+
+    @_telemetry.log_call()
+    def function():
+        pass
+
+    function()
+
+    assert _telemetry.metrics.get("some-package-function")["total_ns"] == 1_500_000
+    assert log_api.call_args[1]["total_runtime"] == "0:00:00.001500"
+
+
+def test_registry_records_the_maximum_memory_usage():
+    registry = MetricsRegistry()
+
+    registry.record("action", 1, memory={"rss_delta": 10, "peak_rss_delta": 0})
+    registry.record(
+        "action",
+        1,
+        memory={"rss_delta": -5, "peak_rss_delta": 100, "tracemalloc_peak": 7},
+    )
+    registry.record("action", 1)
+
+    assert registry.get("action")["memory"] == {
+        "max_rss_delta": 10,
+        "max_peak_rss_delta": 100,
+        "max_tracemalloc_peak": 7,
+    }
@@ -0,0 +1,192 @@
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.metrics import MetricsRegistry
+from ploomber_core.telemetry.openmetrics import (
+    OPENMETRICS_CONTENT_TYPE,
+    PROMETHEUS_CONTENT_TYPE,
+    render,
+    serve,
+    write_textfile,
+)
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    registry.record("some-action", 1_000_000)
+    registry.record("some-action", 3_000_000, error=True)
+    return registry
+
+
+@pytest.fixture(scope="module")
+def _server():
+    # closing the server takes up to half a second, so it's shared
+    server = serve(MetricsRegistry(), port=0)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def server(_server, registry):
+    _server.registry = registry
+    return _server
+
+
+def get(server, path="/metrics", accept=None):
+    host, port = server.address
+    headers = {} if accept is None else {"Accept": accept}
+    request = Request(f"http://{host}:{port}{path}", headers=headers)
+
+    with urlopen(request, timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode()
+
+
+def test_render_openmetrics(registry):
+    assert render(registry) == (
+        "# HELP ploomber_calls Calls to functions decorated with log_call\n"
+        "# TYPE ploomber_calls counter\n"
+        'ploomber_calls_total{action="some-action"} 2\n'
+        "# HELP ploomber_errors Calls to functions decorated with log_call "
+        "that raised an exception\n"
+        "# TYPE ploomber_errors counter\n"
+        'ploomber_errors_total{action="some-action"} 1\n'
+        "# HELP ploomber_call_duration_seconds Duration of calls to functions "
+        "decorated with log_call\n"
+        "# TYPE ploomber_call_duration_seconds summary\n"
+        "# UNIT ploomber_call_duration_seconds seconds\n"
+        'ploomber_call_duration_seconds_count{action="some-action"} 2\n'
+        'ploomber_call_duration_seconds_sum{action="some-action"} 0.004\n'
+        "# HELP ploomber_call_min_duration_seconds Duration of the fastest call\n"
+        "# TYPE ploomber_call_min_duration_seconds gauge\n"
+        "# UNIT ploomber_call_min_duration_seconds seconds\n"
+        'ploomber_call_min_duration_seconds{action="some-action"} 0.001\n'
+        "# HELP ploomber_call_max_duration_seconds Duration of the slowest call\n"
+        "# TYPE ploomber_call_max_duration_seconds gauge\n"
+        "# UNIT ploomber_call_max_duration_seconds seconds\n"
+        'ploomber_call_max_duration_seconds{action="some-action"} 0.003\n'
+        "# EOF\n"
+    )
+
+
+def test_render_prometheus(registry):
+    text = render(registry, openmetrics=False)
+
+    assert "# TYPE ploomber_calls_total counter\n" in text
+    assert "# TYPE ploomber_errors_total counter\n" in text
+    assert "# UNIT" not in text
+    assert "# EOF" not in text
+
+
+def test_render_empty_registry():
+    text = render(MetricsRegistry())
+
+    assert text.endswith("# EOF\n")
+    assert all(line.startswith("#") for line in text.splitlines())
+
+
+def test_render_escapes_labels():
+    registry = MetricsRegistry()
+    registry.record('some "action"\\\n', 1)
+
+    assert 'action="some \\"action\\"\\\\\\n"' in render(registry)
+
+
+def test_render_custom_prefix(registry):
+    assert 'my_app_calls_total{action="some-action"} 2' in render(
+        registry, prefix="my_app"
+    )
+
+
+@pytest.mark.parametrize("prefix", ["", "1abc", "my-app"])
+def test_render_invalid_prefix(registry, prefix):
+    with pytest.raises(ValueError, match="Invalid metric name prefix"):
+        render(registry, prefix=prefix)
+
+
+def test_write_textfile(registry, tmp_path):
+    path = write_textfile(registry, tmp_path / "metrics.prom")
+
+    assert path == tmp_path / "metrics.prom"
+    assert path.read_text() == render(registry, openmetrics=False)
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]
+
+
+def test_write_textfile_to_directory(registry, tmp_path):
+    path = write_textfile(registry, tmp_path, prefix="my_app")
+
+    assert path == tmp_path / "my_app.prom"
+    assert "my_app_calls_total" in path.read_text()
+
+
+def test_write_textfile_replaces_content(registry, tmp_path):
+    path = write_textfile(registry, tmp_path)
+    registry.record("another-action", 1)
+    write_textfile(registry, tmp_path)
+
+    assert 'action="another-action"' in path.read_text()
+
+
+def test_server_listens_on_localhost(server):
+    host, port = server.address
+
+    assert host == "127.0.0.1"
+    assert port > 0
+
+
+@pytest.mark.parametrize(
+    "accept, content_type",
+    [
+        [None, PROMETHEUS_CONTENT_TYPE],
+        ["application/openmetrics-text; version=1.0.0", OPENMETRICS_CONTENT_TYPE],
+    ],
+)
+def test_server_content_negotiation(server, registry, accept, content_type):
+    received_type, body = get(server, accept=accept)
+    openmetrics = content_type == OPENMETRICS_CONTENT_TYPE
+
+    assert received_type == content_type
+    assert body == render(registry, openmetrics=openmetrics)
+
+
+def test_server_serves_current_metrics(server, registry):
+    registry.record("another-action", 1)
+
+    _, body = get(server)
+
+    assert 'ploomber_calls_total{action="another-action"} 1' in body
+
+
+def test_server_not_found(server):
+    with pytest.raises(HTTPError) as excinfo:
+        get(server, path="/")
+
+    assert excinfo.value.code == 404
+
+
+def test_server_close():
+    server = serve(MetricsRegistry(), port=0)
+    server.close()
+    server.close()
+
+    assert server.address is None
+
+
+def test_exports_log_call_metrics(monkeypatch, tmp_path):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="null", metrics=True
+    )
+
+    @_telemetry.log_call()
+    def build():
+        pass
+
+    build()
+
+    path = write_textfile(_telemetry.metrics, tmp_path)
+
+    assert 'ploomber_calls_total{action="some-package-build"} 1' in path.read_text()
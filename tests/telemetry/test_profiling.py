@@ -0,0 +1,260 @@
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import profiling, telemetry
+from ploomber_core.telemetry.profiling import SlowCallProfiler
+
+
+def slow_helper():
+    time.sleep(0.02)
+
+
+def profiles(directory):
+    return [json.loads(path.read_text()) for path in sorted(directory.glob("*.json"))]
+
+
+def test_triggers_on_slow_calls():
+    profiler = SlowCallProfiler(threshold=1.0, calls=2)
+
+    profiler.observe(elapsed_ns=999_999_999)
+    assert profiler.pending == 0
+
+    profiler.observe(elapsed_ns=1_000_000_000)
+    assert profiler.pending == 2
+
+
+def test_triggers_at_random(monkeypatch):
+    monkeypatch.setattr(profiling._RANDOM, "random", Mock(return_value=0.05))
+
+    SlowCallProfiler(threshold=None, probability=0.01).observe(0)
+    profiler = SlowCallProfiler(threshold=None, probability=0.1)
+    profiler.observe(0)
+
+    assert profiler.pending == 1
+
+
+def test_profiles_the_next_calls(tmp_path):
+    profiler = SlowCallProfiler(calls=2, directory=tmp_path, cooldown=0)
+    profiler.observe(elapsed_ns=2_000_000_000)
+
+    for _ in range(2):
+        profiled = profiler.start()
+        slow_helper()
+        profiler.finish(profiled, "some-action", 10)
+
+    assert len(profiles(tmp_path)) == 2
+    assert profiler.pending == 0
+    assert profiler.start() is None
+
+
+def test_waits_for_the_cooldown(monkeypatch, tmp_path):
+    now = Mock(return_value=100.0)
+    monkeypatch.setattr(profiling.time, "monotonic", now)
+    profiler = SlowCallProfiler(cooldown=60, directory=tmp_path)
+    profiler.observe(elapsed_ns=2_000_000_000)
+    profiler.finish(profiler.start(), "some-action", 10)
+
+    now.return_value = 159.0
+    profiler.observe(elapsed_ns=2_000_000_000)
+    assert profiler.pending == 0
+
+    now.return_value = 160.0
+    profiler.observe(elapsed_ns=2_000_000_000)
+    assert profiler.pending == 1
+
+
+def test_saves_the_top_functions(tmp_path):
+    profiler = SlowCallProfiler(directory=tmp_path, top=3, summary=True)
+    profiler.observe(elapsed_ns=2_000_000_000)
+
+    profiled = profiler.start()
+    slow_helper()
+    profiler.finish(profiled, "some/action", 1_500_000_000)
+
+    (path,) = tmp_path.glob("*.json")
+    content = json.loads(path.read_text())
+
+    assert path.name.startswith("some_action-")
+    assert content["action"] == "some/action"
+    assert content["elapsed"] == 1.5
+    assert content["total_calls"] > 0
+    assert len(content["top"]) == 3
+    assert any("slow_helper" in entry["function"] for entry in content["top"])
+    assert all("/" not in entry["function"] for entry in content["top"])
+    cumtimes = [entry["cumtime"] for entry in content["top"]]
+    assert cumtimes == sorted(cumtimes, reverse=True)
+    assert profiled.summary == {
+        "file": path.name,
+        "top": [
+            {"function": entry["function"], "cumtime": entry["cumtime"]}
+            for entry in content["top"]
+        ],
+    }
+
+
+def test_keeps_the_latest_profiles(tmp_path):
+    for i in range(3):
+        path = tmp_path / f"old-{i}.json"
+        path.write_text("{}")
+        # make sure they're older than the new profile
+        past = time.time() - 100 + i
+        os.utime(path, (past, past))
+
+    profiler = SlowCallProfiler(directory=tmp_path, max_files=2)
+    profiler.observe(elapsed_ns=2_000_000_000)
+    profiler.finish(profiler.start(), "some-action", 10)
+
+    names = sorted(path.name for path in tmp_path.glob("*.json"))
+
+    assert len(names) == 2
+    assert "old-2.json" in names
+
+
+def test_only_one_call_is_profiled_at_a_time(tmp_path):
+    first = SlowCallProfiler(directory=tmp_path)
+    second = SlowCallProfiler(directory=tmp_path)
+    first.observe(elapsed_ns=2_000_000_000)
+    second.observe(elapsed_ns=2_000_000_000)
+
+    profiled = first.start()
+
+    assert second.start() is None
+    # it's still pending
+    assert second.pending == 1
+
+    first.finish(profiled, "some-action", 10)
+    second.finish(second.start(), "some-action", 10)
+
+    assert len(profiles(tmp_path)) == 2
+
+
+def test_saving_errors_are_ignored(tmp_path):
+    file = tmp_path / "file"
+    file.touch()
+    profiler = SlowCallProfiler(directory=file / "profiles")
+    profiler.observe(elapsed_ns=2_000_000_000)
+    profiled = profiler.start()
+
+    profiler.finish(profiled, "some-action", 10)
+
+    assert profiled.summary is None
+    assert profiler.start() is None
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        [dict(probability=2), "probability must be between 0 and 1"],
+        [dict(calls=0), "calls must be at least 1"],
+    ],
+)
+def test_invalid_arguments(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        SlowCallProfiler(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "value, threshold",
+    [
+        [True, 1.0],
+        [0.5, 0.5],
+        [SlowCallProfiler(threshold=2.0), 2.0],
+    ],
+)
+def test_from_value(value, threshold):
+    assert SlowCallProfiler.from_value(value).threshold == threshold
+
+
+@pytest.mark.parametrize("value", [None, False])
+def test_from_value_disabled(value):
+    assert SlowCallProfiler.from_value(value) is None
+
+
+def test_log_call_profiles_calls_after_a_slow_one(_telemetry, log_api, tmp_path):
+    profiler = SlowCallProfiler(threshold=0.01, directory=tmp_path, summary=True)
+
+    @_telemetry.log_call(profile_slow_calls=profiler)
+    def build(sleep):
+        if sleep:
+            slow_helper()
+
+    build(sleep=True)
+    assert profiles(tmp_path) == []
+    assert "profile" not in log_api.call_args.kwargs["metadata"]
+
+    build(sleep=False)
+    (content,) = profiles(tmp_path)
+    metadata = log_api.call_args.kwargs["metadata"]
+
+    assert content["action"] == "some-package-build"
+    assert metadata["profile"]["file"].startswith("some-package-build-")
+    assert len(metadata["profile"]["top"]) == 3
+
+
+@pytest.mark.parametrize("exception", [KeyboardInterrupt, SystemExit])
+def test_log_call_stops_profiling_interrupted_calls(
+    _telemetry, log_api, tmp_path, exception
+):
+    profiler = SlowCallProfiler(threshold=0, directory=tmp_path, cooldown=0)
+
+    @_telemetry.log_call(profile_slow_calls=profiler)
+    def build(interrupt):
+        if interrupt:
+            raise exception
+
+    build(interrupt=False)
+
+    with pytest.raises(exception):
+        build(interrupt=True)
+
+    assert sys.getprofile() is None
+    assert not profiling._ACTIVE.locked()
+    assert len(profiles(tmp_path)) == 1
+
+    # the next calls can be profiled
+    build(interrupt=False)
+    build(interrupt=False)
+
+    assert len(profiles(tmp_path)) == 2
+
+
+def test_log_call_profiles_if_telemetry_is_disabled(
+    _telemetry, log_api, monkeypatch, tmp_path
+):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+    profiler = SlowCallProfiler(threshold=0.01, directory=tmp_path)
+
+    @_telemetry.log_call(profile_slow_calls=profiler)
+    def build():
+        slow_helper()
+
+    build()
+    build()
+
+    assert len(profiles(tmp_path)) == 1
+    log_api.assert_not_called()
+
+
+def test_log_call_default_directory(_telemetry, monkeypatch, tmp_path):
+    monkeypatch.setattr(telemetry, "get_home_dir", Mock(return_value=str(tmp_path)))
+    profiler = SlowCallProfiler()
+
+    @_telemetry.log_call(profile_slow_calls=profiler)
+    def build():
+        pass
+
+    assert profiler.directory == Path(tmp_path, "stats", "profiles")
+
+
+def test_log_call_profiles_only_regular_functions(_telemetry):
+    with pytest.raises(ValueError, match="only supported in regular functions"):
+
+        @_telemetry.log_call(profile_slow_calls=True)
+        async def build():
+            pass
@@ -0,0 +1,115 @@
+import random
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import sampling, telemetry
+from ploomber_core.telemetry.sampling import SamplingPolicy
+
+
+@pytest.fixture
+def get_args(monkeypatch):
+    mock = Mock(wraps=telemetry._get_args)
+    monkeypatch.setattr(telemetry, "_get_args", mock)
+    yield mock
+
+
+def test_rate(monkeypatch):
+    values = iter([0.05, 0.5])
+    monkeypatch.setattr(sampling._RANDOM, "random", lambda: next(values))
+    policy = SamplingPolicy(rate=0.1)
+
+    assert policy.should_sample("action") is True
+    assert policy.should_sample("action") is False
+
+
+def test_ignores_the_seed_of_the_global_generator():
+    policy = SamplingPolicy(rate=0.5)
+
+    def sample():
+        random.seed(0)
+        return [policy.should_sample("action") for _ in range(50)]
+
+    assert sample() != sample()
+    random.seed()
+
+
+def test_token_bucket_per_action(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    policy = SamplingPolicy(max_per_second=2)
+
+    assert [policy.should_sample("a") for _ in range(3)] == [True, True, False]
+    assert policy.should_sample("b") is True
+
+    now[0] = 0.5
+    assert policy.should_sample("a") is True
+    assert policy.should_sample("a") is False
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        [dict(rate=1.5), "rate must be between 0 and 1"],
+        [dict(max_per_second=0), "max_per_second must be positive"],
+    ],
+)
+def test_invalid_parameters(kwargs, message):
+    with pytest.raises(ValueError) as excinfo:
+        SamplingPolicy(**kwargs)
+
+    assert message in str(excinfo.value)
+
+
+def test_sampled_out_calls_skip_logging(log_api, get_args, monkeypatch, _telemetry):
+    argv = Mock()
+    monkeypatch.setattr(telemetry, "get_sanitized_argv", argv)
+
+    @_telemetry.log_call(log_args=True, sample=0.0)
+    def add(x, y):
+        return x + y
+
+    assert add(1, 2) == 3
+
+    log_api.assert_not_called()
+    get_args.assert_not_called()
+    argv.assert_not_called()
+    assert add.__wrapped__._telemetry_success is None
+
+
+def test_sampled_out_errors_are_logged(log_api, get_args, _telemetry):
+    @_telemetry.log_call(log_args=True, sample=0.0)
+    def divide(x, y):
+        return x / y
+
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    log_api.assert_called_once()
+    assert log_api.call_args[1]["action"] == "some-package-divide-error"
+    assert log_api.call_args[1]["metadata"]["args"] == {"x": 1, "y": 0}
+
+
+def test_sampled_out_errors_can_be_dropped(log_api, _telemetry):
+    @_telemetry.log_call(sample=SamplingPolicy(rate=0.0, keep_errors=False))
+    def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        fail()
+
+    log_api.assert_not_called()
+
+
+def test_sampled_out_slow_calls_are_logged(log_api, _telemetry):
+    group = _telemetry.create_group("SomeObject")
+
+    class SomeObject:
+        @group.log_call(sample=SamplingPolicy(rate=0.0, slow_threshold=0))
+        def do_stuff(self):
+            pass
+
+    SomeObject().do_stuff()
+
+    log_api.assert_called_once()
+    assert log_api.call_args[1]["action"] == "some-package-SomeObject-do-stuff-success"
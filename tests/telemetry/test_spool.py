@@ -0,0 +1,190 @@
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import spool as spool_module
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.spool import EventSpool
+
+
+def _read(path):
+    return [json.loads(line)["message"] for line in Path(path).read_text().splitlines()]
+
+
+def test_append_and_replay(tmp_directory):
+    spool = EventSpool("spool.jsonl", batch_size=2)
+
+    for i in range(5):
+        spool.append({"event": i})
+
+    batches = []
+    sent = spool.replay(batches.append)
+
+    assert sent == 5
+    assert batches == [
+        [{"event": 0}, {"event": 1}],
+        [{"event": 2}, {"event": 3}],
+        [{"event": 4}],
+    ]
+    assert not Path("spool.jsonl").exists()
+
+
+def test_keeps_events_that_failed_to_send(tmp_directory):
+    spool = EventSpool("spool.jsonl", batch_size=2)
+
+    for i in range(5):
+        spool.append({"event": i})
+
+    sender = Mock(side_effect=[None, ConnectionError])
+
+    assert spool.replay(sender) == 2
+    assert _read("spool.jsonl") == [{"event": 2}, {"event": 3}, {"event": 4}]
+
+
+def test_evicts_oldest_events_when_exceeding_max_bytes(tmp_directory):
+    spool = EventSpool("spool.jsonl", max_bytes=500)
+
+    for i in range(50):
+        spool.append({"event": i})
+
+    events = _read("spool.jsonl")
+
+    assert Path("spool.jsonl").stat().st_size <= 500
+    assert events[-1] == {"event": 49}
+    assert events == sorted(events, key=lambda e: e["event"])
+
+
+def test_evicts_expired_and_corrupted_events(tmp_directory):
+    Path("spool.jsonl").write_text(
+        json.dumps({"time": 0, "message": "expired"})
+        + "\n{corrupted\n"
+        + json.dumps({"time": 2**40, "message": "fresh"})
+        + "\n"
+    )
+
+    spool = EventSpool("spool.jsonl")
+    spool.compact()
+
+    assert _read("spool.jsonl") == ["fresh"]
+
+
+def _append_many(path, start):
+    spool = EventSpool(path)
+
+    for i in range(start, start + 100):
+        spool.append({"event": i})
+
+
+def test_concurrent_appends(tmp_directory):
+    processes = [
+        multiprocessing.Process(target=_append_many, args=("spool.jsonl", i * 100))
+        for i in range(4)
+    ]
+
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join()
+
+    events = sorted(event["event"] for event in _read("spool.jsonl"))
+
+    assert events == list(range(400))
+
+
+def test_log_api_with_spool(tmp_directory, monkeypatch):
+    mock_info = Mock(return_value=(True, "fake-uuid", False))
+    monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
+    monkeypatch.setattr(telemetry, "DEFAULT_HOME_DIR", str(Path().absolute()))
+    spool = EventSpool()
+    monkeypatch.setattr(spool, "replay_in_background", Mock())
+
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", spool=spool, transport="memory"
+    )
+    _telemetry.log_api("some-action")
+
+    assert not _telemetry._transport.events
+    assert spool.path == Path("stats", "spool.jsonl").absolute()
+    assert [event["event"] for event in _read(spool.path)] == ["some-action"]
+    spool.replay_in_background.assert_called_once_with(_telemetry._send_batch)
+
+
+def test_compacts_to_the_low_water_mark(tmp_directory):
+    spool = EventSpool("spool.jsonl", max_bytes=1000, low_water=0.5)
+    compact = Mock(wraps=spool.compact)
+    spool.compact = compact
+
+    for i in range(100):
+        spool.append({"event": i})
+
+    size = Path("spool.jsonl").stat().st_size
+
+    assert size <= 1000
+    # each compaction frees half the spool, so it runs every few appends
+    assert 0 < compact.call_count < 15
+
+
+def test_invalid_low_water():
+    with pytest.raises(ValueError) as excinfo:
+        EventSpool(low_water=0)
+
+    assert "low_water must be between 0 and 1, got 0" in str(excinfo.value)
+
+
+def test_replays_with_backoff(tmp_directory, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(spool_module.time, "monotonic", lambda: now[0])
+    spool = EventSpool("spool.jsonl", replay_interval=10, max_replay_interval=30)
+    sender = Mock(side_effect=ConnectionError)
+
+    def replay_at(time_):
+        now[0] = time_
+        spool.append({"event": time_})
+        thread = spool.replay_in_background(sender)
+
+        if thread is not None:
+            thread.join()
+
+        return thread is not None
+
+    # failures double the interval until reaching the maximum
+    times = (0, 19, 20, 49, 50, 79, 80)
+    assert [replay_at(t) for t in times] == [True, False, True] + [False, True] * 2
+
+    sender.side_effect = None
+    assert replay_at(110)
+    assert not replay_at(119)
+    assert replay_at(120)
+    assert not Path("spool.jsonl").exists()
+    assert [len(args[0]) for args, _ in sender.call_args_list[-2:]] == [8, 2]
+
+
+def _replay_file(pid, events):
+    path = Path(f"spool.jsonl.replay-{pid}")
+    path.write_text(
+        "".join(json.dumps({"time": time.time(), "message": e}) + "\n" for e in events)
+    )
+    return path
+
+
+def test_replays_events_left_by_dead_processes(tmp_directory, monkeypatch):
+    monkeypatch.setattr(spool_module, "_pid_alive", lambda pid: pid != 1)
+    dead = _replay_file(1, ["dead-1", "dead-2"])
+    alive = _replay_file(2, ["alive"])
+    old = _replay_file(3, ["old"])
+    os.utime(old, (0, 0))
+
+    spool = EventSpool("spool.jsonl")
+    spool.append("new")
+    batches = []
+
+    assert spool.replay(batches.append) == 4
+    assert sorted(batches[0]) == ["dead-1", "dead-2", "new", "old"]
+    assert not dead.exists() and not old.exists()
+    assert alive.exists()
@@ -1,3 +1,6 @@
+from unittest.mock import Mock
+
+from ploomber_core.telemetry import system_info
 from ploomber_core.telemetry.system_info import get_system_info
 
 
@@ -13,3 +16,25 @@ def test_get_system_info():
         "os",
         "python_version",
     }
+
+
+def test_get_ploomber_packages(monkeypatch):
+    def distribution(name, requires):
+        return Mock(metadata={"Name": name}, requires=requires)
+
+    distributions = [
+        distribution("jupysql", ["ploomber-core>=0.2.7", "sqlalchemy"]),
+        distribution("Sklearn_Evaluation", ["ploomber_core"]),
+        distribution("optional", ['ploomber-core ; extra == "telemetry"']),
+        distribution("unrelated", ["requests"]),
+        distribution("no-requirements", None),
+    ]
+    monkeypatch.setattr(
+        system_info.importlib_metadata, "distributions", lambda: distributions
+    )
+
+    assert system_info.get_ploomber_packages() == [
+        "jupysql",
+        "ploomber-core",
+        "sklearn-evaluation",
+    ]
@@ -7,6 +7,7 @@ import logging
 import os
 import stat
 import shutil
+import subprocess
 
 import pytest
 import yaml
@@ -14,6 +15,7 @@ import posthog
 
 from ploomber_core.telemetry import telemetry
 from ploomber_core.telemetry import system_info
+from ploomber_core.telemetry import version_cache
 from ploomber_core.telemetry.validate_inputs import str_param, opt_str_param
 
 
@@ -233,6 +235,89 @@ def test_env_var_takes_precedence(
     assert telemetry.check_telemetry_enabled() is expected_second
 
 
+def test_check_telemetry_enabled_only_loads_settings_if_file_changes(
+    monkeypatch, ignore_env_var_and_set_tmp_default_home_dir
+):
+    snapshot = Mock(wraps=telemetry.UserSettings.snapshot)
+    monkeypatch.setattr(telemetry.UserSettings, "snapshot", snapshot)
+
+    assert telemetry.check_telemetry_enabled() is True
+    assert telemetry.check_telemetry_enabled() is True
+    assert snapshot.call_count == 1
+
+    # a different size, so the change is detected even if mtime is the same
+    Path("stats", "config.yaml").write_text("stats_enabled: false\n")
+
+    assert telemetry.check_telemetry_enabled() is False
+    assert telemetry.check_telemetry_enabled() is False
+    assert snapshot.call_count == 2
+
+
+@pytest.mark.parametrize("payload", [False, True])
+def test_log_call_skips_telemetry_if_disabled(monkeypatch, payload):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+    log_api = Mock()
+    get_sanitized_argv = Mock()
+    monkeypatch.setattr(telemetry.Telemetry, "log_api", log_api)
+    monkeypatch.setattr(telemetry, "get_sanitized_argv", get_sanitized_argv)
+
+    _telemetry = telemetry.Telemetry(MOCK_API_KEY, "some-package", "0.14.0")
+
+    if payload:
+
+        @_telemetry.log_call(payload=True, log_args=True)
+        def add(payload, x, y):
+            payload["sum"] = x + y
+            return x + y
+
+    else:
+
+        @_telemetry.log_call(log_args=True)
+        def add(x, y):
+            return x + y
+
+    assert add(1, 2) == 3
+    log_api.assert_not_called()
+    get_sanitized_argv.assert_not_called()
+    assert add.__wrapped__._telemetry_success is None
+
+    # changes to the environment take effect immediately
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "true")
+
+    assert add(1, 2) == 3
+    log_api.assert_called_once()
+    assert add.__wrapped__._telemetry_success["action"] == "some-package-add-success"
+
+    # attributes from the last call are cleared even if telemetry is disabled
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+
+    assert add(1, 2) == 3
+    assert add.__wrapped__._telemetry_success is None
+
+
+def test_log_call_skips_telemetry_if_disabled_in_config_file(
+    monkeypatch, ignore_env_var_and_set_tmp_default_home_dir
+):
+    log_api = Mock()
+    monkeypatch.setattr(telemetry.Telemetry, "log_api", log_api)
+    Path("stats").mkdir()
+    Path("stats", "config.yaml").write_text("stats_enabled: false\n")
+
+    _telemetry = telemetry.Telemetry(MOCK_API_KEY, "some-package", "0.14.0")
+
+    @_telemetry.log_call()
+    def add(x, y):
+        return x + y
+
+    assert add(1, 2) == 3
+    log_api.assert_not_called()
+
+    Path("stats", "config.yaml").write_text("stats_enabled: true\n")
+
+    assert add(1, 2) == 3
+    log_api.assert_called_once()
+
+
 def test_first_usage(monkeypatch, tmp_directory):
     monkeypatch.setattr(telemetry, "DEFAULT_HOME_DIR", str(Path().absolute()))
 
@@ -360,7 +445,10 @@ def test_conf_file_after_version_check(tmp_directory, monkeypatch):
     uid_content += "uid: some_user_id\n"
     version_path.write_text(uid_content)
 
-    # Test that conf file has all required fields
+    # Test that conf file has all required fields (the first call looks up
+    # the latest version in the background, the second one notifies)
+    telemetry.check_version("ploomber", "0.14.0")
+    wait_for_version_check()
     telemetry.check_version("ploomber", "0.14.0")
     with version_path.open("r") as file:
         conf = yaml.safe_load(file)
@@ -382,6 +470,18 @@ def test_get_version_timeout():
     assert total_runtime < datetime.timedelta(milliseconds=1500)
 
 
+def mock_latest_versions(monkeypatch, latest):
+    def get_latest_versions(package_names):
+        return {name: latest for name in package_names}
+
+    monkeypatch.setattr(telemetry, "get_latest_versions", get_latest_versions)
+
+
+def wait_for_version_check():
+    for thread in list(version_cache._REFRESHING.values()):
+        thread.join()
+
+
 def write_to_conf_file(tmp_directory, monkeypatch, last_check, last_cloud_check=None):
     stats = Path("stats")
     stats.mkdir()
@@ -400,9 +500,7 @@ def write_to_conf_file(tmp_directory, monkeypatch, last_check, last_cloud_check=
 
 def test_version_skips_when_updated(tmp_directory, capsys, monkeypatch):
     # Path conf file
-    mock_version = Mock()
-    mock_version.return_value = "0.14.8"
-    monkeypatch.setattr(telemetry, "get_latest_version", mock_version)
+    mock_latest_versions(monkeypatch, "0.14.8")
 
     write_to_conf_file(
         tmp_directory=tmp_directory,
@@ -418,17 +516,17 @@ def test_version_skips_when_updated(tmp_directory, capsys, monkeypatch):
 
 
 def test_user_output_on_different_versions(tmp_directory, capsys, monkeypatch):
-    mock_version = Mock()
-    monkeypatch.setattr(telemetry, "get_latest_version", mock_version)
+    mock_latest_versions(monkeypatch, "0.14.0")
     write_to_conf_file(
         tmp_directory=tmp_directory,
         monkeypatch=monkeypatch,
         last_check="2022-01-20 10:51:41.082376",
     )
-    mock_version.return_value = "0.14.0"
 
     # Check now that the date is different there is an upgrade warning
     telemetry.check_version("ploomber", "0.14.1")
+    wait_for_version_check()
+    telemetry.check_version("ploomber", "0.14.1")
     captured = capsys.readouterr()
     assert "ploomber version" in captured.out
 
@@ -448,8 +546,7 @@ def test_no_output_latest_version(tmp_directory, capsys, monkeypatch):
 
 def test_output_on_date_diff(tmp_directory, capsys, monkeypatch):
     # Warning should be caught since the date and version are off
-    mock_version = Mock()
-    monkeypatch.setattr(telemetry, "get_latest_version", mock_version)
+    mock_latest_versions(monkeypatch, "0.15.0")
     write_to_conf_file(
         tmp_directory=tmp_directory,
         monkeypatch=monkeypatch,
@@ -458,6 +555,8 @@ def test_output_on_date_diff(tmp_directory, capsys, monkeypatch):
 
     version_path = Path("stats") / "uid.yaml"
     telemetry.check_version("ploomber", "0.14.0")
+    wait_for_version_check()
+    telemetry.check_version("ploomber", "0.14.0")
     captured = capsys.readouterr()
     assert "ploomber version" in captured.out
 
@@ -483,10 +582,9 @@ def test_no_output_dev_version(capsys):
 @pytest.fixture
 def mock_telemetry(monkeypatch):
     mock = Mock()
-    mock_dt = Mock()
-    mock_dt.now.side_effect = [1, 2]
+    mock_perf_counter_ns = Mock(side_effect=[1_000, 2_000])
     monkeypatch.setattr(telemetry.Telemetry, "log_api", mock)
-    monkeypatch.setattr(telemetry.datetime, "datetime", mock_dt)
+    monkeypatch.setattr(telemetry.time, "perf_counter_ns", mock_perf_counter_ns)
     monkeypatch.setattr(telemetry.sys, "argv", ["/path/to/bin", "arg"])
     yield mock
 
@@ -504,8 +602,8 @@ def test_log_call_success(mock_telemetry):
         [
             call(
                 action="some-package-some-action-success",
-                total_runtime="1",
-                metadata=dict(argv=["bin", "arg"]),
+                total_runtime="0:00:00.000001",
+                metadata=dict(argv=["bin", "arg"], total_runtime_ns=1000),
             ),
         ]
     )
@@ -525,11 +623,12 @@ def test_log_call_exception(mock_telemetry):
         [
             call(
                 action="some-package-some-action-error",
-                total_runtime="1",
+                total_runtime="0:00:00.000001",
                 metadata={
                     "type": None,
                     "exception": "some error",
                     "argv": ["bin", "arg"],
+                    "total_runtime_ns": 1000,
                 },
             ),
         ]
@@ -550,11 +649,12 @@ def test_log_call_logs_type(mock_telemetry):
         [
             call(
                 action="some-package-some-action-error",
-                total_runtime="1",
+                total_runtime="0:00:00.000001",
                 metadata={
                     "type": "some-type",
                     "exception": "some error",
                     "argv": ["bin", "arg"],
+                    "total_runtime_ns": 1000,
                 },
             ),
         ]
@@ -576,12 +676,13 @@ def test_log_call_add_payload_error(mock_telemetry):
         [
             call(
                 action="some-package-some-action-error",
-                total_runtime="1",
+                total_runtime="0:00:00.000001",
                 metadata={
                     "type": "some-type",
                     "exception": "some error",
                     "argv": ["bin", "arg"],
                     "dag": "value",
+                    "total_runtime_ns": 1000,
                 },
             ),
         ]
@@ -601,10 +702,11 @@ def test_log_call_add_payload_success(mock_telemetry):
         [
             call(
                 action="some-package-some-action-success",
-                total_runtime="1",
+                total_runtime="0:00:00.000001",
                 metadata={
                     "argv": ["bin", "arg"],
                     "dag": "value",
+                    "total_runtime_ns": 1000,
                 },
             ),
         ]
@@ -626,8 +728,8 @@ def test_log_call_method_with_payload_success(mock_telemetry):
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
-                metadata={"argv": ["bin", "arg"], "sum": 3},
+                total_runtime="0:00:00.000001",
+                metadata={"argv": ["bin", "arg"], "sum": 3, "total_runtime_ns": 1000},
             ),
         ]
     )
@@ -651,8 +753,12 @@ def test_log_call_no_args_method_with_payload_success(mock_telemetry):
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
-                metadata={"argv": ["bin", "arg"], "log": "some result"},
+                total_runtime="0:00:00.000001",
+                metadata={
+                    "argv": ["bin", "arg"],
+                    "log": "some result",
+                    "total_runtime_ns": 1000,
+                },
             ),
         ]
     )
@@ -676,10 +782,11 @@ def test_log_call_keyword_args_method_with_payload_success(mock_telemetry):
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
+                total_runtime="0:00:00.000001",
                 metadata={
                     "argv": ["bin", "arg"],
                     "log": "Give me 5 apples and 10 bananas please",
+                    "total_runtime_ns": 1000,
                 },
             ),
         ]
@@ -706,8 +813,12 @@ def test_log_call_keyword_only_args_method_with_payload_success(mock_telemetry):
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
-                metadata={"argv": ["bin", "arg"], "log": ["jhonny", "mr_smith"]},
+                total_runtime="0:00:00.000001",
+                metadata={
+                    "argv": ["bin", "arg"],
+                    "log": ["jhonny", "mr_smith"],
+                    "total_runtime_ns": 1000,
+                },
             ),
         ]
     )
@@ -734,8 +845,12 @@ def test_log_call_keyword_only_positional_args_method_with_payload_success(
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
-                metadata={"argv": ["bin", "arg"], "log": "helloworld!"},
+                total_runtime="0:00:00.000001",
+                metadata={
+                    "argv": ["bin", "arg"],
+                    "log": "helloworld!",
+                    "total_runtime_ns": 1000,
+                },
             ),
         ]
     )
@@ -762,8 +877,12 @@ def test_log_call_double_asterisk_args_method_with_payload_success(mock_telemetr
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
-                metadata={"argv": ["bin", "arg"], "log": "name: Eric\nage: 19\n"},
+                total_runtime="0:00:00.000001",
+                metadata={
+                    "argv": ["bin", "arg"],
+                    "log": "name: Eric\nage: 19\n",
+                    "total_runtime_ns": 1000,
+                },
             ),
         ]
     )
@@ -788,10 +907,11 @@ def test_log_call_single_asterisk_args_method_with_payload_success(mock_telemetr
         [
             call(
                 action="some-package-TestClass-some-action-success",
-                total_runtime="1",
+                total_runtime="0:00:00.000001",
                 metadata={
                     "argv": ["bin", "arg"],
                     "log": "I am going to do: studying, cleaning, resting",
+                    "total_runtime_ns": 1000,
                 },
             ),
         ]
@@ -847,7 +967,7 @@ def test_log_api_stored_values(monkeypatch):
     mock_posthog_instance.capture = mock_capture
     mock_posthog_class = Mock(return_value=mock_posthog_instance)
 
-    monkeypatch.setattr(telemetry.posthog, "Posthog", mock_posthog_class)
+    monkeypatch.setattr(posthog, "Posthog", mock_posthog_class)
     monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
 
     _telemetry = telemetry.Telemetry(MOCK_API_KEY, "some-package", "1.2.2")
@@ -889,7 +1009,7 @@ def test_log_call_stored_values(monkeypatch):
     mock_posthog_instance.capture = mock_capture
     mock_posthog_class = Mock(return_value=mock_posthog_instance)
 
-    monkeypatch.setattr(telemetry.posthog, "Posthog", mock_posthog_class)
+    monkeypatch.setattr(posthog, "Posthog", mock_posthog_class)
     monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
     monkeypatch.setattr(telemetry.sys, "argv", ["/path/to/bin", "arg2", "arg2"])
 
@@ -915,7 +1035,10 @@ def test_log_call_stored_values(monkeypatch):
                 "user_id": "fake-uuid",
                 "action": "some-package-some-action-success",
                 "client_time": ANY,
-                "metadata": {"argv": ["bin", "arg2", "arg2"]},
+                "metadata": {
+                    "argv": ["bin", "arg2", "arg2"],
+                    "total_runtime_ns": ANY,
+                },
                 "total_runtime": ANY,
                 "python_version": py_version,
                 "version": "1.2.2",
@@ -973,7 +1096,7 @@ def test_exposes_telemetry_data_for_testing():
     assert my_function.__wrapped__._telemetry_success == {
         "action": "some-package-my-function-success",
         "total_runtime": ANY,
-        "metadata": {"argv": ANY},
+        "metadata": {"argv": ANY, "total_runtime_ns": ANY},
     }
 
     assert my_function.__wrapped__._telemetry_error is None
@@ -1011,6 +1134,7 @@ def test_exposes_telemetry_data_for_testing_error():
             "type": None,
             "exception": "some error",
             "argv": ANY,
+            "total_runtime_ns": ANY,
         },
     }
 
@@ -1040,6 +1164,7 @@ def test_exposes_telemetry_data_for_testing_params():
         "total_runtime": ANY,
         "metadata": {
             "argv": ANY,
+            "total_runtime_ns": ANY,
             "args": {"x": 1, "y": 2},
         },
     }
@@ -1135,3 +1260,29 @@ def test_disable_check_cloud(monkeypatch):
     my_telemetry.log_api("some-action")
 
     mock.assert_not_called()
+
+
+def test_import_has_no_side_effects(tmp_directory):
+    home = Path(tmp_directory, "home")
+    code = """
+import sys
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.telemetry import Telemetry
+
+Telemetry.from_package("ploomber-core")
+
+assert "posthog" not in sys.modules
+assert "SYSTEM_INFO" not in vars(telemetry)
+assert "internal" not in vars(telemetry)
+"""
+    env = {**os.environ, "PLOOMBER_HOME_DIR": str(home)}
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+    assert not home.exists()
+
+
+def test_system_info_and_internal_are_loaded_on_first_use(monkeypatch):
+    monkeypatch.delattr(telemetry, "SYSTEM_INFO", raising=False)
+
+    assert telemetry.SYSTEM_INFO == telemetry._get_system_info()
+    assert telemetry._get_internal() is telemetry.internal
@@ -1,5 +1,7 @@
+from inspect import signature
 from unittest.mock import Mock, ANY
 
+import posthog
 import pytest
 from ploomber_core.telemetry import telemetry as telemetry_module
 
@@ -12,7 +14,7 @@ def mock_posthog(monkeypatch):
     mock_posthog_instance.capture = mock_capture
     mock_posthog_class = Mock(return_value=mock_posthog_instance)
 
-    monkeypatch.setattr(telemetry_module.posthog, "Posthog", mock_posthog_class)
+    monkeypatch.setattr(posthog, "Posthog", mock_posthog_class)
     monkeypatch.setattr(telemetry_module, "_get_telemetry_info", mock_info)
     yield mock_capture
 
@@ -53,6 +55,7 @@ def test_logs_args(mock_posthog, y, y_logged):
             "metadata": {
                 "args": {"x": 1, "y": y_logged},
                 "argv": ANY,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -106,6 +109,7 @@ def test_logs_args_with_group(mock_posthog, y, y_logged):
             "metadata": {
                 "args": {"x": 1, "y": y_logged},
                 "argv": ANY,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -145,6 +149,7 @@ def test_doesnt_log_args_with_disallowed_types(mock_posthog):
             "metadata": {
                 "args": {"y": 1},
                 "argv": ANY,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -184,6 +189,7 @@ def test_doesnt_log_ignored_args(mock_posthog):
             "metadata": {
                 "args": {"x": 1},
                 "argv": ANY,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -226,6 +232,7 @@ def test_logs_if_error(mock_posthog):
                 "argv": ANY,
                 "exception": "some error happened",
                 "type": None,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -286,6 +293,7 @@ def test_telemetry_group(mock_posthog, y, y_logged):
             "metadata": {
                 "args": {"x": 1, "y": y_logged},
                 "argv": ANY,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -311,6 +319,7 @@ def test_telemetry_group(mock_posthog, y, y_logged):
             "metadata": {
                 "args": {"x": 1, "y": y_logged},
                 "argv": ANY,
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -353,6 +362,7 @@ def test_method_with_no_arguments(mock_posthog):
             "metadata": {
                 "argv": ANY,
                 "args": {},
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -392,6 +402,7 @@ def test_function_with_no_arguments(mock_posthog):
             "metadata": {
                 "argv": ANY,
                 "args": {},
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -430,7 +441,8 @@ def test_function_with_args(mock_posthog):
             "client_time": ANY,
             "metadata": {
                 "argv": ANY,
-                "args": {"a": 1, "args": 2},
+                "args": {"a": 1, "args": [2, 3]},
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -470,6 +482,7 @@ def test_function_with_kwargs(mock_posthog):
             "metadata": {
                 "argv": ANY,
                 "args": {"a": 1, "b": 2, "c": 3},
+                "total_runtime_ns": ANY,
             },
             "total_runtime": ANY,
             "python_version": ANY,
@@ -485,3 +498,66 @@ def test_function_with_kwargs(mock_posthog):
     )
 
     assert mock_posthog.call_args_list[0][1] == expected
+
+
+def test_logs_positional_args_in_methods(mock_posthog):
+    telemetry = telemetry_module.Telemetry(
+        api_key="KEY", package_name="somepackage", version="0.1"
+    )
+
+    class SomeObject:
+        @telemetry.log_call(log_args=True, payload=True, group="SomeObject")
+        def add(self, payload, x, y=2):
+            pass
+
+    SomeObject().add(1)
+
+    metadata = mock_posthog.call_args_list[0][1]["properties"]["metadata"]
+    assert metadata["args"] == {"x": 1, "y": 2}
+
+
+def add_many(payload, a, b=2, *numbers, c, d=4, **options):
+    pass
+
+
+@pytest.mark.parametrize(
+    "args, kwargs, payload, expected",
+    [
+        [(1,), dict(c=3), False, {"payload": 1, "b": 2, "c": 3, "d": 4}],
+        [
+            (0, 1, 20, 30, 40),
+            dict(c=3, e=5),
+            False,
+            {
+                "payload": 0,
+                "a": 1,
+                "b": 20,
+                "numbers": (30, 40),
+                "c": 3,
+                "d": 4,
+                "e": 5,
+            },
+        ],
+        [
+            (1, 20, 30),
+            dict(c=3, d=40),
+            True,
+            {"a": 1, "b": 20, "numbers": (30,), "c": 3, "d": 40},
+        ],
+        [(), dict(a=1, c=3), True, {"a": 1, "b": 2, "c": 3, "d": 4}],
+    ],
+)
+def test_argument_binder(args, kwargs, payload, expected):
+    binder = telemetry_module._ArgumentBinder(
+        signature(add_many), ignore_args=set(), payload=payload
+    )
+
+    assert binder.bind(args, kwargs) == expected
+
+
+def test_argument_binder_ignore_args():
+    binder = telemetry_module._ArgumentBinder(
+        signature(add_many), ignore_args={"b", "numbers", "d"}, payload=True
+    )
+
+    assert binder.bind((1, 20, 30), dict(c=3)) == {"a": 1, "c": 3}
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import random
+from unittest.mock import ANY
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry.tracing import Tracer, current_span
+
+
+@pytest.fixture
+def telemetry_kwargs():
+    return {"tracing": True}
+
+
+def metadata_by_action(log_api):
+    return {
+        call.kwargs["action"]: call.kwargs["metadata"]
+        for call in log_api.call_args_list
+    }
+
+
+def test_tracer_nests_spans():
+    tracer = Tracer()
+
+    parent = tracer.start("parent")
+    child = tracer.start("child")
+    assert current_span() is child
+
+    tracer.finish(child)
+    assert current_span() is parent
+
+    sibling = tracer.start("sibling")
+    tracer.finish(sibling)
+    tracer.finish(parent, error=True)
+
+    assert current_span() is None
+    assert parent.parent_span_id is None
+    assert child.parent_span_id == parent.span_id
+    assert sibling.parent_span_id == parent.span_id
+    assert child.trace_id == sibling.trace_id == parent.trace_id
+    assert len({parent.span_id, child.span_id, sibling.span_id}) == 3
+    assert [span.name for span in tracer.spans()] == ["child", "sibling", "parent"]
+    assert parent.error is True
+
+
+def test_tracer_new_trace_for_each_root_span():
+    tracer = Tracer()
+
+    first = tracer.start("first")
+    tracer.finish(first)
+    second = tracer.start("second")
+    tracer.finish(second)
+
+    assert first.trace_id != second.trace_id
+    assert len(first.trace_id) == 32
+    assert len(first.span_id) == 16
+
+
+def test_tracer_span_without_activating():
+    tracer = Tracer()
+
+    parent = tracer.start("parent")
+    child = tracer.start("child", activate=False)
+
+    assert child.parent_span_id == parent.span_id
+    assert current_span() is parent
+
+    tracer.finish(child)
+    tracer.finish(parent)
+
+
+def test_tracer_keeps_the_latest_spans():
+    tracer = Tracer(max_spans=2)
+
+    for name in ["a", "b", "c"]:
+        tracer.finish(tracer.start(name))
+
+    assert [span.name for span in tracer.spans()] == ["b", "c"]
+
+    tracer.clear()
+
+    assert tracer.spans() == []
+
+
+def test_ids_do_not_depend_on_the_seed_of_the_global_generator():
+    tracer = Tracer()
+
+    def new_span():
+        random.seed(0)
+        span = tracer.start("load")
+        tracer.finish(span)
+        return span.trace_id, span.span_id
+
+    assert new_span() != new_span()
+    random.seed()
+
+
+def test_write_chrome_trace(tmp_path):
+    tracer = Tracer()
+    parent = tracer.start("parent", start_ns=1_000_000)
+    child = tracer.start("child", start_ns=1_500_000)
+    tracer.finish(child, end_ns=2_000_000, error=True)
+    tracer.finish(parent, end_ns=3_000_000)
+
+    path = tracer.write_chrome_trace(tmp_path / "trace.json")
+    trace = json.loads(path.read_text())
+    child_event, parent_event = trace["traceEvents"]
+
+    assert trace["displayTimeUnit"] == "ms"
+    assert child_event == {
+        "name": "child",
+        "cat": "ploomber",
+        "ph": "X",
+        "ts": 1500.0,
+        "dur": 500.0,
+        "pid": child.pid,
+        "tid": child.thread_id,
+        "args": {
+            "trace_id": parent.trace_id,
+            "span_id": child.span_id,
+            "parent_span_id": parent.span_id,
+            "error": True,
+        },
+    }
+    assert parent_event["ts"] == 1000.0
+    assert parent_event["dur"] == 2000.0
+    assert [p.name for p in tmp_path.iterdir()] == ["trace.json"]
+
+
+@pytest.mark.parametrize(
+    "value, expected_type",
+    [
+        [False, type(None)],
+        [True, Tracer],
+    ],
+)
+def test_tracing_argument(value, expected_type):
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="null", tracing=value
+    )
+    assert isinstance(_telemetry.tracer, expected_type)
+
+
+def test_log_call_records_nested_spans(_telemetry, log_api):
+    @_telemetry.log_call()
+    def load():
+        pass
+
+    @_telemetry.log_call()
+    def clean():
+        raise ValueError
+
+    @_telemetry.log_call()
+    def build():
+        load()
+
+        with pytest.raises(ValueError):
+            clean()
+
+    build()
+
+    load_span, clean_span, build_span = _telemetry.tracer.spans()
+    metadata = metadata_by_action(log_api)
+
+    assert build_span.parent_span_id is None
+    assert load_span.parent_span_id == build_span.span_id
+    assert clean_span.parent_span_id == build_span.span_id
+    assert clean_span.error is True
+    assert metadata["some-package-load-success"] == {
+        "argv": ANY,
+        "total_runtime_ns": ANY,
+        **load_span.to_metadata(),
+    }
+    assert metadata["some-package-clean-error"]["span_id"] == clean_span.span_id
+    assert metadata["some-package-build-success"]["parent_span_id"] is None
+    assert current_span() is None
+
+
+def test_event_metadata_without_tracing(log_api):
+    _telemetry = telemetry.Telemetry("KEY", "some-package", "0.1", transport="null")
+
+    @_telemetry.log_call()
+    def build():
+        pass
+
+    build()
+
+    assert "span_id" not in log_api.call_args.kwargs["metadata"]
+
+
+def test_records_spans_if_telemetry_is_disabled(_telemetry, log_api, monkeypatch):
+    monkeypatch.setenv("PLOOMBER_STATS_ENABLED", "false")
+
+    @_telemetry.log_call()
+    def load():
+        pass
+
+    @_telemetry.log_call()
+    def build():
+        load()
+
+    build()
+
+    load_span, build_span = _telemetry.tracer.spans()
+
+    assert load_span.parent_span_id == build_span.span_id
+    log_api.assert_not_called()
+
+
+@pytest.mark.parametrize("exception", [KeyboardInterrupt, SystemExit])
+def test_finishes_spans_of_interrupted_calls(_telemetry, log_api, exception):
+    @_telemetry.log_call()
+    def load():
+        raise exception
+
+    with pytest.raises(exception):
+        load()
+
+    (span,) = _telemetry.tracer.spans()
+
+    assert span.error is True
+    assert current_span() is None
+    log_api.assert_not_called()
+
+
+def test_finishes_spans_of_cancelled_coroutines(_telemetry, log_api):
+    @_telemetry.log_call()
+    async def load():
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(load())
+        await asyncio.sleep(0)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    (span,) = _telemetry.tracer.spans()
+
+    assert span.error is True
+    log_api.assert_not_called()
+
+
+def test_records_spans_of_coroutines(_telemetry, log_api):
+    @_telemetry.log_call()
+    async def load(i):
+        await asyncio.sleep(0)
+
+    @_telemetry.log_call()
+    async def build():
+        # each task gets a copy of the context, with build as current span
+        await asyncio.gather(load(1), load(2))
+
+    asyncio.run(build())
+
+    *load_spans, build_span = _telemetry.tracer.spans()
+
+    assert [span.name for span in load_spans] == ["some-package-load"] * 2
+    assert all(span.parent_span_id == build_span.span_id for span in load_spans)
+
+
+def test_generators_are_not_the_parent_of_calls_made_by_the_consumer(
+    _telemetry, log_api
+):
+    @_telemetry.log_call()
+    def numbers():
+        yield 1
+        yield 2
+
+    @_telemetry.log_call()
+    def process(number):
+        pass
+
+    @_telemetry.log_call()
+    def build():
+        for number in numbers():
+            process(number)
+
+    build()
+
+    spans = {span.name: span for span in _telemetry.tracer.spans()}
+    build_id = spans["some-package-build"].span_id
+
+    assert spans["some-package-numbers"].parent_span_id == build_id
+    assert spans["some-package-process"].parent_span_id == build_id
+
+
+def test_resets_spans_in_forked_process():
+    tracer = Tracer()
+    tracer.finish(tracer.start("span"))
+
+    tracer._after_fork_in_child()
+
+    assert tracer.spans() == []
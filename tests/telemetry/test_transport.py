@@ -0,0 +1,129 @@
+import json
+from pathlib import Path
+import sys
+from unittest.mock import Mock
+import warnings
+
+import pytest
+
+from ploomber_core.telemetry import telemetry
+from ploomber_core.telemetry import transport as transport_module
+from ploomber_core.telemetry.transport import (
+    InMemoryTransport,
+    JSONLinesTransport,
+    NullTransport,
+    PosthogTransport,
+    make_transport,
+)
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    mock_info = Mock(return_value=(True, "fake-uuid", False))
+    monkeypatch.setattr(telemetry, "_get_telemetry_info", mock_info)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ["posthog", PosthogTransport],
+        ["jsonl", JSONLinesTransport],
+        ["memory", InMemoryTransport],
+        ["null", NullTransport],
+        ["NULL", NullTransport],
+    ],
+)
+def test_make_transport(value, expected):
+    assert isinstance(make_transport(value, "KEY", "events.jsonl"), expected)
+
+
+def test_make_transport_from_env_var(monkeypatch):
+    monkeypatch.setenv("PLOOMBER_TELEMETRY_TRANSPORT", "jsonl:some/events.jsonl")
+
+    transport = make_transport(None, "KEY", "events.jsonl")
+
+    assert isinstance(transport, JSONLinesTransport)
+    assert transport.path == Path("some", "events.jsonl")
+
+
+def test_make_transport_invalid_value():
+    with pytest.raises(ValueError) as excinfo:
+        make_transport("something", "KEY", "events.jsonl")
+
+    assert "Invalid telemetry transport: 'something'" in str(excinfo.value)
+
+
+def test_make_transport_invalid_env_var(monkeypatch):
+    monkeypatch.setenv("PLOOMBER_TELEMETRY_TRANSPORT", "something")
+
+    with pytest.warns(UserWarning) as record:
+        transport = make_transport(None, "KEY", "events.jsonl")
+
+    assert isinstance(transport, PosthogTransport)
+    assert "Invalid telemetry transport: 'something'" in str(record[0].message)
+    assert "PLOOMBER_TELEMETRY_TRANSPORT" in str(record[0].message)
+
+
+def test_posthog_transport_warns_if_posthog_is_incompatible(monkeypatch):
+    fake_posthog = Mock()
+    fake_posthog.Posthog.side_effect = TypeError
+    monkeypatch.setitem(sys.modules, "posthog", fake_posthog)
+    transport = PosthogTransport("KEY")
+
+    with pytest.warns(UserWarning, match="Failed to initialize posthog client"):
+        transport.capture(distinct_id="uid", event="some-event", properties={})
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        transport.capture(distinct_id="uid", event="some-event", properties={})
+        transport.flush()
+
+    fake_posthog.Posthog.assert_called_once()
+
+
+def test_posthog_transport_send_batch_raises_on_error(monkeypatch):
+    monkeypatch.setattr(transport_module, "post_batch", Mock(return_value=500))
+
+    with pytest.raises(RuntimeError) as excinfo:
+        PosthogTransport("KEY").send_batch([])
+
+    assert "status: 500" in str(excinfo.value)
+
+
+def test_in_memory_transport_is_bounded():
+    transport = InMemoryTransport(maxlen=2)
+
+    for i in range(3):
+        transport.capture("uid", f"event-{i}", {})
+
+    assert [e["event"] for e in transport.events] == ["event-1", "event-2"]
+
+
+def test_log_api_with_jsonl_transport(tmp_directory, enabled):
+    _telemetry = telemetry.Telemetry(
+        "KEY", "some-package", "0.1", transport="jsonl:events.jsonl"
+    )
+
+    _telemetry.log_api("first")
+    _telemetry.log_api("second")
+
+    lines = Path("events.jsonl").read_text().splitlines()
+    events = [json.loads(line) for line in lines]
+
+    assert [e["event"] for e in events] == ["first", "second"]
+    assert events[0]["distinct_id"] == "fake-uuid"
+    assert events[0]["properties"]["package_name"] == "some-package"
+
+
+def test_log_call_with_memory_transport(enabled, monkeypatch):
+    monkeypatch.setenv("PLOOMBER_TELEMETRY_TRANSPORT", "memory")
+    _telemetry = telemetry.Telemetry("KEY", "some-package", "0.1")
+
+    @_telemetry.log_call()
+    def add(x, y):
+        return x + y
+
+    add(1, 2)
+
+    (event,) = _telemetry._transport.events
+    assert event["event"] == "some-package-add-success"
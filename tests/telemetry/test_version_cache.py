@@ -0,0 +1,253 @@
+import json
+import multiprocessing
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+from ploomber_core.telemetry import spool, telemetry
+from ploomber_core.telemetry import version_cache
+from ploomber_core.telemetry.version_cache import VersionCache
+
+
+@pytest.fixture
+def home(tmp_directory, monkeypatch):
+    monkeypatch.setattr(telemetry, "DEFAULT_HOME_DIR", str(Path().absolute()))
+    monkeypatch.setattr(telemetry, "internal", telemetry.Internal())
+    monkeypatch.setattr(version_cache, "_REFRESHING", {})
+    return Path("stats", "latest-versions.json")
+
+
+def _wait():
+    for thread in list(version_cache._REFRESHING.values()):
+        thread.join()
+
+
+def _fetch(package_names):
+    return {name: "1.0" for name in package_names}
+
+
+def test_refresh_stores_latest_versions(tmp_directory):
+    cache = VersionCache("cache.json")
+    cache.refresh(["some-package", "another-package"], _fetch)
+
+    entry = cache.get("some-package")
+
+    assert entry["latest"] == "1.0"
+    assert cache.get("another-package")["latest"] == "1.0"
+    assert cache.is_fresh(entry)
+
+
+def test_refresh_only_looks_up_stale_entries(tmp_directory):
+    Path("cache.json").write_text(
+        json.dumps(
+            {
+                "stale": {"latest": "0.9", "checked_at": 0},
+                "fresh": {"latest": "0.9", "checked_at": time.time()},
+            }
+        )
+    )
+    cache = VersionCache("cache.json")
+    fetch = Mock(side_effect=_fetch)
+
+    cache.refresh(["stale", "fresh", "missing"], fetch)
+
+    fetch.assert_called_once_with(["stale", "missing"])
+    assert cache.get("stale")["latest"] == "1.0"
+    assert cache.get("fresh")["latest"] == "0.9"
+
+
+def test_refresh_skips_fresh_entries(tmp_directory):
+    cache = VersionCache("cache.json")
+    fetch = Mock(side_effect=_fetch)
+
+    cache.refresh(["some-package"], fetch)
+    cache.refresh(["some-package"], fetch)
+
+    fetch.assert_called_once()
+
+
+def test_refresh_stores_failed_lookups(tmp_directory):
+    cache = VersionCache("cache.json")
+    fetch = Mock(return_value={})
+
+    cache.refresh(["some-package"], fetch)
+    cache.refresh(["some-package"], fetch)
+
+    assert cache.get("some-package")["latest"] is None
+    fetch.assert_called_once()
+
+
+@pytest.mark.skipif(spool.fcntl is None, reason="requires fcntl")
+def test_refresh_does_not_hold_the_lock_during_the_lookup(tmp_directory):
+    def fetch(package_names):
+        with open("cache.json.lock") as f:
+            # raises if another file descriptor holds the lock
+            spool.fcntl.flock(f, spool.fcntl.LOCK_EX | spool.fcntl.LOCK_NB)
+
+        return _fetch(package_names)
+
+    cache = VersionCache("cache.json")
+    cache.refresh(["some-package"], fetch)
+
+    assert cache.get("some-package")["latest"] == "1.0"
+
+
+@pytest.mark.parametrize(
+    "looking_up_at, looked_up",
+    [[time.time(), False], [time.time() - 120, True]],
+    ids=["in-progress", "expired"],
+)
+def test_refresh_skips_entries_other_processes_are_looking_up(
+    tmp_directory, looking_up_at, looked_up
+):
+    Path("cache.json").write_text(
+        json.dumps(
+            {
+                "some-package": {
+                    "latest": None,
+                    "checked_at": 0,
+                    "looking_up_at": looking_up_at,
+                }
+            }
+        )
+    )
+    fetch = Mock(side_effect=_fetch)
+
+    VersionCache("cache.json").refresh(["some-package"], fetch)
+
+    assert fetch.called is looked_up
+
+
+def test_refresh_in_background_forgets_finished_threads(tmp_directory, monkeypatch):
+    monkeypatch.setattr(version_cache, "_REFRESHING", {})
+    cache = VersionCache("cache.json", ttl=0)
+    fetch = Mock(side_effect=_fetch)
+
+    cache.refresh_in_background("some-package", fetch).join()
+
+    assert not version_cache._REFRESHING
+
+    cache.refresh_in_background("some-package", fetch).join()
+
+    assert fetch.call_count == 2
+
+
+@pytest.mark.parametrize("content", ["{corrupted", "[]", '{"some-package": 1}'])
+def test_ignores_corrupted_cache(tmp_directory, content):
+    Path("cache.json").write_text(content)
+
+    assert VersionCache("cache.json").get("some-package") is None
+
+
+def _refresh(_):
+    VersionCache("cache.json").refresh(["some-package"], _slow_fetch)
+
+
+def _slow_fetch(package_names):
+    with open("fetches.txt", "a") as f:
+        f.write("fetch\n")
+
+    time.sleep(0.1)
+    return _fetch(package_names)
+
+
+def test_concurrent_processes_look_up_once(tmp_directory):
+    with multiprocessing.Pool(4) as pool:
+        pool.map(_refresh, range(4))
+
+    assert Path("fetches.txt").read_text() == "fetch\n"
+
+
+def test_check_version_does_not_block(home, monkeypatch, capsys):
+    def slow_lookup(package_names):
+        time.sleep(0.5)
+        return _fetch(package_names)
+
+    monkeypatch.setattr(telemetry, "get_latest_versions", slow_lookup)
+
+    start = time.monotonic()
+    telemetry.check_version("some-package", "0.1")
+
+    assert time.monotonic() - start < 0.25
+    assert "some-package version" not in capsys.readouterr().out
+
+    _wait()
+    telemetry.check_version("some-package", "0.1")
+
+    assert "new some-package version available (1.0)" in capsys.readouterr().out
+
+
+def test_check_version_reuses_cached_value(home, monkeypatch, capsys):
+    home.parent.mkdir(exist_ok=True)
+    home.write_text(
+        json.dumps({"some-package": {"latest": "1.0", "checked_at": time.time()}})
+    )
+    mock = Mock()
+    monkeypatch.setattr(telemetry, "get_latest_versions", mock)
+
+    telemetry.check_version("some-package", "0.1")
+
+    mock.assert_not_called()
+    assert not version_cache._REFRESHING
+    assert "new some-package version available (1.0)" in capsys.readouterr().out
+
+
+def test_check_version_looks_up_ploomber_packages_in_one_pass(home, monkeypatch):
+    mock = Mock(side_effect=_fetch)
+    monkeypatch.setattr(telemetry, "get_latest_versions", mock)
+    monkeypatch.setattr(
+        telemetry, "get_ploomber_packages", lambda: ["jupysql", "ploomber-core"]
+    )
+
+    telemetry.check_version("ploomber", "0.1")
+    _wait()
+    telemetry.check_version("jupysql", "0.1")
+    _wait()
+
+    mock.assert_called_once_with(["ploomber", "jupysql", "ploomber-core"])
+    assert set(json.loads(home.read_text())) == {"ploomber", "jupysql", "ploomber-core"}
+
+
+def test_get_latest_versions_reuses_connections(monkeypatch):
+    connections = []
+
+    class FakeConnection:
+        def __init__(self, host, timeout):
+            connections.append(self)
+            self.requests = []
+
+        def request(self, method, url):
+            self.requests.append(url)
+
+        def getresponse(self):
+            response = Mock(status=200)
+            response.read.return_value = json.dumps({"info": {"version": "1.0"}})
+            return response
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(telemetry.httplib, "HTTPSConnection", FakeConnection)
+
+    latest = telemetry.get_latest_versions(["a", "b", "c", "d", "e"], max_workers=2)
+
+    assert latest == {name: "1.0" for name in "abcde"}
+    assert len(connections) <= 2
+    assert sum(len(conn.requests) for conn in connections) == 5
+
+
+def test_get_latest_versions_failed_lookups(monkeypatch):
+    def request_latest_version(conn, package_name):
+        if package_name == "missing":
+            raise ValueError
+
+        return "1.0"
+
+    monkeypatch.setattr(telemetry, "_request_latest_version", request_latest_version)
+
+    assert telemetry.get_latest_versions(["some-package", "missing"]) == {
+        "some-package": "1.0",
+        "missing": None,
+    }
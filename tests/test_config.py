@@ -1,4 +1,5 @@
 from multiprocessing import Pool
+from unittest.mock import Mock
 import warnings
 from pathlib import Path
 import platform
@@ -169,3 +170,50 @@ def test_readonly(tmp_readonly_directory):
     cfg = MyConfig()
 
     assert cfg._writable_filesystem is False
+
+
+class SnapshotConfig(Config):
+    number: int = 42
+
+    @classmethod
+    def path(cls):
+        return Path("snapshot.yaml")
+
+
+def test_snapshot_is_reused(tmp_directory, monkeypatch):
+    first = SnapshotConfig.snapshot()
+
+    mock = Mock(wraps=yaml.safe_load)
+    monkeypatch.setattr(yaml, "safe_load", mock)
+
+    assert SnapshotConfig.snapshot() is first
+    mock.assert_not_called()
+
+
+def test_snapshot_reloads_if_file_changes(tmp_directory):
+    first = SnapshotConfig.snapshot()
+
+    Path("snapshot.yaml").write_text(yaml.dump({"number": 1000}))
+    second = SnapshotConfig.snapshot()
+
+    assert second is not first
+    assert second.number == 1000
+
+
+def test_snapshot_reloads_after_update(tmp_directory):
+    first = SnapshotConfig.snapshot()
+    first.number = 1
+
+    assert SnapshotConfig.snapshot().number == 1
+
+
+def test_load_config_parses_file_only_if_it_changed(tmp_directory, monkeypatch):
+    Path("myconfig.yaml").write_text(yaml.dump({"number": 100}))
+    mock = Mock(wraps=yaml.safe_load)
+    monkeypatch.setattr(yaml, "safe_load", mock)
+
+    cfg = MyConfig()
+    cfg.load_config()["number"] = 200
+
+    assert cfg.load_config() == {"number": 100}
+    assert mock.call_count == 1